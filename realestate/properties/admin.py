@@ -1,8 +1,13 @@
 from django.contrib import admin
-from .models import Property,PropertyImage,Facility,FavoriteProperty,PropertyFacility
+from .models import Property,PropertyImage,Facility,FavoriteProperty,PropertyFacility,SimilarProperty,SavedSearch,SavedSearchMatch,ImageUploadSession,ImageBlob
 # Register your models here.
 admin.site.register(Property)
 admin.site.register(PropertyFacility)
 admin.site.register(PropertyImage)
 admin.site.register(FavoriteProperty)
 admin.site.register(Facility)
+admin.site.register(SimilarProperty)
+admin.site.register(SavedSearch)
+admin.site.register(SavedSearchMatch)
+admin.site.register(ImageUploadSession)
+admin.site.register(ImageBlob)
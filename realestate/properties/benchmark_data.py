@@ -0,0 +1,156 @@
+"""
+Synthetic data for the API benchmarks (see the seed_benchmark_data and
+benchmark_api commands).
+
+Rows are generated deterministically from a seed and inserted with
+bulk_create in batches, so signals (similar listings, saved search alerts,
+activation emails) do not run. Benchmark users are recognised by their
+email domain and all share BENCHMARK_PASSWORD.
+"""
+import random
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from users.models import User
+
+from . import facility_bits
+from .models import Facility, FavoriteProperty, Property, PropertyFacility, PropertyImage
+
+BENCHMARK_EMAIL_DOMAIN = 'benchmark.test'
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+# Number of properties of each scale, users and favorites follow from it
+SCALES = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1M': 1_000_000,
+}
+PROPERTIES_PER_USER = 10
+FAVORITES_PER_USER = 5
+MAX_IMAGES = 4
+MAX_FACILITIES = 6
+BATCH_SIZE = 5000
+
+# (city, weight, price per square meter)
+CITIES = [
+    ('Damascus', 35, 900),
+    ('Aleppo', 25, 600),
+    ('Homs', 12, 450),
+    ('Latakia', 10, 700),
+    ('Hama', 8, 400),
+    ('Tartus', 6, 650),
+    ('Daraa', 4, 350),
+]
+FACILITIES = [
+    'Parking', 'Elevator', 'Balcony', 'Garden', 'Swimming pool', 'Central heating',
+    'Air conditioning', 'Solar panels', 'Security', 'Storage room', 'Furnished', 'Internet',
+]
+STREETS = ['Baghdad street', 'Old town', 'University district', 'Corniche', 'Industrial zone', 'City center']
+
+
+def benchmark_users():
+    return User.objects.filter(email__endswith='@' + BENCHMARK_EMAIL_DOMAIN)
+
+
+def clear():
+    """
+    Delete the benchmark users and, by cascade, their properties.
+    """
+    deleted, _ = benchmark_users().delete()
+    return deleted
+
+
+def _property(rng, owner_id):
+    city, _, price_per_meter = rng.choices(CITIES, weights=[city[1] for city in CITIES])[0]
+    ptype = rng.choices(['flat', 'villa', 'house'], weights=[70, 10, 20])[0]
+    rooms = rng.randint(1, 4) if ptype == 'flat' else rng.randint(3, 9)
+    area = Decimal(rng.randint(35, 60) * rooms * 100 + rng.randint(0, 99)) / 100
+    is_for_rent = rng.random() < 0.4
+    price = area * price_per_meter * Decimal(rng.uniform(0.7, 1.4))
+    if is_for_rent:
+        price /= 200  # Monthly rent
+    return Property(
+        owner_id=owner_id,
+        ptype=ptype,
+        city=city,
+        number_of_rooms=rooms,
+        area=area,
+        location_text=f"{rng.choice(STREETS)}, {city}",
+        price=price.quantize(Decimal('0.01')),
+        is_for_rent=is_for_rent,
+        details="Generated for benchmarks.",
+        latitude=Decimal(rng.uniform(32.5, 36.5)).quantize(Decimal('0.000001')),
+        longitude=Decimal(rng.uniform(35.7, 41.0)).quantize(Decimal('0.000001')),
+    )
+
+
+def seed(properties, seed=0, stdout=None):
+    """
+    Create `properties` listings with their owners, images, facilities and favorites.
+    Returns {table: rows created}.
+    """
+    rng = random.Random(seed)
+    password = make_password(BENCHMARK_PASSWORD)  # Hashing is slow, share one hash
+    counts = {'users': 0, 'properties': 0, 'images': 0, 'facilities': 0, 'favorites': 0}
+
+    facility_ids = [Facility.objects.get_or_create(name=name)[0].id for name in FACILITIES]
+
+    user_count = max(1, properties // PROPERTIES_PER_USER)
+    first_index = benchmark_users().count()
+    with transaction.atomic():
+        users = User.objects.bulk_create([
+            User(
+                email=f"user{first_index + i}@{BENCHMARK_EMAIL_DOMAIN}",
+                password=password,
+                is_active=True,
+                is_seller=i % 3 == 0,
+            )
+            for i in range(user_count)
+        ], batch_size=BATCH_SIZE)
+    user_ids = [user.id for user in users]
+    seller_ids = user_ids[::3]
+    counts['users'] = len(user_ids)
+
+    property_ids = []
+    for start in range(0, properties, BATCH_SIZE):
+        with transaction.atomic():
+            batch = Property.objects.bulk_create([
+                _property(rng, rng.choice(seller_ids)) for _ in range(min(BATCH_SIZE, properties - start))
+            ])
+            images, links = [], []
+            for property_instance in batch:
+                for position in range(rng.randint(0, MAX_IMAGES)):
+                    images.append(PropertyImage(
+                        property=property_instance,
+                        image=f"propertiesphotos/benchmark/{rng.randint(1, 50)}.jpg",
+                        caption="Living room" if position == 0 else None,
+                    ))
+                for facility_id in rng.sample(facility_ids, rng.randint(0, MAX_FACILITIES)):
+                    links.append(PropertyFacility(property=property_instance, facility_id=facility_id))
+            PropertyImage.objects.bulk_create(images)
+            PropertyFacility.objects.bulk_create(links)
+            masks = facility_bits.masks_of([property_instance.id for property_instance in batch])
+            for property_instance in batch:
+                property_instance.facility_mask = masks[property_instance.id]
+            Property.objects.bulk_update(batch, ['facility_mask'])
+        property_ids.extend(property_instance.id for property_instance in batch)
+        counts['properties'] += len(batch)
+        counts['images'] += len(images)
+        counts['facilities'] += len(links)
+        if stdout:
+            stdout.write(f"  {counts['properties']}/{properties} properties")
+
+    favorites = (
+        FavoriteProperty(user_id=user_id, property_id=property_id)
+        for user_id in user_ids
+        for property_id in rng.sample(property_ids, min(FAVORITES_PER_USER, len(property_ids)))
+    )
+    with transaction.atomic():
+        while True:
+            batch = [favorite for _, favorite in zip(range(BATCH_SIZE), favorites)]
+            if not batch:
+                break
+            FavoriteProperty.objects.bulk_create(batch, ignore_conflicts=True)
+            counts['favorites'] += len(batch)
+    return counts
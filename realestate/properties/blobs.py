@@ -0,0 +1,115 @@
+"""
+Content-addressed storage of property images.
+
+Each file is stored once under the SHA-256 of its bytes and shared by every
+PropertyImage with the same content through a reference-counted ImageBlob.
+The blob and its file are collected when the last reference goes away.
+"""
+import hashlib
+import os
+
+from django.db import transaction
+from django.db.models import F
+from realestate import deferred_storage
+
+from .models import ImageBlob, PropertyImage
+
+BLOB_DIRECTORY = 'propertiesphotos/blobs'
+
+READ_SIZE = 64 * 1024
+
+
+def get_storage():
+    return PropertyImage._meta.get_field('image').storage
+
+
+def hash_file(content):
+    """
+    Return (sha256 hex digest, size) of a file, reading it in chunks.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    content.seek(0)
+    for chunk in iter(lambda: content.read(READ_SIZE), b''):
+        digest.update(chunk)
+        size += len(chunk)
+    content.seek(0)
+    return digest.hexdigest(), size
+
+
+def blob_name(digest, filename):
+    extension = os.path.splitext(filename)[1].lower()
+    return f"{BLOB_DIRECTORY}/{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+
+def _save_missing(storage, name, content):
+    if not storage.exists(name):
+        saved_name = storage.save(name, content)
+        if saved_name != name:
+            # Another upload of the same content won the race, keep its copy
+            storage.delete(saved_name)
+
+
+def write_blob_file(content):
+    """
+    Hash the file and write it under its content address, unless a file with
+    the same content is already stored. Touches only the storage, never the
+    database, so it is safe to call from worker threads.
+    Returns (digest, name, size).
+    """
+    digest, size = hash_file(content)
+    name = blob_name(digest, content.name or '')
+    _save_missing(get_storage(), name, content)
+    return digest, name, size
+
+
+def acquire_blob(digest, name, size, content=None):
+    """
+    Take a reference on the blob stored under `name`, creating its row if needed.
+
+    write_blob_file() skips files that already exist, and an unreferenced blob
+    may be collected before the reference is taken: when the row is new or was
+    unreferenced, the file is checked and written again from `content`.
+    """
+    while True:
+        blob, created = ImageBlob.objects.get_or_create(name=name, defaults={'sha256': digest, 'size': size})
+        # The row may be deleted by a concurrent collect between the two queries
+        if ImageBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1):
+            if content is not None and (created or blob.ref_count == 0):
+                _save_missing(get_storage(), name, content)
+            blob.ref_count += 1
+            return blob
+
+
+def store_image(content):
+    """
+    Store an uploaded file and return the referenced ImageBlob.
+    """
+    return acquire_blob(*write_blob_file(content), content)
+
+
+def collect_blob(blob_id):
+    """
+    Delete a blob and its file if it is still unreferenced. The row stays
+    locked while the file is deleted, so a concurrent upload of the same
+    content either takes its reference first and the blob is kept, or waits,
+    finds the row gone and writes the file again.
+    """
+    with transaction.atomic():
+        blob = ImageBlob.objects.select_for_update().filter(pk=blob_id, ref_count=0).first()
+        if blob is None:
+            return False
+        get_storage().delete(blob.name)
+        blob.delete()
+    return True
+
+
+def release_blob(blob_id):
+    """
+    Drop a reference on a blob; after the transaction commits, the last one
+    collects the blob in the background.
+    """
+    with transaction.atomic():
+        ImageBlob.objects.filter(pk=blob_id).update(ref_count=F('ref_count') - 1)
+        if ImageBlob.objects.filter(pk=blob_id, ref_count=0).exists():
+            transaction.on_commit(lambda: deferred_storage.submit(collect_blob, blob_id))
@@ -0,0 +1,107 @@
+"""
+Sync of the PropertyCard read model.
+
+A property's card is rebuilt from its rows once the transaction that
+changed the property, its images or its facilities commits (see
+signals.py, plus the bulk paths that send no signals). Favorites only
+recount the favorites column. Cards of deleted properties go with them by
+cascade, and `manage.py rebuild_property_cards` recomputes every card.
+"""
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import FavoriteProperty, Property, PropertyCard, PropertyImage
+
+BATCH_SIZE = 1000
+
+_image_storage = PropertyImage._meta.get_field('image').storage
+_UPDATE_FIELDS = [
+    field.name for field in PropertyCard._meta.concrete_fields if not field.primary_key
+]
+
+
+def _text(value):
+    # Fixed-point strings, like DRF's DecimalField
+    return None if value is None else f"{value:f}"
+
+
+def _favorites_count():
+    favorites = FavoriteProperty.objects.filter(property=OuterRef('pk')).order_by().values('property')
+    return Coalesce(Subquery(favorites.annotate(count=Count('id')).values('count')), Value(0), output_field=IntegerField())
+
+
+def build_cards(property_ids):
+    """
+    Return unsaved PropertyCards of the existing properties among `property_ids`.
+    """
+    first_photo = PropertyImage.objects.filter(property=OuterRef('pk')).order_by('id').values('image')[:1]
+    rows = Property.objects.filter(id__in=property_ids).annotate(
+        main_photo_path=Subquery(first_photo),
+        favorites_count=_favorites_count(),
+    ).values(
+        'id', 'owner_id', 'ptype', 'city', 'number_of_rooms', 'location_text', 'is_for_rent',
+        'price', 'area', 'latitude', 'longitude', 'facility_mask', 'main_photo_path', 'favorites_count',
+    )
+    return [
+        PropertyCard(
+            property_id=row['id'],
+            owner=row['owner_id'],
+            ptype=row['ptype'],
+            city=row['city'],
+            number_of_rooms=row['number_of_rooms'],
+            location_text=row['location_text'],
+            is_for_rent=row['is_for_rent'],
+            price=row['price'],
+            area=row['area'],
+            price_text=_text(row['price']),
+            area_text=_text(row['area']),
+            latitude_text=_text(row['latitude']),
+            longitude_text=_text(row['longitude']),
+            main_photo=_image_storage.url(row['main_photo_path']) if row['main_photo_path'] else None,
+            facility_mask=row['facility_mask'],
+            favorites_count=row['favorites_count'],
+        )
+        for row in rows
+    ]
+
+
+def refresh(property_ids):
+    """
+    Insert or update the cards of these properties, return how many were written.
+    """
+    cards = build_cards(property_ids)
+    PropertyCard.objects.bulk_create(cards, update_conflicts=True, unique_fields=['property'], update_fields=_UPDATE_FIELDS)
+    return len(cards)
+
+
+def refresh_later(property_ids):
+    """
+    Refresh the cards of these properties once the transaction commits.
+    """
+    property_ids = list(property_ids)
+    if property_ids:
+        transaction.on_commit(lambda: refresh(property_ids))
+
+
+def recount_favorites_later(property_id):
+    transaction.on_commit(
+        lambda: PropertyCard.objects.filter(pk=property_id).update(favorites_count=_favorites_count())
+    )
+
+
+def rebuild(stdout=None):
+    """
+    Recompute the cards of all properties in batches, return how many were written.
+    """
+    written = 0
+    last_id = 0
+    while True:
+        property_ids = list(Property.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:BATCH_SIZE])
+        if not property_ids:
+            return written
+        with transaction.atomic():
+            written += refresh(property_ids)
+        last_id = property_ids[-1]
+        if stdout:
+            stdout.write(f"  {written} cards")
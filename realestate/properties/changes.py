@@ -0,0 +1,98 @@
+"""
+Change feed for offline-capable clients.
+
+Every change to a property, its images or its facilities, and every
+favorite added or removed, appends a ChangeLogEntry in the transaction of
+the change, so an entry exists exactly when the change committed. A client
+keeps the id of the last entry it processed as its cursor and asks for
+what happened after it; entries are collapsed per property and answered
+with the current state, so the response grows with the number of changed
+properties, not with the catalog.
+
+Entries younger than SETTLE_SECONDS are held back: ids are taken before
+the inserting transactions commit, so a newer entry can become visible
+before an older one, and a client must not move its cursor past an entry
+it could not see yet. Keep it above the duration of the longest writing
+transaction.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ChangeLogEntry, FavoriteProperty
+
+BATCH_SIZE = getattr(settings, 'CHANGE_FEED_BATCH_SIZE', 200)  # entries per response
+SETTLE_SECONDS = getattr(settings, 'CHANGE_FEED_SETTLE_SECONDS', 2)
+RETENTION_DAYS = getattr(settings, 'CHANGE_LOG_RETENTION_DAYS', 30)
+
+
+class CursorExpired(Exception):
+    """
+    The entries after the cursor were pruned, the client must sync from scratch.
+    """
+
+
+def record(property_ids, kind=ChangeLogEntry.PROPERTY, user=None):
+    """
+    Append entries for these properties, in the current transaction.
+    """
+    ChangeLogEntry.objects.bulk_create([
+        ChangeLogEntry(kind=kind, object_id=property_id, user=user) for property_id in property_ids
+    ])
+
+
+def head():
+    """
+    Return the cursor of the newest settled entry, where a client starts after a full download.
+    """
+    settled = ChangeLogEntry.objects.filter(created_at__lte=timezone.now() - timedelta(seconds=SETTLE_SECONDS))
+    return settled.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def read(since, user_id=None, limit=None):
+    """
+    Return (changed property ids, {property_id: favorited} for `user_id`,
+    next cursor, has_more) for up to `limit` (BATCH_SIZE) entries after `since`.
+    """
+    limit = limit or BATCH_SIZE
+    entries = ChangeLogEntry.objects.filter(
+        id__gt=since, created_at__lte=timezone.now() - timedelta(seconds=SETTLE_SECONDS),
+    )
+    visible = Q(kind=ChangeLogEntry.PROPERTY)
+    if user_id is not None:
+        visible |= Q(kind=ChangeLogEntry.FAVORITE, user=user_id)
+    rows = list(entries.filter(visible).order_by('id').values_list('id', 'kind', 'object_id')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # Ids are never reused, so a gap before the oldest entry means it was pruned
+    oldest = ChangeLogEntry.objects.order_by('id').values_list('id', flat=True).first()
+    if oldest is not None and since < oldest - 1:
+        raise CursorExpired
+
+    # Latest entry first wins, dict keeps the order of the last change
+    changed, favorite_ids = {}, {}
+    for entry_id, kind, property_id in rows:
+        target = changed if kind == ChangeLogEntry.PROPERTY else favorite_ids
+        target.pop(property_id, None)
+        target[property_id] = entry_id
+
+    favorites = {}
+    if favorite_ids:
+        current = set(FavoriteProperty.objects.filter(user_id=user_id, property_id__in=favorite_ids).values_list('property_id', flat=True))
+        favorites = {property_id: property_id in current for property_id in favorite_ids}
+    next_cursor = rows[-1][0] if rows else since
+    return list(changed), favorites, next_cursor, has_more
+
+
+def prune(days=RETENTION_DAYS):
+    """
+    Delete the entries older than `days`, return how many were deleted. The
+    newest entry is always kept, it is what tells stale cursors apart.
+    """
+    newest = ChangeLogEntry.objects.order_by('-id').values_list('id', flat=True).first()
+    expired = ChangeLogEntry.objects.filter(created_at__lt=timezone.now() - timedelta(days=days)).exclude(id=newest)
+    deleted, _ = expired.delete()
+    return deleted
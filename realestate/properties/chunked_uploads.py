@@ -0,0 +1,142 @@
+"""
+Resumable chunked uploads of property images.
+
+Protocol: create an ImageUploadSession, PUT the file in chunks at increasing
+byte offsets (each chunk is streamed into a staging file, then appended to the
+upload's temporary file under the session lock), then
+finalize it into a PropertyImage. A client that lost its connection asks for
+the current offset and resumes from there instead of re-sending the file.
+"""
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+from PIL import Image, UnidentifiedImageError
+
+from .models import ImageUploadSession, PropertyImage
+
+CHUNKED_UPLOAD_DIR = Path(getattr(settings, 'CHUNKED_UPLOAD_DIR', Path(tempfile.gettempdir()) / 'realestate_uploads'))
+MAX_UPLOAD_SIZE = getattr(settings, 'CHUNKED_UPLOAD_MAX_SIZE', 20 * 1024 * 1024)  # bytes
+CHUNK_SIZE = getattr(settings, 'CHUNKED_UPLOAD_CHUNK_SIZE', 512 * 1024)  # suggested to clients
+UPLOAD_EXPIRY = timedelta(hours=getattr(settings, 'CHUNKED_UPLOAD_EXPIRY_HOURS', 24))
+
+# Size of the reads from the request body, the chunk is never held in memory as a whole
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """
+    Raised when a chunk or a finalization request is not acceptable.
+    """
+
+
+def temp_path(session):
+    return CHUNKED_UPLOAD_DIR / f"{session.id}.part"
+
+
+def start_upload(property_instance, user, filename, total_size, caption=None):
+    if total_size > MAX_UPLOAD_SIZE:
+        raise UploadError(f"File is too large. The maximum size is {MAX_UPLOAD_SIZE} bytes.")
+
+    session = ImageUploadSession.objects.create(
+        property=property_instance,
+        user=user,
+        filename=os.path.basename(filename),
+        caption=caption,
+        total_size=total_size,
+    )
+    CHUNKED_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    temp_path(session).touch()
+    return session
+
+
+def receive_chunk(session, offset, stream, length):
+    """
+    Stream `length` bytes from the request body into a staging file of their
+    own, before the upload is locked: a slow client holds no lock while it sends.
+    A dropped connection leaves only the bytes that were fully received in it.
+    Returns the path of the staging file.
+    """
+    if offset + length > session.total_size:
+        raise UploadError("Chunk goes past the declared file size.")
+
+    staged = CHUNKED_UPLOAD_DIR / f"{session.id}.{uuid.uuid4().hex}.chunk"
+    written = 0
+    with open(staged, 'wb') as destination:
+        while written < length:
+            data = stream.read(min(READ_SIZE, length - written))
+            if not data:
+                break
+            destination.write(data)
+            written += len(data)
+    return staged
+
+
+def append_chunk(session, staged):
+    """
+    Append a staged chunk to the temporary file at the bytes already received.
+    The caller holds the session lock and has checked that the chunk was sent
+    for that offset, so a repeated or out-of-order chunk never reaches the file.
+    """
+    with open(temp_path(session), 'r+b') as destination, open(staged, 'rb') as chunk:
+        destination.seek(session.received_bytes)
+        shutil.copyfileobj(chunk, destination, READ_SIZE)
+        destination.truncate()
+        session.received_bytes = destination.tell()
+    session.save(update_fields=['received_bytes', 'updated_at'])
+    return session.received_bytes
+
+
+def discard_chunk(staged):
+    try:
+        os.remove(staged)
+    except FileNotFoundError:
+        pass
+
+
+def finalize_upload(session):
+    """
+    Turn a complete upload into a PropertyImage and remove the temporary file.
+    """
+    if session.received_bytes != session.total_size:
+        raise UploadError(f"Upload is incomplete: {session.received_bytes} of {session.total_size} bytes received.")
+
+    path = temp_path(session)
+    try:
+        with Image.open(path) as image:
+            image.verify()
+    except (UnidentifiedImageError, OSError):
+        raise UploadError("Upload a valid image. The file you uploaded was either not an image or a corrupted image.")
+
+    with open(path, 'rb') as uploaded:
+        property_image = PropertyImage.objects.create(
+            property=session.property,
+            image=File(uploaded, name=session.filename),
+            caption=session.caption,
+        )
+    discard_upload(session)
+    return property_image
+
+
+def discard_upload(session):
+    for path in [temp_path(session), *CHUNKED_UPLOAD_DIR.glob(f"{session.id}.*.chunk")]:
+        discard_chunk(path)
+    session.delete()
+
+
+def clear_expired_uploads():
+    """
+    Remove the uploads that were not touched within UPLOAD_EXPIRY.
+    """
+    expired = ImageUploadSession.objects.filter(updated_at__lt=timezone.now() - UPLOAD_EXPIRY)
+    count = 0
+    for session in expired.iterator():
+        discard_upload(session)
+        count += 1
+    return count
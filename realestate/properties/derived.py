@@ -0,0 +1,62 @@
+"""
+Refresh of what is derived from a property's images and facilities: the
+facility mask, the similar listings, the cached details, the list card and
+the change feed.
+
+The signal receivers call these helpers, and so do the bulk paths that send
+no signals, so a new dependent only has to be added here. Inside batched()
+the refreshes are collected and run once for all the properties, e.g. when
+one request replaces many facility rows.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from . import cards, changes, detail_cache, facility_bits, recommendations
+
+# {'facilities': set(), 'images': set()} of the current batched() block
+_batch = ContextVar('derived_batch', default=None)
+
+
+def facilities_changed(property_ids):
+    batch = _batch.get()
+    if batch is not None:
+        batch['facilities'].update(property_ids)
+        return
+    property_ids = list(property_ids)
+    if property_ids:
+        facility_bits.update_masks(property_ids)
+        recommendations.schedule_refresh(property_ids)
+        detail_cache.invalidate(property_ids)
+        cards.refresh_later(property_ids)
+        changes.record(property_ids)
+
+
+def images_changed(property_ids):
+    batch = _batch.get()
+    if batch is not None:
+        batch['images'].update(property_ids)
+        return
+    property_ids = list(property_ids)
+    if property_ids:
+        detail_cache.invalidate(property_ids)
+        cards.refresh_later(property_ids)
+        changes.record(property_ids)
+
+
+@contextmanager
+def batched():
+    """
+    Run the refreshes requested inside the block once, when it exits without
+    an error. Use it inside the transaction of the changes.
+    """
+    if _batch.get() is not None:
+        yield
+        return
+    batch = {'facilities': set(), 'images': set()}
+    token = _batch.set(batch)
+    try:
+        yield
+    finally:
+        _batch.reset(token)
+    facilities_changed(sorted(batch['facilities']))
+    images_changed(sorted(batch['images'] - batch['facilities']))
@@ -0,0 +1,96 @@
+"""
+Cache of the serialized property details.
+
+PropertyDetailSerializer payloads are cached per property id with
+origin-relative image URLs, made absolute for the request when served.
+Any change to a property, its images or its facilities drops its entry
+once the transaction commits (see signals.py, plus the bulk paths that
+send no signals). Misses are filled with cache.add, so they never replace
+an entry another request stored; the timeout bounds what a lagging replica
+read may put back.
+
+Other workers only see the invalidation when the cache is shared
+(REDIS_URL). With the per-process default cache, entries expire after a
+few seconds instead.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from realestate.metrics import cache_lookup
+
+from .models import Property
+from .serializers import PropertyDetailSerializer
+
+CACHE_TIMEOUT = getattr(settings, 'PROPERTY_DETAIL_CACHE_TIMEOUT', 300 if getattr(settings, 'SHARED_CACHE', False) else 10)  # seconds
+
+
+def cache_key(property_id):
+    return f'property-detail:{property_id}'
+
+
+def _load(queryset):
+    # Three queries whatever the number of properties: rows, facilities, images
+    properties = queryset.prefetch_related('facilities', 'images')
+    return {instance.id: dict(PropertyDetailSerializer(instance).data) for instance in properties}
+
+
+def for_request(data, request):
+    """
+    Return the cached payload with its image URLs made absolute for this request.
+    """
+    images = [
+        {
+            **image,
+            'image': image['image'] and request.build_absolute_uri(image['image']),
+            'image_url': image['image_url'] and request.build_absolute_uri(image['image_url']),
+        }
+        for image in data['images']
+    ]
+    return {**data, 'images': images}
+
+
+def get_details(property_ids):
+    """
+    Return {id: payload} for the existing properties among `property_ids`.
+    """
+    keys = {cache_key(property_id): property_id for property_id in property_ids}
+    found = {keys[key]: data for key, data in cache.get_many(keys).items()}
+    for property_id in property_ids:
+        cache_lookup('property_details', hit=property_id in found)
+
+    missing = [property_id for property_id in property_ids if property_id not in found]
+    if missing:
+        loaded = _load(Property.objects.filter(id__in=missing))
+        for property_id, data in loaded.items():
+            cache.add(cache_key(property_id), data, CACHE_TIMEOUT)
+        found.update(loaded)
+    return found
+
+
+def get_detail(property_id):
+    """
+    Return the payload of this property, or None if it does not exist.
+    """
+    return get_details([property_id]).get(property_id)
+
+
+async def aget_detail(property_id):
+    data = await cache.aget(cache_key(property_id))
+    cache_lookup('property_details', hit=data is not None)
+    if data is None:
+        try:
+            instance = await Property.objects.prefetch_related('facilities', 'images').aget(id=property_id)
+        except Property.DoesNotExist:
+            return None
+        data = dict(PropertyDetailSerializer(instance).data)
+        await cache.aadd(cache_key(property_id), data, CACHE_TIMEOUT)
+    return data
+
+
+def invalidate(property_ids):
+    """
+    Drop the cached payloads of these properties once the transaction commits.
+    """
+    keys = [cache_key(property_id) for property_id in property_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,95 @@
+"""
+Facility sets as bitmasks: facility id N is bit N - 1 of a signed 64-bit
+integer, so ids 1 to MAX_FACILITY_ID fit. Facilities with a larger id are
+left out of the masks; code matching on masks must fall back to the
+PropertyFacility rows for them.
+
+Property.facility_mask is recomputed from the PropertyFacility rows by
+update_masks, called by the facility signals and the bulk facility paths,
+in the same transaction as the change. Migration 0011 computed the masks of
+the existing properties; `manage.py backfill_facility_masks` repairs them.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+
+from .models import Property, PropertyFacility
+
+BATCH_SIZE = 1000
+MAX_FACILITY_ID = 63
+
+
+def fits(facility_id):
+    return 1 <= facility_id <= MAX_FACILITY_ID
+
+
+def mask_for(facility_ids):
+    """
+    Return the mask of these facility ids, ignoring the ones that do not fit.
+    """
+    mask = 0
+    for facility_id in facility_ids:
+        if fits(facility_id):
+            mask |= 1 << (facility_id - 1)
+    return mask
+
+
+def masks_of(property_ids):
+    """
+    Return {property_id: mask} computed from the PropertyFacility rows.
+    """
+    facilities = defaultdict(list)
+    for property_id, facility_id in PropertyFacility.objects.filter(property_id__in=property_ids).values_list('property_id', 'facility_id'):
+        facilities[property_id].append(facility_id)
+    return {property_id: mask_for(facilities[property_id]) for property_id in property_ids}
+
+
+def update_masks(property_ids):
+    """
+    Recompute the masks of these properties. Their rows are locked first, so
+    concurrent facility changes of a property recompute one after the other
+    and the later one sees the rows the earlier one committed.
+    """
+    property_ids = sorted(set(property_ids))
+    with transaction.atomic():
+        # Locked in id order, so two changes of the same properties cannot deadlock
+        list(Property.objects.filter(pk__in=property_ids).order_by('pk').select_for_update().values_list('pk', flat=True))
+        for property_id, mask in masks_of(property_ids).items():
+            Property.objects.filter(pk=property_id).update(facility_mask=mask)
+
+
+def filter_having(queryset, facility_ids):
+    """
+    Keep the rows of `queryset` (properties or rows keyed by property) that
+    have all these facilities: one bitwise predicate for the ids that fit in
+    the mask, an EXISTS for each one that does not.
+    """
+    mask = mask_for(facility_ids)
+    if mask:
+        queryset = queryset.alias(matched_facilities=F('facility_mask').bitand(mask)).filter(matched_facilities=mask)
+    for facility_id in facility_ids:
+        if not fits(facility_id):
+            queryset = queryset.filter(Exists(PropertyFacility.objects.filter(property_id=OuterRef('pk'), facility_id=facility_id)))
+    return queryset
+
+
+def backfill(stdout=None):
+    """
+    Recompute the mask of every property in batches, return how many changed.
+    """
+    changed = 0
+    last_id = 0
+    while True:
+        batch = list(Property.objects.filter(id__gt=last_id).order_by('id').only('id', 'facility_mask')[:BATCH_SIZE])
+        if not batch:
+            return changed
+        masks = masks_of([property_instance.id for property_instance in batch])
+        stale = [property_instance for property_instance in batch if property_instance.facility_mask != masks[property_instance.id]]
+        for property_instance in stale:
+            property_instance.facility_mask = masks[property_instance.id]
+        Property.objects.bulk_update(stale, ['facility_mask'])
+        changed += len(stale)
+        last_id = batch[-1].id
+        if stdout:
+            stdout.write(f"  {last_id}: {changed} masks updated")
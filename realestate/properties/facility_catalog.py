@@ -0,0 +1,65 @@
+"""
+In-process cache of the Facility catalog.
+
+The catalog is small and read on every facility-related request, so it is
+kept in memory and dropped by the Facility post_save/post_delete signals.
+A TTL bounds staleness in the other worker processes, which do not see the
+signals of the process that made the change, and a lookup that misses reloads
+the catalog once before reporting a facility as missing.
+"""
+import threading
+import time
+
+from django.conf import settings
+from realestate.metrics import cache_lookup
+
+from .models import Facility
+
+CATALOG_TTL = getattr(settings, 'FACILITY_CATALOG_TTL', 300)  # seconds
+
+_lock = threading.Lock()
+_catalog = None
+_loaded_at = 0.0
+
+
+def get_facilities():
+    """
+    Return the {id: Facility} catalog, ordered by id.
+    """
+    global _catalog, _loaded_at
+    catalog = _catalog
+    if catalog is not None and time.monotonic() - _loaded_at < CATALOG_TTL:
+        cache_lookup('facility_catalog', hit=True)
+        return catalog
+
+    with _lock:
+        if _catalog is None or time.monotonic() - _loaded_at >= CATALOG_TTL:
+            cache_lookup('facility_catalog', hit=False)
+            _catalog = {facility.id: facility for facility in Facility.objects.order_by('id')}
+            _loaded_at = time.monotonic()
+        return _catalog
+
+
+def get_facility(facility_id):
+    """
+    Return the Facility with this id, or None if it does not exist.
+    """
+    return find_facilities([facility_id]).get(facility_id)
+
+
+def find_facilities(facility_ids):
+    """
+    Return the catalog after making sure it is fresh enough to hold facility_ids:
+    the facilities may have been created after this process loaded it.
+    """
+    catalog = get_facilities()
+    if not catalog.keys() >= set(facility_ids):
+        invalidate()
+        catalog = get_facilities()
+    return catalog
+
+
+def invalidate():
+    global _catalog
+    with _lock:
+        _catalog = None
@@ -1,4 +1,7 @@
-from rest_framework.filters import SearchFilter
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, SearchFilter
+
+from . import facility_bits
 
 class CaseInsensitiveSearchFilter(SearchFilter):
     """
@@ -6,4 +9,22 @@ class CaseInsensitiveSearchFilter(SearchFilter):
     """
     def construct_search(self, field_name, lookup_expr=None):
         # Use 'icontains' for case-insensitive search
-        return f"{field_name}__icontains"
\ No newline at end of file
+        return f"{field_name}__icontains"
+
+
+class FacilityFilter(BaseFilterBackend):
+    """
+    `?facilities=1,2,3` keeps the properties that have all these facilities,
+    matched on the facility bitmask with a single bitwise predicate.
+    """
+    param = 'facilities'
+
+    def filter_queryset(self, request, queryset, view):
+        value = request.query_params.get(self.param)
+        if not value:
+            return queryset
+        try:
+            facility_ids = sorted({int(part) for part in value.split(',') if part.strip()})
+        except ValueError:
+            raise ValidationError({self.param: ["Enter a comma-separated list of facility IDs."]})
+        return facility_bits.filter_having(queryset, facility_ids)
@@ -0,0 +1,175 @@
+"""
+On-demand resized variants of media images.
+
+Resized files are cached on local disk, keyed by the source path, its
+modification time and the requested box, and evicted least-recently-used
+once the cache grows past its size budget. The number of resizes running at
+the same time is bounded, decoding is the expensive part.
+"""
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils._os import safe_join
+from PIL import Image, UnidentifiedImageError
+from realestate.metrics import cache_lookup
+
+CACHE_DIR = Path(getattr(settings, 'IMAGE_RESIZE_CACHE_DIR', Path(settings.MEDIA_ROOT) / 'resized'))
+CACHE_MAX_BYTES = getattr(settings, 'IMAGE_RESIZE_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+MAX_DIMENSION = getattr(settings, 'IMAGE_RESIZE_MAX_DIMENSION', 2000)
+CONCURRENCY = getattr(settings, 'IMAGE_RESIZE_CONCURRENCY', 4)
+# Browser/CDN cache lifetime of resized images, in seconds
+CACHE_MAX_AGE = getattr(settings, 'IMAGE_RESIZE_CACHE_MAX_AGE', 30 * 24 * 3600)
+# Seconds a request waits for a free resize slot before giving up
+ACQUIRE_TIMEOUT = getattr(settings, 'IMAGE_RESIZE_ACQUIRE_TIMEOUT', 10)
+
+# Only media of these directories can be resized
+ALLOWED_DIRECTORIES = ('propertiesphotos/', 'userphotoes/')
+
+JPEG_QUALITY = 85
+
+# Output format: (cache file suffix, content type)
+FORMATS = {
+    'JPEG': ('.jpg', 'image/jpeg'),
+    'PNG': ('.png', 'image/png'),
+}
+
+_resize_slots = threading.BoundedSemaphore(CONCURRENCY)
+_cache_lock = threading.Lock()
+_cache_size = None  # Bytes in the cache as seen by this process, None until scanned
+
+
+class ResizeError(Exception):
+    """
+    Raised when the source cannot be resized; `status` is the HTTP status to answer with.
+    """
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def _source_path(path):
+    if not path.startswith(ALLOWED_DIRECTORIES):
+        raise ResizeError("Image not found.", 404)
+    try:
+        source = Path(safe_join(settings.MEDIA_ROOT, path))
+    except SuspiciousFileOperation:
+        raise ResizeError("Image not found.", 404)
+    if not source.is_file():
+        raise ResizeError("Image not found.", 404)
+    return source
+
+
+def _cache_path(source, width, height):
+    key = hashlib.sha256(f"{source}:{source.stat().st_mtime_ns}:{width}x{height}".encode()).hexdigest()
+    return CACHE_DIR / key[:2] / key
+
+
+def _scan_cache():
+    """
+    Return [(mtime, size, path)] of every cached file.
+    """
+    entries = []
+    if not CACHE_DIR.exists():
+        return entries
+    for directory in os.scandir(CACHE_DIR):
+        if not directory.is_dir():
+            continue
+        for entry in os.scandir(directory.path):
+            if entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    return entries
+
+
+def _account(added_bytes):
+    """
+    Track the cache size and evict the least recently used files past the budget.
+    """
+    global _cache_size
+    with _cache_lock:
+        if _cache_size is None:
+            _cache_size = sum(size for _, size, _ in _scan_cache())
+        else:
+            _cache_size += added_bytes
+        if _cache_size <= CACHE_MAX_BYTES:
+            return
+
+        # Rescan, other processes share the directory; evict down to 90% of the budget
+        entries = sorted(_scan_cache())
+        _cache_size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if _cache_size <= CACHE_MAX_BYTES * 0.9:
+                break
+            try:
+                os.remove(path)
+                _cache_size -= size
+            except FileNotFoundError:
+                pass
+
+
+def _find_cached(cached):
+    for suffix, content_type in FORMATS.values():
+        candidate = cached.with_suffix(suffix)
+        if candidate.exists():
+            return candidate, content_type
+    return None
+
+
+def _resize(source, cached, width, height):
+    try:
+        with Image.open(source) as image:
+            # Lets the JPEG decoder scale down by powers of two while decoding
+            image.draft('RGB', (width, height))
+            image.thumbnail((width, height), Image.LANCZOS)
+            # Keep transparency, everything else is served as JPEG
+            image_format = 'PNG' if image.mode in ('RGBA', 'LA', 'P') else 'JPEG'
+            if image_format == 'JPEG' and image.mode != 'RGB':
+                image = image.convert('RGB')
+
+            suffix, content_type = FORMATS[image_format]
+            destination = cached.with_suffix(suffix)
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            # Unique across the threads and the worker processes sharing the cache
+            temporary = destination.with_name(f"{destination.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            image.save(temporary, image_format, quality=JPEG_QUALITY, optimize=True)
+    except Image.DecompressionBombError:
+        raise ResizeError("The image is too large to resize.", 400)
+    except (UnidentifiedImageError, OSError):
+        raise ResizeError("The file is not a valid image.", 400)
+
+    # Atomic, concurrent resizes of the same variant simply overwrite each other
+    os.replace(temporary, destination)
+    _account(destination.stat().st_size)
+    return destination, content_type
+
+
+def get_resized(path, width, height):
+    """
+    Return (cached file path, content type) of the resized image, resizing on a cache miss.
+    """
+    if not (0 < width <= MAX_DIMENSION and 0 < height <= MAX_DIMENSION):
+        raise ResizeError(f"Width and height must be between 1 and {MAX_DIMENSION}.", 400)
+
+    source = _source_path(path)
+    cached = _cache_path(source, width, height)
+    hit = _find_cached(cached)
+    if hit:
+        try:
+            os.utime(hit[0])  # Mark as recently used
+        except FileNotFoundError:
+            hit = None  # Evicted by another request since it was found
+    cache_lookup('resized_images', hit=bool(hit))
+    if hit:
+        return hit
+
+    if not _resize_slots.acquire(timeout=ACQUIRE_TIMEOUT):
+        raise ResizeError("Too many images are being resized, try again later.", 503)
+    try:
+        # Another request may have produced it while this one waited
+        return _find_cached(cached) or _resize(source, cached, width, height)
+    finally:
+        _resize_slots.release()
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from properties import facility_bits
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Property.facility_mask from the PropertyFacility rows, e.g. after facility rows were "
+        "changed with raw SQL. Migration 0011 already computed the masks of the existing properties. "
+        "Run rebuild_property_cards afterwards."
+    )
+
+    def handle(self, *args, **options):
+        changed = facility_bits.backfill(stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"Updated the facility mask of {changed} properties."))
@@ -0,0 +1,182 @@
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from properties import benchmark_data
+from properties.models import Property
+from rest_framework_simplejwt.tokens import AccessToken
+
+SCENARIOS = ['list', 'search', 'detail', 'similar', 'login', 'favorite']
+
+
+class Command(BaseCommand):
+    help = (
+        "Run scripted API scenarios through the Django test client and report throughput, "
+        "p50/p95/p99 latency and queries per request. Seed the data with seed_benchmark_data first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+        parser.add_argument('--requests', type=int, default=200, help="Measured requests per scenario.")
+        parser.add_argument('--warmup', type=int, default=20, help="Unmeasured requests per scenario.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Results file, defaults to benchmark-results/<timestamp>.json.")
+        parser.add_argument('--compare', help="Earlier results file to compare with.")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.users = list(benchmark_data.benchmark_users().order_by('id').values_list('id', 'email')[:200])
+        if not self.users:
+            raise CommandError("No benchmark data, run seed_benchmark_data first.")
+        self.property_ids = self.sample_property_ids(500)
+        self.cities = sorted({city for city, _, _ in benchmark_data.CITIES})
+        self.client = Client()
+
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['*']):
+            for scenario in options['scenarios']:
+                requests = getattr(self, f'scenario_{scenario}')()
+                for _ in range(options['warmup']):
+                    self.run_request(next(requests))
+                samples = [self.run_request(next(requests)) for _ in range(options['requests'])]
+                results[scenario] = self.summarize(samples)
+                self.report(scenario, results[scenario])
+
+        document = {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'commit': self.git_commit(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'dataset': {
+                'properties': Property.objects.count(),
+                'benchmark_users': benchmark_data.benchmark_users().count(),
+            },
+            'options': {key: options[key] for key in ('requests', 'warmup', 'seed')},
+            'scenarios': results,
+        }
+        output = Path(options['output'] or settings.BASE_DIR / 'benchmark-results' / f"{datetime.now():%Y%m%d-%H%M%S}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(document, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}."))
+
+        if options['compare']:
+            self.compare(json.loads(Path(options['compare']).read_text()), document)
+
+    def sample_property_ids(self, count):
+        """
+        Pick existing property ids without ORDER BY RANDOM() over the whole table.
+        """
+        bounds = Property.objects.order_by('id').values_list('id', flat=True)
+        low, high = bounds.first(), bounds.last()
+        if low is None:
+            raise CommandError("No properties, run seed_benchmark_data first.")
+        ids = set()
+        for _ in range(count):
+            ids.update(bounds.filter(id__gte=self.rng.randint(low, high))[:1])
+        return sorted(ids)
+
+    def token_for(self, user_id):
+        return f"Bearer {AccessToken.for_user(benchmark_data.benchmark_users().get(id=user_id))}"
+
+    # Scenarios are endless generators of (method, path, client keyword arguments)
+
+    def scenario_list(self):
+        while True:
+            yield 'get', '/properties/', {'data': {'page': self.rng.randint(1, 20)}}
+
+    def scenario_search(self):
+        while True:
+            query = {'city': self.rng.choice(self.cities), 'ordering': self.rng.choice(['price', '-price', 'area'])}
+            if self.rng.random() < 0.5:
+                query['ptype'] = self.rng.choice(['flat', 'villa', 'house'])
+            if self.rng.random() < 0.5:
+                query['is_for_rent'] = self.rng.choice(['true', 'false'])
+            if self.rng.random() < 0.3:
+                query['search'] = self.rng.choice(benchmark_data.STREETS).split()[0]
+            yield 'get', '/properties/', {'data': query}
+
+    def scenario_detail(self):
+        while True:
+            yield 'get', f"/properties/{self.rng.choice(self.property_ids)}/", {}
+
+    def scenario_similar(self):
+        while True:
+            yield 'get', f"/properties/{self.rng.choice(self.property_ids)}/similar/", {}
+
+    def scenario_login(self):
+        while True:
+            _, email = self.rng.choice(self.users)
+            yield 'post', '/users/login/', {
+                'data': {'email': email, 'password': benchmark_data.BENCHMARK_PASSWORD},
+                'content_type': 'application/json',
+            }
+
+    def scenario_favorite(self):
+        tokens = {}
+        while True:
+            user_id, _ = self.rng.choice(self.users)
+            if user_id not in tokens:
+                tokens[user_id] = self.token_for(user_id)
+            property_id = self.rng.choice(self.property_ids)
+            # Add then remove, so the data set is left as it was
+            yield 'post', f"/properties/{property_id}/favorite/", {'HTTP_AUTHORIZATION': tokens[user_id]}
+            yield 'delete', f"/properties/{property_id}/unfavorite/", {'HTTP_AUTHORIZATION': tokens[user_id]}
+
+    def run_request(self, request):
+        method, path, kwargs = request
+        start = time.perf_counter()
+        response = getattr(self.client, method)(path, **kwargs)
+        elapsed = time.perf_counter() - start
+        stats = getattr(response.wsgi_request, 'query_stats', None)
+        return elapsed, response.status_code, stats.count if stats else None
+
+    def summarize(self, samples):
+        latencies = sorted(elapsed for elapsed, _, _ in samples)
+        percentiles = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+        queries = [count for _, _, count in samples if count is not None]
+        return {
+            'requests': len(samples),
+            'errors': sum(1 for _, status, _ in samples if status >= 400),
+            'throughput_rps': round(len(samples) / sum(latencies), 1),
+            'p50_ms': round(percentiles[49] * 1000, 2),
+            'p95_ms': round(percentiles[94] * 1000, 2),
+            'p99_ms': round(percentiles[98] * 1000, 2),
+            'queries_mean': round(statistics.mean(queries), 2) if queries else None,
+            'queries_max': max(queries) if queries else None,
+        }
+
+    def report(self, scenario, result):
+        self.stdout.write(
+            f"{scenario:<10} {result['throughput_rps']:>8} req/s  "
+            f"p50 {result['p50_ms']:>8} ms  p95 {result['p95_ms']:>8} ms  p99 {result['p99_ms']:>8} ms  "
+            f"queries {result['queries_mean']} (max {result['queries_max']})  errors {result['errors']}"
+        )
+
+    def compare(self, before, after):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Compared with {before.get('commit')} ({before.get('timestamp')}):"))
+        for scenario, result in after['scenarios'].items():
+            previous = before.get('scenarios', {}).get(scenario)
+            if not previous:
+                continue
+            changes = []
+            for key in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_mean'):
+                if previous.get(key) and result.get(key) is not None:
+                    changes.append(f"{key} {(result[key] - previous[key]) / previous[key]:+.0%}")
+            self.stdout.write(f"{scenario:<10} " + '  '.join(changes))
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,182 @@
+import asyncio
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from properties.models import Property
+from users.models import Profile
+
+# mode: (server interface, ASYNC_READ_VIEWS)
+MODES = {
+    'wsgi': ('wsgi', False),
+    'asgi-sync-views': ('asgi', False),
+    'asgi-async-views': ('asgi', True),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the property list/detail and public profile endpoints served over WSGI (a worker with "
+        "--threads threads) and ASGI (sync and async views) under many concurrent slow clients. "
+        "Runs in-process against the configured database, seed it with seed_benchmark_data first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=200, help="Concurrent clients.")
+        parser.add_argument('--requests', type=int, default=2000, help="Requests per mode.")
+        parser.add_argument('--client-delay', type=float, default=0.05, help="Seconds each client takes to read its response (slow mobile link).")
+        parser.add_argument('--threads', type=int, default=8, help="Threads of the WSGI worker.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--mode', choices=sorted(MODES), help="Run a single mode in this process (used internally).")
+
+    def handle(self, *args, **options):
+        # The same seed gives every mode the same requests
+        paths = self.request_paths(options['requests'], random.Random(options['seed']))
+        if options['mode']:
+            self.stdout.write(json.dumps(self.run_mode(options['mode'], paths, options)))
+            return
+
+        self.stdout.write(f"{options['requests']} requests, {options['concurrency']} concurrent clients, {options['client_delay'] * 1000:.0f} ms to read each response")
+        for mode, (_, async_views) in MODES.items():
+            # The URLconf picks the views at import, so each mode runs in its own process
+            command = [
+                sys.executable, 'manage.py', 'benchmark_async_views', '--mode', mode,
+                '--requests', str(options['requests']), '--seed', str(options['seed']), '--concurrency', str(options['concurrency']), '--client-delay', str(options['client_delay']),
+                '--threads', str(options['threads']),
+            ]
+            completed = subprocess.run(
+                command, cwd=settings.BASE_DIR, capture_output=True, text=True,
+                env={**os.environ, 'ASYNC_READ_VIEWS': str(async_views)},
+            )
+            if completed.returncode:
+                raise CommandError(f"{mode} failed:\n{completed.stderr}")
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            self.stdout.write(
+                f"{mode:<18} {result['throughput_rps']:>8} req/s  p50 {result['p50_ms']:>8} ms  "
+                f"p95 {result['p95_ms']:>8} ms  p99 {result['p99_ms']:>8} ms  errors {result['errors']}"
+            )
+
+    def request_paths(self, count, rng):
+        property_ids = list(Property.objects.order_by('-id').values_list('id', flat=True)[:1000])
+        user_ids = list(Profile.objects.order_by('-id').values_list('user_id', flat=True)[:1000])
+        if not property_ids:
+            raise CommandError("No properties, run seed_benchmark_data first.")
+        paths = []
+        for _ in range(count):
+            kind = rng.random()
+            if kind < 0.4:
+                paths.append(f"/properties/?page={rng.randint(1, 20)}")
+            elif kind < 0.8 or not user_ids:
+                paths.append(f"/properties/{rng.choice(property_ids)}/")
+            else:
+                paths.append(f"/users/see-profile/{rng.choice(user_ids)}/")
+        return paths
+
+    def run_mode(self, mode, paths, options):
+        interface, _ = MODES[mode]
+        with override_settings(ALLOWED_HOSTS=['*']):
+            if interface == 'wsgi':
+                latencies, errors, elapsed = asyncio.run(self.run_wsgi(paths, options))
+            else:
+                latencies, errors, elapsed = asyncio.run(self.run_asgi(paths, options))
+        latencies.sort()
+        percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+        return {
+            'throughput_rps': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentiles[49] * 1000, 1),
+            'p95_ms': round(percentiles[94] * 1000, 1),
+            'p99_ms': round(percentiles[98] * 1000, 1),
+            'errors': errors,
+        }
+
+    async def drive(self, paths, concurrency, request):
+        """
+        Run `concurrency` clients sending the paths one after the other.
+        """
+        queue = list(reversed(paths))
+        latencies, errors = [], 0
+
+        async def client():
+            nonlocal errors
+            while queue:
+                path = queue.pop()
+                start = time.perf_counter()
+                status = await request(path)
+                latencies.append(time.perf_counter() - start)
+                errors += status >= 500
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return latencies, errors, time.perf_counter() - start
+
+    async def run_asgi(self, paths, options):
+        from django.core.asgi import get_asgi_application
+
+        application = get_asgi_application()
+        delay = options['client_delay']
+
+        async def request(path):
+            path, _, query = path.partition('?')
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+                'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+                'headers': [(b'host', b'localhost')], 'client': ('127.0.0.1', 50000), 'server': ('localhost', 80),
+            }
+            body_sent = asyncio.Event()
+            status = 500
+
+            async def receive():
+                if not body_sent.is_set():
+                    body_sent.set()
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await asyncio.Event().wait()  # The client never disconnects early
+
+            async def send(message):
+                nonlocal status
+                if message['type'] == 'http.response.start':
+                    status = message['status']
+                elif not message.get('more_body'):
+                    await asyncio.sleep(delay)  # The slow client reads the body
+
+            await application(scope, receive, send)
+            return status
+
+        return await self.drive(paths, options['concurrency'], request)
+
+    async def run_wsgi(self, paths, options):
+        from django.core.wsgi import get_wsgi_application
+
+        application = get_wsgi_application()
+        delay = options['client_delay']
+        executor = ThreadPoolExecutor(max_workers=options['threads'])
+        loop = asyncio.get_running_loop()
+
+        def handle(path):
+            path, _, query = path.partition('?')
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+                'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': 'localhost',
+                'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+                'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False, 'wsgi.version': (1, 0),
+            }
+            statuses = []
+            body = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+            for _ in body:
+                pass
+            body.close()
+            time.sleep(delay)  # The worker thread is held while the slow client reads
+            return int(statuses[0].split()[0])
+
+        try:
+            return await self.drive(paths, options['concurrency'], lambda path: loop.run_in_executor(executor, handle, path))
+        finally:
+            executor.shutdown()
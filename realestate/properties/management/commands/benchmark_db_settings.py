@@ -0,0 +1,64 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# name: environment overrides, applied on top of the current environment
+CONFIGURATIONS = {
+    'new connection per request': {'DB_CONN_MAX_AGE': '0', 'DB_CONN_HEALTH_CHECKS': 'False', 'SQLITE_TUNING': 'False'},
+    'persistent': {'DB_CONN_MAX_AGE': '60', 'DB_CONN_HEALTH_CHECKS': 'False', 'SQLITE_TUNING': 'False'},
+    'persistent + health checks': {'DB_CONN_MAX_AGE': '60', 'DB_CONN_HEALTH_CHECKS': 'True', 'SQLITE_TUNING': 'False'},
+}
+SQLITE_CONFIGURATIONS = {
+    'persistent + health checks + PRAGMAs': {'DB_CONN_MAX_AGE': '60', 'DB_CONN_HEALTH_CHECKS': 'True', 'SQLITE_TUNING': 'True'},
+}
+POSTGRESQL_CONFIGURATIONS = {
+    'psycopg pool': {'DB_POOL': 'True', 'DB_CONN_HEALTH_CHECKS': 'False'},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests/second of the benchmark_api scenarios under each database connection setting. "
+        "Runs against the configured database, seed it with seed_benchmark_data first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', nargs='+', default=['list', 'detail', 'favorite'])
+        parser.add_argument('--requests', type=int, default=300, help="Measured requests per scenario and setting.")
+        parser.add_argument('--output', help="Write all results to this JSON file.")
+
+    def handle(self, *args, **options):
+        configurations = dict(CONFIGURATIONS)
+        if settings.DB_ENGINE == 'postgresql':
+            configurations.update(POSTGRESQL_CONFIGURATIONS)
+        else:
+            configurations.update(SQLITE_CONFIGURATIONS)
+
+        results = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for name, overrides in configurations.items():
+                output = Path(directory) / 'result.json'
+                # A fresh process per setting, the database settings are read at startup
+                command = [
+                    sys.executable, 'manage.py', 'benchmark_api', '--output', str(output),
+                    '--requests', str(options['requests']), '--scenarios', *options['scenarios'],
+                ]
+                completed = subprocess.run(command, cwd=settings.BASE_DIR, env={**os.environ, **overrides}, capture_output=True, text=True)
+                if completed.returncode:
+                    raise CommandError(f"benchmark_api failed with {name}:\n{completed.stderr}")
+                results[name] = json.loads(output.read_text())['scenarios']
+
+        width = max(len(name) for name in results)
+        self.stdout.write(f"{'requests/second':<{width}}  " + '  '.join(f"{scenario:>10}" for scenario in options['scenarios']))
+        for name, scenarios in results.items():
+            self.stdout.write(f"{name:<{width}}  " + '  '.join(f"{scenarios[scenario]['throughput_rps']:>10}" for scenario in options['scenarios']))
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2))
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}."))
@@ -0,0 +1,92 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from properties.models import Property, PropertyImage
+from properties.serializers import PropertySerializer, PropertyCardSerializer
+from realestate.renderers import FastJSONRenderer
+from users.models import User
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Compare the throughput (rows/second) of PropertySerializer and the PropertyCardSerializer fast path. Test rows are rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000, help="Number of properties to serialize.")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per measurement, the best one is kept.")
+
+    def measure(self, label, rows, repeat, func):
+        best = min(self.timed(func) for _ in range(repeat))
+        self.stdout.write(f"{label:<45} {rows / best:>12,.0f} rows/s")
+        return best
+
+    def timed(self, func):
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        try:
+            with transaction.atomic():
+                self.run(rows, repeat)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, rows, repeat):
+        owner = User.objects.create_user(email='benchmark@gmail.com', password=None)
+        properties = Property.objects.bulk_create([
+            Property(
+                owner=owner,
+                ptype=random.choice(['flat', 'villa', 'house']),
+                city=random.choice(['Damascus', 'Aleppo', 'Homs']),
+                number_of_rooms=random.randint(1, 8),
+                area=Decimal(random.randint(4000, 40000)) / 100,
+                location_text='Benchmark street',
+                price=Decimal(random.randint(100000, 90000000)) / 100,
+                is_for_rent=random.random() < 0.5,
+                latitude=Decimal('33.513800'),
+                longitude=Decimal('36.276500'),
+            )
+            for _ in range(rows)
+        ])
+        PropertyImage.objects.bulk_create([
+            PropertyImage(property=property_instance, image=f'propertiesphotos/benchmark/{property_instance.id}.jpg')
+            for property_instance in properties
+        ])
+
+        # Rows are loaded once up front; the main photo of the classic path is
+        # prefetched so that only serialization is compared, not the N+1 queries
+        queryset = Property.objects.filter(owner=owner).order_by('id')
+        instances = list(queryset)
+        first_images = {image.property_id: image for image in PropertyImage.objects.filter(property__owner=owner)}
+
+        class PrefetchedPropertySerializer(PropertySerializer):
+            def get_main_photo(self, obj):
+                first_image = first_images.get(obj.id)
+                return first_image.image.url if first_image else None
+
+        values = list(PropertyCardSerializer.values_queryset(queryset))
+
+        classic_data = PrefetchedPropertySerializer(instances, many=True).data
+        fast_data = PropertyCardSerializer(values, many=True).data
+        if [dict(row) for row in classic_data] != fast_data:
+            self.stderr.write(self.style.ERROR("The fast path output differs from PropertySerializer."))
+
+        self.stdout.write(f"Serializing {rows} properties, best of {repeat} runs:")
+        classic = self.measure("PropertySerializer", rows, repeat, lambda: PrefetchedPropertySerializer(instances, many=True).data)
+        fast = self.measure("PropertyCardSerializer", rows, repeat, lambda: PropertyCardSerializer(values, many=True).data)
+        classic_render = self.measure("PropertySerializer + JSONRenderer", rows, repeat, lambda: JSONRenderer().render(PrefetchedPropertySerializer(instances, many=True).data))
+        fast_render = self.measure("PropertyCardSerializer + FastJSONRenderer", rows, repeat, lambda: FastJSONRenderer().render(PropertyCardSerializer(values, many=True).data))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Serialization speedup: {classic / fast:.1f}x, with rendering: {classic_render / fast_render:.1f}x"
+        ))
@@ -0,0 +1,76 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter: set up Django, load the URLconf and middleware
+# through a first request, and report when each step finished.
+CHILD_SCRIPT = """
+import json, os, sys, time
+import django
+django.setup()
+setup_done = time.time()
+from django.test import Client
+response = Client(raise_request_exception=False).get(sys.argv[1])
+print(json.dumps({'setup_done': setup_done, 'first_response': time.time(), 'status': response.status_code,
+                  'drf_yasg_loaded': 'drf_yasg' in sys.modules}))
+"""
+
+
+class Command(BaseCommand):
+    help = "Measure worker cold start (python -X importtime and time to first request) with the API docs enabled and disabled."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/properties/facilities/', help="URL of the first request.")
+        parser.add_argument('--repeat', type=int, default=5, help="Cold starts per mode, the median is reported.")
+        parser.add_argument('--top', type=int, default=10, help="Number of slowest top-level imports to list.")
+
+    def cold_start(self, path, docs_enabled):
+        env = dict(os.environ, API_DOCS_ENABLED=str(docs_enabled), DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'realestate.settings'))
+        started = time.time()
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', CHILD_SCRIPT, path],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        report['setup'] = report['setup_done'] - started
+        report['first_request'] = report['first_response'] - started
+        report['imports'] = self.parse_importtime(result.stderr)
+        return report
+
+    def parse_importtime(self, output):
+        """
+        Return {top-level module: cumulative microseconds} from -X importtime output.
+        """
+        imports = {}
+        for line in output.splitlines():
+            if not line.startswith('import time:') or '|' not in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if not cumulative.strip().isdigit() or name.startswith('  '):
+                continue
+            # Unindented names are imported at top level, their cumulative time includes their children
+            imports[name.strip()] = imports.get(name.strip(), 0) + int(cumulative)
+        return imports
+
+    def handle(self, *args, **options):
+        path, repeat, top = options['path'], options['repeat'], options['top']
+
+        for docs_enabled in (True, False):
+            runs = [self.cold_start(path, docs_enabled) for _ in range(repeat)]
+            setup = statistics.median(run['setup'] for run in runs)
+            first_request = statistics.median(run['first_request'] for run in runs)
+            imports = runs[-1]['imports']
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"API_DOCS_ENABLED={docs_enabled}"))
+            self.stdout.write(f"  django.setup() done after   {setup * 1000:8.1f} ms")
+            self.stdout.write(f"  first response after        {first_request * 1000:8.1f} ms (status {runs[-1]['status']})")
+            self.stdout.write(f"  total top-level import time {sum(imports.values()) / 1000:8.1f} ms")
+            self.stdout.write(f"  drf_yasg imported:          {runs[-1]['drf_yasg_loaded']}")
+            for name, cumulative in sorted(imports.items(), key=lambda item: -item[1])[:top]:
+                self.stdout.write(f"    {cumulative / 1000:8.1f} ms  {name}")
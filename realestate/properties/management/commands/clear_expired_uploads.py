@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from properties.chunked_uploads import clear_expired_uploads
+
+
+class Command(BaseCommand):
+    help = "Delete the resumable image uploads that were abandoned, with their temporary files."
+
+    def handle(self, *args, **options):
+        count = clear_expired_uploads()
+        self.stdout.write(self.style.SUCCESS(f"Removed {count} expired uploads."))
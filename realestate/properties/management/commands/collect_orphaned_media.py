@@ -0,0 +1,98 @@
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from properties.models import PropertyImage, ImageBlob
+from properties import blobs
+from properties.chunked_uploads import CHUNKED_UPLOAD_DIR
+from users.models import Profile
+
+# Directories under MEDIA_ROOT holding files referenced by the database
+MEDIA_DIRECTORIES = ['propertiesphotos', 'userphotoes']
+
+
+class Command(BaseCommand):
+    help = "Delete media files no PropertyImage, ImageBlob or Profile references any more."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report the orphaned files.")
+        parser.add_argument('--grace-period', type=int, default=24, help="Hours a file must be old before it can be deleted, protects in-flight uploads.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Number of references loaded per query and files deleted per batch.")
+
+    def referenced_names(self, batch_size):
+        """
+        Load every referenced storage name into a set, streaming the rows.
+        """
+        names = set()
+        querysets = [
+            PropertyImage.objects.values_list('image', flat=True),
+            ImageBlob.objects.values_list('name', flat=True),
+            Profile.objects.exclude(photo='').exclude(photo__isnull=True).values_list('photo', flat=True),
+        ]
+        for queryset in querysets:
+            names.update(queryset.order_by().iterator(chunk_size=batch_size))
+        return names
+
+    def walk(self, directory):
+        """
+        Yield (path, stat) of every file below directory, without building the list.
+        """
+        try:
+            entries = os.scandir(directory)
+        except FileNotFoundError:
+            return
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from self.walk(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry.path, entry.stat(follow_symlinks=False)
+
+    def handle(self, *args, **options):
+        media_root = Path(settings.MEDIA_ROOT)
+        batch_size = options['batch_size']
+        cutoff = time.time() - options['grace_period'] * 3600
+        dry_run = options['dry_run']
+
+        if not dry_run:
+            # Unreferenced blobs whose background collection never ran, e.g. the process stopped first
+            for blob_id in list(ImageBlob.objects.filter(ref_count=0).values_list('id', flat=True)):
+                blobs.collect_blob(blob_id)
+
+        referenced = self.referenced_names(batch_size)
+        orphans, found, reclaimed, scanned = [], 0, 0, 0
+
+        def delete_batch():
+            for path in orphans:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            orphans.clear()
+
+        for directory in MEDIA_DIRECTORIES:
+            for path, stat in self.walk(media_root / directory):
+                scanned += 1
+                name = Path(path).relative_to(media_root).as_posix()
+                if name in referenced or stat.st_mtime > cutoff:
+                    continue
+                # Temporary files of resumable uploads are cleaned by clear_expired_uploads
+                if Path(path).is_relative_to(CHUNKED_UPLOAD_DIR):
+                    continue
+
+                found += 1
+                reclaimed += stat.st_size
+                if dry_run:
+                    self.stdout.write(name)
+                    continue
+                orphans.append(path)
+                if len(orphans) >= batch_size:
+                    delete_batch()
+
+        if not dry_run:
+            delete_batch()
+
+        verb = "Would reclaim" if dry_run else "Reclaimed"
+        self.stdout.write(self.style.SUCCESS(f"Scanned {scanned} files, {found} orphaned. {verb} {reclaimed} bytes."))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from properties.models import PropertyImage
+from properties import blobs
+
+
+class Command(BaseCommand):
+    help = "Move property images uploaded before content-addressed storage into shared blobs, deleting duplicate files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would be reclaimed.")
+        parser.add_argument('--batch-size', type=int, default=500, help="Number of images loaded per query.")
+
+    def handle(self, *args, **options):
+        storage = blobs.get_storage()
+        dry_run = options['dry_run']
+        migrated = missing = reclaimed = 0
+        seen = set()
+
+        legacy = PropertyImage.objects.filter(blob__isnull=True).only('id', 'image').order_by('id')
+        for image in legacy.iterator(chunk_size=options['batch_size']):
+            old_name = image.image.name
+            if not old_name or not storage.exists(old_name):
+                missing += 1
+                continue
+
+            with storage.open(old_name, 'rb') as content:
+                if dry_run:
+                    digest, size = blobs.hash_file(content)
+                    name = blobs.blob_name(digest, old_name)
+                    if name in seen or storage.exists(name):
+                        reclaimed += size
+                    seen.add(name)
+                    migrated += 1
+                    continue
+
+                digest, name, size = blobs.write_blob_file(content)
+                with transaction.atomic():
+                    blob = blobs.acquire_blob(digest, name, size, content)
+                    PropertyImage.objects.filter(pk=image.pk).update(image=blob.name, blob=blob)
+            if blob.ref_count > 1:
+                reclaimed += size
+            if old_name != blob.name:
+                storage.delete(old_name)
+            migrated += 1
+
+        verb = "Would migrate" if dry_run else "Migrated"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {migrated} images, {reclaimed} bytes reclaimed, {missing} images with missing files skipped."
+        ))
@@ -0,0 +1,19 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from realestate.schema import generate_schema
+
+
+class Command(BaseCommand):
+    help = "Generate the OpenAPI schema served by the swagger/redoc routes (run at build/deploy time)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.OPENAPI_SCHEMA_PATH, help="Where to write the schema.")
+
+    def handle(self, *args, **options):
+        body = generate_schema()
+        path = Path(options['output'])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(body)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(body)} bytes to {path}."))
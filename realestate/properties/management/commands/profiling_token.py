@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from realestate.profiling import HEADER, TOKEN_MAX_AGE, make_token
+
+
+class Command(BaseCommand):
+    help = "Print a signed header value that makes a request profiled (with PROFILING_ENABLED)."
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{HEADER}: {make_token()}")
+        self.stdout.write(f"Valid for {TOKEN_MAX_AGE // 3600} hours.")
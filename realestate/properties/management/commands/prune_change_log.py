@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from properties import changes
+
+
+class Command(BaseCommand):
+    help = "Delete old change feed entries. Clients whose cursor is older must download the catalog again."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=changes.RETENTION_DAYS, help="Keep the entries of the last DAYS days.")
+
+    def handle(self, *args, **options):
+        deleted = changes.prune(options['days'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} change log entries."))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from properties import cards
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized PropertyCard rows read by the list feed."
+
+    def handle(self, *args, **options):
+        count = cards.rebuild(stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} property cards."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from properties import recommendations
+
+
+class Command(BaseCommand):
+    help = "Recompute the precomputed 'similar properties' neighbor lists."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--city', help="Only rebuild the listings of this city.")
+        parser.add_argument('-k', type=int, default=recommendations.TOP_K, help="Number of neighbors kept per listing.")
+
+    def handle(self, *args, **options):
+        if options['city']:
+            count = recommendations.rebuild_city(options['city'], options['k'])
+        else:
+            count = recommendations.rebuild_all(options['k'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt similar properties for {count} listings."))
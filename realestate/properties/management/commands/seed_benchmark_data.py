@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from properties import benchmark_data
+
+
+class Command(BaseCommand):
+    help = "Seed users, properties, images, facilities and favorites for benchmark_api. Never run against production."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(benchmark_data.SCALES), default='10k', help="Number of properties to create.")
+        parser.add_argument('--properties', type=int, help="Exact number of properties, overrides --scale.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed, the same seed generates the same data.")
+        parser.add_argument('--clear', action='store_true', help="Delete the existing benchmark data first.")
+
+    def handle(self, *args, **options):
+        properties = options['properties'] or benchmark_data.SCALES[options['scale']]
+        if properties < 1:
+            raise CommandError("--properties must be positive.")
+
+        if options['clear']:
+            deleted = benchmark_data.clear()
+            self.stdout.write(f"Deleted {deleted} benchmark rows.")
+
+        start = time.perf_counter()
+        counts = benchmark_data.seed(properties, seed=options['seed'], stdout=self.stdout)
+        elapsed = time.perf_counter() - start
+
+        summary = ', '.join(f"{count} {table}" for table, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Created {summary} in {elapsed:.1f}s."))
+        self.stdout.write("Run rebuild_similar_properties and rebuild_property_cards to compute the similar listings and list cards of the new properties.")
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from properties.saved_searches import drain_notifications, NOTIFICATION_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Email the pending saved-search matches, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=NOTIFICATION_BATCH_SIZE, help="Number of users read per batch.")
+
+    def handle(self, *args, **options):
+        sent = drain_notifications(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} saved-search matches."))
@@ -0,0 +1,27 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = "Copy the SQLite primary into the SQLite replica files (DB_REPLICAS), for trying the replica router locally."
+
+    def handle(self, *args, **options):
+        if settings.DB_ENGINE != 'sqlite':
+            raise CommandError("Only SQLite replicas can be synced, PostgreSQL replicas use streaming replication.")
+        if not settings.DB_REPLICAS:
+            raise CommandError("No replicas configured, set DB_REPLICAS to a list of database files.")
+
+        primary = connections['default']
+        primary.ensure_connection()
+        for alias in settings.DATABASES:
+            if alias == 'default':
+                continue
+            name = settings.DATABASES[alias]['NAME']
+            connections[alias].close()
+            # Online backup, consistent even while the primary is being written
+            with sqlite3.connect(name) as replica:
+                primary.connection.backup(replica)
+            self.stdout.write(self.style.SUCCESS(f"Copied the primary into {alias} ({name})."))
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0003_alter_favoriteproperty_property_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarProperty',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_links', to='properties.property')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_to_links', to='properties.property')),
+            ],
+            options={
+                'ordering': ['property', 'rank'],
+                'indexes': [models.Index(fields=['property', 'rank'], name='properties__propert_dd5f90_idx')],
+                'unique_together': {('property', 'similar')},
+            },
+        ),
+    ]
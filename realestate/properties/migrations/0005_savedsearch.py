@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:31
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0004_similarproperty'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedSearch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(blank=True, default='', max_length=100)),
+                ('ptype', models.CharField(blank=True, choices=[('flat', 'Flat'), ('villa', 'Villa'), ('house', 'House')], default='', max_length=10)),
+                ('is_for_rent', models.BooleanField(blank=True, null=True)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True, validators=[django.core.validators.MinValueValidator(0)])),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True, validators=[django.core.validators.MinValueValidator(0)])),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_searches', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SavedSearchMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('notified_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_search_matches', to='properties.property')),
+                ('saved_search', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='properties.savedsearch')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='savedsearch',
+            index=models.Index(fields=['city', 'ptype', 'is_for_rent'], name='properties__city_91195a_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='savedsearchmatch',
+            unique_together={('saved_search', 'property')},
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:34
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0005_savedsearch'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageUploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255)),
+                ('caption', models.CharField(blank=True, max_length=255, null=True)),
+                ('total_size', models.PositiveBigIntegerField()),
+                ('received_bytes', models.PositiveBigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+                ('property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='properties.property')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
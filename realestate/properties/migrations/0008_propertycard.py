@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0007_imageblob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertyCard',
+            fields=[
+                ('property', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='properties.property')),
+                ('owner', models.BigIntegerField()),
+                ('ptype', models.CharField(choices=[('flat', 'Flat'), ('villa', 'Villa'), ('house', 'House')], max_length=10)),
+                ('city', models.CharField(db_index=True, max_length=100)),
+                ('number_of_rooms', models.PositiveIntegerField()),
+                ('location_text', models.TextField()),
+                ('is_for_rent', models.BooleanField(db_index=True)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('area', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('price_text', models.CharField(max_length=20)),
+                ('area_text', models.CharField(max_length=20)),
+                ('latitude_text', models.CharField(blank=True, max_length=20, null=True)),
+                ('longitude_text', models.CharField(blank=True, max_length=20, null=True)),
+                ('main_photo', models.CharField(blank=True, max_length=500, null=True)),
+                ('facility_mask', models.BigIntegerField(default=0)),
+                ('favorites_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0008_propertycard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='property',
+            name='facility_mask',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0009_property_facility_mask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('property', 'Property'), ('favorite', 'Favorite')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('user', models.BigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+from collections import defaultdict
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+MAX_FACILITY_ID = 63  # As in properties.facility_bits when this migration was written
+
+
+def backfill_facility_masks(apps, schema_editor):
+    """
+    Compute the facility_mask of the properties (and their cards) that existed before 0009 added it.
+    """
+    Property = apps.get_model('properties', 'Property')
+    PropertyCard = apps.get_model('properties', 'PropertyCard')
+    PropertyFacility = apps.get_model('properties', 'PropertyFacility')
+    last_id = 0
+    while True:
+        property_ids = list(Property.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:BATCH_SIZE])
+        if not property_ids:
+            return
+        masks = defaultdict(int)
+        rows = PropertyFacility.objects.filter(property_id__in=property_ids, facility_id__lte=MAX_FACILITY_ID)
+        for property_id, facility_id in rows.values_list('property_id', 'facility_id'):
+            masks[property_id] |= 1 << (facility_id - 1)
+        for property_id, mask in masks.items():
+            Property.objects.filter(id=property_id).update(facility_mask=mask)
+            PropertyCard.objects.filter(property_id=property_id).update(facility_mask=mask)
+        last_id = property_ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0010_changelogentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_facility_masks, migrations.RunPython.noop),
+    ]
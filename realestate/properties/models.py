@@ -1,9 +1,13 @@
+import uuid
 from django.db import models
 from django.contrib.auth import get_user_model
 
 from django.core.validators import MinValueValidator
 
 User = get_user_model()
+
+MAX_IMAGES_PER_PROPERTY = 10
+
 def property_directory_path(instance, filename):
     """
     Define the upload path for property images.
@@ -40,18 +44,52 @@ class Property(models.Model):
         through='PropertyFacility',
         related_name='properties'
     )
+    # Bitmask of the facilities (see properties.facility_bits), kept in step with PropertyFacility
+    facility_mask = models.BigIntegerField(default=0)
     
     def __str__(self):
         return f"{self.ptype} in {self.city} ({'For Rent' if self.is_for_rent else 'For Sale'})"
     
     
+class ImageBlob(models.Model):
+    """
+    A stored image file, addressed by the SHA-256 of its content and shared by
+    every PropertyImage with the same bytes. The file is deleted when
+    ref_count drops to zero (see properties.blobs).
+    """
+    sha256 = models.CharField(max_length=64, db_index=True)
+    name = models.CharField(max_length=255, unique=True)  # Storage path: <digest><ext>
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} references)"
+
 class PropertyImage(models.Model):
     property = models.ForeignKey('Property', on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to=property_directory_path)
     caption = models.CharField(max_length=255, blank=True, null=True)
+    # Null only for images uploaded before content-addressed storage, see dedupe_property_images
+    blob = models.ForeignKey(ImageBlob, on_delete=models.PROTECT, related_name='images', blank=True, null=True)
 
     def __str__(self):
         return f"Image for {self.property}"
+
+    def save(self, *args, **kwargs):
+        from .blobs import store_image, release_blob
+
+        # New uploads are stored once per content hash instead of once per row
+        replaced_blob_id = None
+        if self.image and not self.image._committed:
+            if self.pk:
+                replaced_blob_id = PropertyImage.objects.filter(pk=self.pk).values_list('blob_id', flat=True).first()
+            self.blob = store_image(self.image)
+            self.image = self.blob.name
+        super().save(*args, **kwargs)
+
+        if replaced_blob_id:
+            release_blob(replaced_blob_id)
     
 
 class PropertyFacility(models.Model):
@@ -72,4 +110,136 @@ class FavoriteProperty(models.Model):
         unique_together = ('user', 'property')
 
     def __str__(self):
-        return f"{self.user}'s favorite: {self.property}"
\ No newline at end of file
+        return f"{self.user}'s favorite: {self.property}"
+
+class SimilarProperty(models.Model):
+    """
+    Precomputed neighbor list entry: `similar` is the rank-th closest listing
+    to `property` within the same city. Rebuilt by properties.recommendations.
+    """
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='similar_links')
+    similar = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='similar_to_links')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('property', 'similar')
+        indexes = [
+            models.Index(fields=['property', 'rank']),
+        ]
+        ordering = ['property', 'rank']
+
+    def __str__(self):
+        return f"{self.similar} similar to {self.property} (#{self.rank})"
+
+class SavedSearch(models.Model):
+    """
+    Filters a buyer wants to be alerted about. Empty city/ptype and a null
+    is_for_rent mean "any"; city is stored lowercased for exact index lookups.
+    """
+    user = models.ForeignKey('users.User', on_delete=models.CASCADE, related_name='saved_searches')
+    city = models.CharField(max_length=100, blank=True, default='')
+    ptype = models.CharField(max_length=10, choices=Property.PROPERTY_TYPES, blank=True, default='')
+    is_for_rent = models.BooleanField(blank=True, null=True)
+    min_price = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True, validators=[MinValueValidator(0)])
+    max_price = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True, validators=[MinValueValidator(0)])
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['city', 'ptype', 'is_for_rent']),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.city = (self.city or '').strip().lower()
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Saved search of {self.user}: {self.ptype or 'any'} in {self.city or 'any city'}"
+
+class SavedSearchMatch(models.Model):
+    """
+    Notification queue entry: a listing that matched a saved search.
+    Pending while notified_at is null.
+    """
+    saved_search = models.ForeignKey(SavedSearch, on_delete=models.CASCADE, related_name='matches')
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='saved_search_matches')
+    created_at = models.DateTimeField(auto_now_add=True)
+    notified_at = models.DateTimeField(blank=True, null=True, db_index=True)
+
+    class Meta:
+        unique_together = ('saved_search', 'property')
+
+    def __str__(self):
+        return f"{self.property} matches {self.saved_search}"
+
+class ImageUploadSession(models.Model):
+    """
+    A resumable, chunked image upload. Chunks are appended to a temporary file
+    (see properties.chunked_uploads) until received_bytes reaches total_size,
+    then the upload is finalized into a PropertyImage.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    property = models.ForeignKey(Property, on_delete=models.CASCADE, related_name='upload_sessions')
+    user = models.ForeignKey('users.User', on_delete=models.CASCADE, related_name='image_upload_sessions')
+    filename = models.CharField(max_length=255)
+    caption = models.CharField(max_length=255, blank=True, null=True)
+    total_size = models.PositiveBigIntegerField()
+    received_bytes = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"Upload of {self.filename} for {self.property} ({self.received_bytes}/{self.total_size})"
+
+class PropertyCard(models.Model):
+    """
+    Denormalized list card of a property: the card fields pre-rendered as
+    the list returns them, the main photo URL, a facility bitmask (see
+    properties.facility_bits) and the favorites count, so the list feed
+    reads one table without joins. Kept in sync by properties.cards and
+    rebuilt by `manage.py rebuild_property_cards`.
+    """
+    property = models.OneToOneField(Property, on_delete=models.CASCADE, primary_key=True, related_name='card')
+    owner = models.BigIntegerField()  # Owner id, no relation so reads never join
+    ptype = models.CharField(max_length=10, choices=Property.PROPERTY_TYPES)
+    city = models.CharField(max_length=100, db_index=True)
+    number_of_rooms = models.PositiveIntegerField()
+    location_text = models.TextField()  # For the search filter
+    is_for_rent = models.BooleanField(db_index=True)
+    price = models.DecimalField(max_digits=12, decimal_places=2)  # For ordering
+    area = models.DecimalField(max_digits=10, decimal_places=2)  # For ordering
+    price_text = models.CharField(max_length=20)
+    area_text = models.CharField(max_length=20)
+    latitude_text = models.CharField(max_length=20, blank=True, null=True)
+    longitude_text = models.CharField(max_length=20, blank=True, null=True)
+    main_photo = models.CharField(max_length=500, blank=True, null=True)
+    facility_mask = models.BigIntegerField(default=0)
+    favorites_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Card of {self.property_id}"
+
+class ChangeLogEntry(models.Model):
+    """
+    One entry of the sync feed (GET /properties/changes/): property
+    `object_id` was changed or deleted, or, for kind 'favorite', the
+    favorite of `user` on it was added or removed. The id is the feed
+    cursor. Entries only say what changed; the feed serves the current
+    state, so deletes need no other tombstone. Written by
+    properties.changes, pruned by `manage.py prune_change_log`.
+    """
+    PROPERTY = 'property'
+    FAVORITE = 'favorite'
+    KIND_CHOICES = [
+        (PROPERTY, 'Property'),
+        (FAVORITE, 'Favorite'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()  # Property id, no relation so it outlives the property
+    user = models.BigIntegerField(blank=True, null=True)  # Owner of the favorite, only for favorites
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} changed (#{self.id})"
@@ -0,0 +1,30 @@
+from django.core.paginator import InvalidPage
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+
+
+class PropertyPagination(PageNumberPagination):
+    """
+    PageNumberPagination that can also page through the async ORM, for
+    AsyncPropertyListView.
+    """
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Async paginate_queryset: the count and the page rows are loaded with
+        the async ORM, the page math and links stay PageNumberPagination's.
+        """
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()  # Otherwise Paginator.count would query synchronously
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+        self.page.object_list = [row async for row in self.page.object_list]
+        return self.page.object_list
@@ -0,0 +1,288 @@
+"""
+"Similar properties" recommender.
+
+Every listing is turned into a feature vector (price, area, rooms, type,
+rent/sale and facilities), neighbors are computed per city with NumPy and the
+top-K of each listing are stored in the SimilarProperty table, so the detail
+page can read them back with a single indexed query.
+
+Writes do not refresh the lists themselves: they queue the changed listings
+with schedule_refresh() and a background thread applies the queue in batches.
+"""
+import logging
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .models import Property, PropertyFacility, SimilarProperty
+from .facility_catalog import get_facilities
+
+TOP_K = getattr(settings, 'SIMILAR_PROPERTIES_TOP_K', 10)
+
+# Rows of the distance matrix computed at once, keeps memory bounded for big cities
+BLOCK_SIZE = 512
+
+# Relative weight of each feature group in the distance
+NUMERIC_WEIGHT = 1.0
+PTYPE_WEIGHT = 1.0
+RENT_WEIGHT = 3.0  # Rent and sale listings should rarely be mixed
+FACILITY_WEIGHT = 1.0
+
+PTYPES = [choice for choice, _ in Property.PROPERTY_TYPES]
+
+# Seconds the refresh worker waits after a change to collect the ones that follow it
+REFRESH_DELAY = getattr(settings, 'SIMILAR_PROPERTIES_REFRESH_DELAY', 2)
+
+# Apply queued refreshes right after the commit, in the calling thread (tests, scripts)
+REFRESH_SYNC = getattr(settings, 'SIMILAR_PROPERTIES_SYNC', False)
+
+logger = logging.getLogger(__name__)
+
+_pending = set()
+_pending_lock = threading.Lock()
+_wakeup = threading.Event()
+_worker = None
+
+
+def _load_partition(city):
+    """
+    Build the normalized feature matrix of every property in a city.
+    Returns (ids, matrix) where matrix[i] is the vector of ids[i].
+    """
+    rows = list(
+        Property.objects.filter(city=city)
+        .order_by('id')
+        .values_list('id', 'ptype', 'is_for_rent', 'price', 'area', 'number_of_rooms')
+    )
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    if not rows:
+        return ids, np.empty((0, 0))
+
+    position = {property_id: i for i, property_id in enumerate(ids.tolist())}
+
+    # Price and area are log-scaled, then everything is z-scored inside the city
+    numeric = np.array(
+        [[np.log1p(float(row[3])), np.log1p(float(row[4])), float(row[5])] for row in rows]
+    )
+    std = numeric.std(axis=0)
+    std[std == 0] = 1.0
+    numeric = (numeric - numeric.mean(axis=0)) / std * NUMERIC_WEIGHT
+
+    ptype = np.zeros((len(rows), len(PTYPES)))
+    for i, row in enumerate(rows):
+        if row[1] in PTYPES:
+            ptype[i, PTYPES.index(row[1])] = PTYPE_WEIGHT
+
+    rent = np.array([[RENT_WEIGHT if row[2] else 0.0] for row in rows])
+
+    facility_columns = {facility_id: i for i, facility_id in enumerate(get_facilities())}
+    facilities = np.zeros((len(rows), max(len(facility_columns), 1)))
+    links = PropertyFacility.objects.filter(property__city=city).values_list('property_id', 'facility_id')
+    for property_id, facility_id in links:
+        if facility_id in facility_columns:
+            facilities[position[property_id], facility_columns[facility_id]] = 1.0
+    if facility_columns:
+        # Scale so that the whole facility group weighs as much as a single feature
+        facilities *= FACILITY_WEIGHT / np.sqrt(len(facility_columns))
+
+    return ids, np.hstack([numeric, ptype, rent, facilities])
+
+
+def _top_k(matrix, rows, k):
+    """
+    Return (indices, scores) of the k nearest neighbors of matrix[rows].
+    Distances are euclidean, scores are 1 / (1 + distance).
+    """
+    squared = np.einsum('ij,ij->i', matrix, matrix)
+    all_indices, all_scores = [], []
+    for start in range(0, len(rows), BLOCK_SIZE):
+        block = rows[start:start + BLOCK_SIZE]
+        distances = squared[block, None] + squared[None, :] - 2 * matrix[block] @ matrix.T
+        distances[np.arange(len(block)), block] = np.inf  # A listing is not similar to itself
+        np.maximum(distances, 0, out=distances)
+
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+        order = np.argsort(nearest_distances, axis=1)
+        all_indices.append(np.take_along_axis(nearest, order, axis=1))
+        all_scores.append(1.0 / (1.0 + np.sqrt(np.take_along_axis(nearest_distances, order, axis=1))))
+    return np.vstack(all_indices), np.vstack(all_scores)
+
+
+def _store(ids, rows, indices, scores):
+    """
+    Replace the neighbor lists of ids[rows] with the computed ones.
+    """
+    links = [
+        SimilarProperty(property_id=int(ids[row]), similar_id=int(ids[j]), rank=rank, score=float(score))
+        for row, neighbor_row, score_row in zip(rows, indices, scores)
+        for rank, (j, score) in enumerate(zip(neighbor_row, score_row), start=1)
+    ]
+    with transaction.atomic():
+        SimilarProperty.objects.filter(property_id__in=[int(ids[row]) for row in rows]).delete()
+        SimilarProperty.objects.bulk_create(links, batch_size=1000)
+
+
+def rebuild_city(city, k=TOP_K):
+    """
+    Recompute the neighbor lists of every property in a city.
+    """
+    ids, matrix = _load_partition(city)
+    if len(ids) < 2:
+        SimilarProperty.objects.filter(property_id__in=ids.tolist()).delete()
+        return 0
+
+    rows = np.arange(len(ids))
+    indices, scores = _top_k(matrix, rows, min(k, len(ids) - 1))
+    _store(ids, rows, indices, scores)
+    return len(ids)
+
+
+def rebuild_all(k=TOP_K):
+    """
+    Recompute the neighbor lists of every property, one city at a time.
+    """
+    cities = Property.objects.order_by().values_list('city', flat=True).distinct()
+    return sum(rebuild_city(city, k) for city in cities)
+
+
+def refresh_property(property_id, k=TOP_K):
+    """
+    Update the neighbor lists after a single listing was created or edited.
+
+    Only the listing itself and the listings whose top-K it enters or leaves
+    are rewritten, instead of the whole city.
+    """
+    try:
+        city = Property.objects.values_list('city', flat=True).get(id=property_id)
+    except Property.DoesNotExist:
+        return
+
+    # The listing may have moved to another city: drop it from the lists of the
+    # old city and fill them again without it
+    moved_from = SimilarProperty.objects.filter(similar_id=property_id).exclude(property__city=city)
+    old_owners = list(moved_from.values_list('property_id', flat=True))
+    if old_owners:
+        moved_from.delete()
+        refresh_lists(old_owners, k)
+
+    ids, matrix = _load_partition(city)
+    if len(ids) < 2:
+        SimilarProperty.objects.filter(property_id=property_id).delete()
+        return
+    k = min(k, len(ids) - 1)
+    row = int(np.searchsorted(ids, property_id))
+
+    # Score of the changed listing against everyone else in the city
+    distances = np.sqrt(np.maximum(((matrix - matrix[row]) ** 2).sum(axis=1), 0))
+    new_scores = 1.0 / (1.0 + distances)
+
+    # Current state of the other lists: their weakest score and whether they contain the listing
+    weakest, sizes, contains = {}, {}, set()
+    for owner_id, similar_id, score in SimilarProperty.objects.filter(property_id__in=ids.tolist()).values_list('property_id', 'similar_id', 'score'):
+        weakest[owner_id] = min(score, weakest.get(owner_id, score))
+        sizes[owner_id] = sizes.get(owner_id, 0) + 1
+        if similar_id == property_id:
+            contains.add(owner_id)
+
+    affected = [row]
+    for i, owner_id in enumerate(ids.tolist()):
+        if owner_id == property_id:
+            continue
+        if owner_id in contains or sizes.get(owner_id, 0) < k or new_scores[i] > weakest[owner_id]:
+            affected.append(i)
+
+    rows = np.array(affected)
+    indices, scores = _top_k(matrix, rows, k)
+    _store(ids, rows, indices, scores)
+
+
+def refresh_lists(property_ids, k=TOP_K):
+    """
+    Recompute the lists of the given listings, e.g. the ones that pointed to a
+    deleted listing. The city partitions are loaded once per city.
+    """
+    by_city = {}
+    for property_id, city in Property.objects.filter(id__in=property_ids).values_list('id', 'city'):
+        by_city.setdefault(city, []).append(property_id)
+
+    for city, city_property_ids in by_city.items():
+        ids, matrix = _load_partition(city)
+        if len(ids) < 2:
+            SimilarProperty.objects.filter(property_id__in=city_property_ids).delete()
+            continue
+        rows = np.searchsorted(ids, sorted(city_property_ids))
+        indices, scores = _top_k(matrix, rows, min(k, len(ids) - 1))
+        _store(ids, rows, indices, scores)
+
+
+def process(property_ids, k=TOP_K):
+    """
+    Apply a batch of queued changes. A city with a single changed listing is
+    refreshed incrementally, a city with several is rebuilt once.
+    """
+    by_city = {}
+    for property_id, city in Property.objects.filter(id__in=property_ids).values_list('id', 'city'):
+        by_city.setdefault(city, []).append(property_id)
+
+    for city, city_property_ids in by_city.items():
+        if len(city_property_ids) == 1:
+            refresh_property(city_property_ids[0], k)
+        else:
+            rebuild_city(city, k)
+            # Listings that just left this city still sit in lists of their old one
+            refresh_lists(
+                SimilarProperty.objects.filter(similar_id__in=city_property_ids)
+                .exclude(property__city=city)
+                .values_list('property_id', flat=True)
+                .distinct(),
+                k,
+            )
+
+
+def schedule_refresh(property_ids):
+    """
+    Queue listings whose neighbor lists are stale, once the current transaction commits.
+    A listing queued several times before the worker runs is refreshed once.
+    """
+    property_ids = list(property_ids)
+    if property_ids:
+        transaction.on_commit(lambda: _enqueue(property_ids))
+
+
+def _enqueue(property_ids):
+    if REFRESH_SYNC:
+        process(property_ids)
+        return
+    with _pending_lock:
+        _pending.update(property_ids)
+    _start_worker()
+    _wakeup.set()
+
+
+def _start_worker():
+    global _worker
+    with _pending_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name='similar-properties-refresh', daemon=True)
+            _worker.start()
+
+
+def _run():
+    while True:
+        _wakeup.wait()
+        time.sleep(REFRESH_DELAY)
+        _wakeup.clear()
+        with _pending_lock:
+            property_ids = list(_pending)
+            _pending.clear()
+        try:
+            process(property_ids)
+        except Exception:
+            # The lists stay stale until the next change or rebuild_similar_properties
+            logger.exception("Refreshing similar properties of %d listings failed", len(property_ids))
+        finally:
+            close_old_connections()
@@ -0,0 +1,119 @@
+"""
+Matching of new/edited listings against buyers' saved searches.
+
+A listing is matched with one indexed lookup on (city, ptype, is_for_rent),
+where empty values stand for "any", followed by the price range checks, so
+the cost grows with the number of saved listings and not with the number of
+saved searches. Matches are queued in SavedSearchMatch and sent in batches
+by drain_notifications().
+"""
+import logging
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import SavedSearch, SavedSearchMatch
+
+NOTIFICATION_BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+
+def find_matching_searches(property_instance):
+    """
+    Return the saved searches a listing satisfies, excluding the owner's own.
+    """
+    return (
+        SavedSearch.objects.filter(
+            city__in=['', property_instance.city.strip().lower()],
+            ptype__in=['', property_instance.ptype],
+        )
+        .filter(Q(is_for_rent__isnull=True) | Q(is_for_rent=property_instance.is_for_rent))
+        .filter(Q(min_price__isnull=True) | Q(min_price__lte=property_instance.price))
+        .filter(Q(max_price__isnull=True) | Q(max_price__gte=property_instance.price))
+        .exclude(user_id=property_instance.owner_id)
+    )
+
+
+def match_saved_searches(property_instance):
+    """
+    Queue a notification for every saved search the listing matches.
+    A search is only notified once per listing, even if the listing is edited.
+    """
+    matches = [
+        SavedSearchMatch(saved_search_id=search_id, property=property_instance)
+        for search_id in find_matching_searches(property_instance).values_list('id', flat=True)
+    ]
+    SavedSearchMatch.objects.bulk_create(matches, ignore_conflicts=True)
+    return len(matches)
+
+
+def _notify_user(user, properties):
+    subject = "New properties match your saved search"
+    lines = [f"- {property_instance} for {property_instance.price}" for property_instance in properties]
+    message = (
+        f"Hello from RealEstate,\n\n"
+        f"These new listings match your saved searches:\n"
+        + "\n".join(lines)
+        + "\n\nThank you,\nRealEstate Team"
+    )
+    send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [user.email], fail_silently=False)
+
+
+def _send_user_matches(user_id):
+    """
+    Email one user their pending matches. The matches are claimed (marked
+    notified) in a short transaction of their own, the email is sent after
+    it commits, and a failed email releases them again, so no lock is held
+    during the SMTP round trip. Returns the number of matches that were sent.
+    """
+    with transaction.atomic():
+        # Only the match rows are locked, not the users and listings they point to
+        match_ids = list(
+            SavedSearchMatch.objects.filter(notified_at__isnull=True, saved_search__user_id=user_id)
+            .select_for_update(skip_locked=True, of=('self',))
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
+        if not match_ids:
+            return 0
+        SavedSearchMatch.objects.filter(id__in=match_ids).update(notified_at=timezone.now())
+
+    matches = list(SavedSearchMatch.objects.filter(id__in=match_ids).select_related('saved_search__user', 'property').order_by('id'))
+    # A listing matching several searches of the user is only listed once
+    properties = {match.property_id: match.property for match in matches}
+    try:
+        _notify_user(matches[0].saved_search.user, properties.values())
+    except Exception:
+        SavedSearchMatch.objects.filter(id__in=match_ids).update(notified_at=None)
+        raise
+    return len(match_ids)
+
+
+def drain_notifications(batch_size=NOTIFICATION_BATCH_SIZE):
+    """
+    Send the pending matches, one email per user, reading batch_size users at a time.
+    A failed email leaves only that user's matches pending for the next run.
+    Returns the number of matches that were sent.
+    """
+    sent = 0
+    last_user_id = 0
+    while True:
+        user_ids = list(
+            SavedSearchMatch.objects.filter(notified_at__isnull=True, saved_search__user_id__gt=last_user_id)
+            .order_by('saved_search__user_id')
+            .values_list('saved_search__user_id', flat=True)
+            .distinct()[:batch_size]
+        )
+        if not user_ids:
+            return sent
+
+        last_user_id = user_ids[-1]
+        for user_id in user_ids:
+            try:
+                sent += _send_user_matches(user_id)
+            except Exception:
+                logger.exception("Sending saved-search matches to user %s failed", user_id)
@@ -1,5 +1,9 @@
 from rest_framework import serializers
-from .models import Property, PropertyImage,Facility
+from .models import Property, PropertyImage,Facility,SavedSearch,ImageUploadSession,MAX_IMAGES_PER_PROPERTY
+from .facility_catalog import get_facility, find_facilities
+from django.db.models import OuterRef, Subquery
+
+_image_storage = PropertyImage._meta.get_field('image').storage
 
 class CoordinateValidationMixin:
     def validate_latitude(self, value):
@@ -37,6 +41,81 @@ class PropertySerializer(CoordinateValidationMixin,serializers.ModelSerializer):
         first_image = obj.images.first()
         return first_image.image.url if first_image else None
     
+class PropertyCardSerializer(serializers.BaseSerializer):
+    """
+    Read-only fast path for list cards. Builds the same output as
+    PropertySerializer straight from `.values()` rows (see values_queryset),
+    skipping the per-field machinery and the per-row main photo query.
+    """
+    VALUE_FIELDS = ['id', 'owner', 'ptype', 'city', 'number_of_rooms', 'area', 'price', 'is_for_rent', 'latitude', 'longitude']
+
+    @classmethod
+    def values_queryset(cls, queryset):
+        first_photo = PropertyImage.objects.filter(property=OuterRef('pk')).order_by('id').values('image')[:1]
+        return queryset.annotate(main_photo_path=Subquery(first_photo)).values(*cls.VALUE_FIELDS, 'main_photo_path')
+
+    def to_representation(self, row):
+        main_photo_path = row['main_photo_path']
+        latitude = row['latitude']
+        longitude = row['longitude']
+        return {
+            'id': row['id'],
+            'owner': row['owner'],
+            'ptype': row['ptype'],
+            'city': row['city'],
+            'number_of_rooms': row['number_of_rooms'],
+            # Decimals are rendered as fixed-point strings, like DRF's DecimalField
+            'area': f"{row['area']:f}",
+            'price': f"{row['price']:f}",
+            'is_for_rent': row['is_for_rent'],
+            'latitude': None if latitude is None else f"{latitude:f}",
+            'longitude': None if longitude is None else f"{longitude:f}",
+            'main_photo': _image_storage.url(main_photo_path) if main_photo_path else None,
+        }
+
+class StoredPropertyCardSerializer(serializers.BaseSerializer):
+    """
+    Read-only list card from the PropertyCard read model. Same output as
+    PropertyCardSerializer, from one flat row with the values pre-rendered.
+    """
+    VALUE_FIELDS = [
+        'property_id', 'owner', 'ptype', 'city', 'number_of_rooms', 'area_text', 'price_text',
+        'is_for_rent', 'latitude_text', 'longitude_text', 'main_photo',
+    ]
+
+    @classmethod
+    def values_queryset(cls, queryset):
+        return queryset.values(*cls.VALUE_FIELDS)
+
+    def to_representation(self, row):
+        return {
+            'id': row['property_id'],
+            'owner': row['owner'],
+            'ptype': row['ptype'],
+            'city': row['city'],
+            'number_of_rooms': row['number_of_rooms'],
+            'area': row['area_text'],
+            'price': row['price_text'],
+            'is_for_rent': row['is_for_rent'],
+            'latitude': row['latitude_text'],
+            'longitude': row['longitude_text'],
+            'main_photo': row['main_photo'],
+        }
+
+class SimilarPropertySerializer(PropertySerializer):
+    """
+    Card of a similar listing. Expects `score` and `main_photo_path` to be
+    attached to the property, so no extra query is made per row.
+    """
+    score = serializers.FloatField(read_only=True)
+
+    class Meta(PropertySerializer.Meta):
+        fields = PropertySerializer.Meta.fields + ['score']
+
+    def get_main_photo(self, obj):
+        if not obj.main_photo_path:
+            return None
+        return PropertyImage._meta.get_field('image').storage.url(obj.main_photo_path)
       
 
 class PropertyImageSerializer(serializers.ModelSerializer):
@@ -50,7 +129,8 @@ class PropertyImageSerializer(serializers.ModelSerializer):
     def get_image_url(self, obj):
         if obj.image:
             request = self.context.get('request')
-            return request.build_absolute_uri(obj.image.url)
+            # Without a request the URL stays relative, like the image field
+            return request.build_absolute_uri(obj.image.url) if request else obj.image.url
         return None
 
     def validate(self, data):
@@ -68,13 +148,24 @@ class PropertyImageSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Invalid property ID.")
 
         # Ensure the property doesn't exceed the maximum number of images
-        if property_instance.images.count() >= 10:
-            raise serializers.ValidationError("A property cannot have more than 10 images.")
+        if property_instance.images.count() >= MAX_IMAGES_PER_PROPERTY:
+            raise serializers.ValidationError(f"A property cannot have more than {MAX_IMAGES_PER_PROPERTY} images.")
 
        
 
         return data
     
+class BulkPropertyImageSerializer(serializers.Serializer):
+    images = serializers.ListField(child=serializers.ImageField(), allow_empty=False, max_length=MAX_IMAGES_PER_PROPERTY)
+    captions = serializers.ListField(child=serializers.CharField(max_length=255, allow_blank=True), required=False)
+
+    def validate(self, data):
+        # Captions are optional, but when given they must match the images one to one
+        captions = data.get('captions')
+        if captions and len(captions) != len(data['images']):
+            raise serializers.ValidationError("Provide one caption per image or none at all.")
+        return data
+    
 class FacilitySerializer(serializers.ModelSerializer):
     class Meta:
         model = Facility
@@ -87,11 +178,22 @@ class AddFacilitySerializer(serializers.Serializer):
         """
         Validate that the facility with the given ID exists.
         """
-        try:
-            Facility.objects.get(id=value)
-        except Facility.DoesNotExist:
+        if get_facility(value) is None:
             raise serializers.ValidationError("Facility with this ID does not exist.")
         return value
+
+class SetFacilitiesSerializer(serializers.Serializer):
+    facility_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=True)
+
+    def validate_facility_ids(self, value):
+        """
+        Validate that every facility exists, using the cached catalog.
+        """
+        catalog = find_facilities(value)
+        missing = sorted(set(value) - catalog.keys())
+        if missing:
+            raise serializers.ValidationError(f"Facilities with these IDs do not exist: {missing}.")
+        return list(dict.fromkeys(value))
     
 class PropertyDetailSerializer(CoordinateValidationMixin,serializers.ModelSerializer):
     facilities = FacilitySerializer(many=True, read_only=True)
@@ -114,4 +216,31 @@ class PropertyDetailSerializer(CoordinateValidationMixin,serializers.ModelSerial
             'longitude',
             'facilities',
             'images',
-        ]
\ No newline at end of file
+        ]
+
+class SavedSearchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SavedSearch
+        fields = ['id', 'city', 'ptype', 'is_for_rent', 'min_price', 'max_price', 'created_at']
+        read_only_fields = ['id', 'created_at']
+
+    def validate(self, data):
+        min_price = data.get('min_price')
+        max_price = data.get('max_price')
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise serializers.ValidationError("Minimum price cannot be greater than maximum price.")
+        return data
+
+class StartImageUploadSerializer(serializers.Serializer):
+    filename = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(min_value=1)
+    caption = serializers.CharField(max_length=255, required=False, allow_blank=True)
+
+class ImageUploadSessionSerializer(serializers.ModelSerializer):
+    upload_id = serializers.UUIDField(source='id', read_only=True)
+    offset = serializers.IntegerField(source='received_bytes', read_only=True)
+    size = serializers.IntegerField(source='total_size', read_only=True)
+
+    class Meta:
+        model = ImageUploadSession
+        fields = ['upload_id', 'filename', 'caption', 'size', 'offset']
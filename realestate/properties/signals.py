@@ -0,0 +1,100 @@
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+from .models import Property, PropertyFacility, SimilarProperty, Facility, PropertyImage, FavoriteProperty, ChangeLogEntry
+from . import recommendations, facility_catalog, blobs, detail_cache, cards, changes, derived
+from realestate import deferred_storage
+
+
+@receiver(post_save, sender=Property)
+def refresh_similar_on_property_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        recommendations.schedule_refresh([instance.id])
+
+
+@receiver(pre_delete, sender=Property)
+def refresh_similar_on_property_delete(sender, instance, **kwargs):
+    # The neighbor rows pointing to this listing are removed by the cascade,
+    # so remember their owners now and rebuild their lists afterwards
+    owners = list(
+        SimilarProperty.objects.filter(similar=instance)
+        .exclude(property=instance)
+        .values_list('property_id', flat=True)
+    )
+    recommendations.schedule_refresh(owners)
+
+
+@receiver(post_save, sender=PropertyFacility)
+@receiver(post_delete, sender=PropertyFacility)
+def refresh_on_facility_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        derived.facilities_changed([instance.property_id])
+
+
+@receiver(m2m_changed, sender=Property.facilities.through)
+def refresh_on_facilities_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        # From the facility side pk_set holds the properties
+        derived.facilities_changed((pk_set or []) if reverse else [instance.id])
+
+
+@receiver(post_save, sender=PropertyImage)
+@receiver(post_delete, sender=PropertyImage)
+def refresh_on_image_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        derived.images_changed([instance.property_id])
+
+
+@receiver(post_save, sender=Facility)
+@receiver(post_delete, sender=Facility)
+def invalidate_facility_catalog(sender, **kwargs):
+    facility_catalog.invalidate()
+
+
+@receiver(post_delete, sender=PropertyImage)
+def release_image_file(sender, instance, **kwargs):
+    # Also runs for cascading deletes of the property or its owner
+    if instance.blob_id:
+        blobs.release_blob(instance.blob_id)
+    elif instance.image:
+        # Image stored before content-addressed storage, owned by this row only
+        deferred_storage.delete_on_commit(instance.image.name, blobs.get_storage())
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+def invalidate_property_detail(sender, instance, **kwargs):
+    detail_cache.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=Facility)
+def invalidate_property_detail_on_facility_rename(sender, instance, created, raw=False, **kwargs):
+    # The facility name is part of the payload of every property that has it
+    if not created and not raw:
+        detail_cache.invalidate(PropertyFacility.objects.filter(facility=instance).values_list('property_id', flat=True))
+
+
+@receiver(post_save, sender=Property)
+def refresh_property_card(sender, instance, raw=False, **kwargs):
+    if not raw:
+        cards.refresh_later([instance.pk])
+
+
+@receiver(post_save, sender=FavoriteProperty)
+@receiver(post_delete, sender=FavoriteProperty)
+def recount_property_card_favorites(sender, instance, raw=False, **kwargs):
+    if not raw:
+        cards.recount_favorites_later(instance.property_id)
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+def record_property_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        changes.record([instance.pk])
+
+
+@receiver(post_save, sender=FavoriteProperty)
+@receiver(post_delete, sender=FavoriteProperty)
+def record_favorite_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        changes.record([instance.property_id], kind=ChangeLogEntry.FAVORITE, user=instance.user_id)
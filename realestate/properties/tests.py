@@ -1,3 +1,1311 @@
-from django.test import TestCase
+import gzip
+import importlib
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from realestate import db_router, deferred_storage, metrics, profiling, schema
+from realestate.middleware import CompressionMiddleware, QueryBudgetExceeded
+from realestate.renderers import FastJSONRenderer
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from users.models import User
+
+from . import blobs, cards, changes, chunked_uploads, detail_cache, facility_bits, facility_catalog, image_resize, recommendations, saved_searches
+from .models import ChangeLogEntry, Facility, FavoriteProperty, ImageBlob, Property, PropertyCard, PropertyFacility, PropertyImage, SavedSearch, SavedSearchMatch, SimilarProperty
+from .views import AsyncPropertyDetailView, AsyncPropertyListView, PropertyBatchView, PropertyDetailView, PropertyListView
+
+
+def image_bytes(color='red', size=(32, 24), format='PNG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, format=format)
+    return buffer.getvalue()
+
+
+def image_file(name='photo.png', color='red'):
+    return SimpleUploadedFile(name, image_bytes(color), content_type='image/png')
+
+
+class MediaTestCase(TestCase):
+    """
+    Runs against an empty MEDIA_ROOT, with deferred file deletes applied inline.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(email='media@gmail.com', password=None, is_seller=True)
+        cls.property = Property.objects.create(
+            owner=cls.owner, ptype='flat', city='Damascus', number_of_rooms=3, area=Decimal('120.00'),
+            location_text='Test street', price=Decimal('1000.00'), is_for_rent=False,
+        )
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        patcher = mock.patch.object(deferred_storage, 'SYNC', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def stored(self, name):
+        return blobs.get_storage().exists(name)
+
+    def upload_image(self, color='red'):
+        return PropertyImage.objects.create(property=self.property, image=image_file(color=color))
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Read endpoints must stay within their view's query_budget however many rows they return.
+    The test runner turns QUERY_BUDGET_RAISE on, so every test requesting a view checks its budget.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user(email='owner@gmail.com', password=None)
+        facilities = [Facility.objects.create(name=f"Facility {i}") for i in range(3)]
+        cls.properties = []
+        for i in range(15):
+            property_instance = Property.objects.create(
+                owner=owner, ptype='flat', city='Damascus', number_of_rooms=3, area=Decimal('120.00'),
+                location_text='Test street', price=Decimal('1000.00') + i, is_for_rent=False,
+                latitude=Decimal('33.513800'), longitude=Decimal('36.276500'),
+            )
+            PropertyImage.objects.create(property=property_instance, image=f'propertiesphotos/test{i}.jpg')
+            for facility in facilities:
+                PropertyFacility.objects.create(property=property_instance, facility=facility)
+            cls.properties.append(property_instance)
+
+    def test_property_list(self):
+        response = self.client.get(reverse('property-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('db;', response['Server-Timing'])
+
+    def test_property_detail(self):
+        response = self.client.get(reverse('property-detail', args=[self.properties[0].id]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_similar_properties(self):
+        response = self.client.get(reverse('similar-properties', args=[self.properties[0].id]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_serializer_path(self):
+        with mock.patch('properties.views.PROPERTY_LIST_FAST_PATH', False):
+            response = self.client.get(reverse('property-list'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_over_budget_raises_in_tests(self):
+        self.assertTrue(settings.QUERY_BUDGET_RAISE)
+        with mock.patch.object(PropertyListView, 'query_budget', 1):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('property-list'))
+
+    @override_settings(QUERY_BUDGET_RAISE=False)
+    def test_over_budget_only_warns_by_default(self):
+        with mock.patch.object(PropertyListView, 'query_budget', 1), self.assertLogs('realestate.queries', 'WARNING'):
+            response = self.client.get(reverse('property-list'))
+        self.assertEqual(response.status_code, 200)
+
+
+class FacilityMaskTests(TestCase):
+    """
+    The facility bitmask must select exactly what the PropertyFacility join selects.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(email='seller@gmail.com', password=None, is_seller=True)
+        cls.facilities = [Facility.objects.create(name=f"Facility {i}") for i in range(5)]
+        # Beyond the mask, matched through the fallback
+        cls.facilities.append(Facility.objects.create(id=facility_bits.MAX_FACILITY_ID + 10, name="Sauna"))
+        rng = random.Random(0)
+        cls.properties = []
+        for i in range(40):
+            property_instance = Property.objects.create(
+                owner=cls.owner, ptype='flat', city='Damascus', number_of_rooms=3, area=Decimal('120.00'),
+                location_text='Test street', price=Decimal('1000.00') + i, is_for_rent=False,
+            )
+            for facility in rng.sample(cls.facilities, rng.randint(0, len(cls.facilities))):
+                PropertyFacility.objects.create(property=property_instance, facility=facility)
+            cls.properties.append(property_instance)
+
+    def join_filter(self, facility_ids):
+        queryset = Property.objects.all()
+        for facility_id in facility_ids:
+            queryset = queryset.filter(property_facilities__facility_id=facility_id)
+        return set(queryset.values_list('id', flat=True))
+
+    def assertMasksMatchRows(self):
+        expected = facility_bits.masks_of([property_instance.id for property_instance in self.properties])
+        self.assertEqual(dict(Property.objects.values_list('id', 'facility_mask')), expected)
+
+    def test_masks_follow_facility_rows(self):
+        self.assertMasksMatchRows()
+
+    def test_filter_matches_join(self):
+        ids = [facility.id for facility in self.facilities]
+        combinations = [ids[:1], ids[:2], ids[1:4], ids[:5], [ids[0], ids[5]], [ids[5]], ids, [999]]
+        for facility_ids in combinations:
+            with self.subTest(facility_ids=facility_ids):
+                matched = set(facility_bits.filter_having(Property.objects.all(), facility_ids).values_list('id', flat=True))
+                self.assertEqual(matched, self.join_filter(facility_ids))
+
+    def test_list_filter_matches_join(self):
+        facility_ids = [self.facilities[0].id, self.facilities[2].id]
+        response = self.client.get(reverse('property-list'), {'facilities': ','.join(map(str, facility_ids))})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], len(self.join_filter(facility_ids)))
+
+    def test_list_filter_rejects_invalid_ids(self):
+        response = self.client.get(reverse('property-list'), {'facilities': '1,parking'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_edit_keeps_the_mask(self):
+        property_instance = self.properties[0]
+        PropertyFacility.objects.filter(property=property_instance).delete()
+        PropertyFacility.objects.create(property=property_instance, facility=self.facilities[0])
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        response = client.patch(reverse('edit-property', args=[property_instance.id]), {'price': '1.00'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertMasksMatchRows()
+
+    def test_repair_command(self):
+        Property.objects.update(facility_mask=0)
+        call_command('backfill_facility_masks', stdout=io.StringIO())
+        self.assertMasksMatchRows()
+
+    def test_migration_backfills_masks(self):
+        migration = importlib.import_module('properties.migrations.0011_backfill_facility_masks')
+        Property.objects.update(facility_mask=0)
+        with mock.patch.object(migration, 'BATCH_SIZE', 7):
+            migration.backfill_facility_masks(django_apps, None)
+        self.assertMasksMatchRows()
+
+    def test_facility_views_keep_masks(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        property_instance = self.properties[0]
+        PropertyFacility.objects.filter(property=property_instance).delete()
+
+        client.post(reverse('add-facility', args=[property_instance.id]), {'facility_id': self.facilities[1].id}, format='json')
+        client.post(reverse('add-facility', args=[property_instance.id]), {'facility_id': self.facilities[5].id}, format='json')
+        self.assertMasksMatchRows()
+        client.delete(reverse('remove-facility', args=[property_instance.id, self.facilities[1].id]))
+        self.assertMasksMatchRows()
+        client.put(reverse('set-facilities', args=[property_instance.id]), {'facility_ids': [self.facilities[0].id, self.facilities[3].id]}, format='json')
+        self.assertMasksMatchRows()
+        self.assertIn(property_instance.id, self.join_filter([self.facilities[0].id, self.facilities[3].id]))
+
+    def test_backfill_repairs_masks(self):
+        Property.objects.update(facility_mask=0)
+        facility_bits.backfill()
+        self.assertMasksMatchRows()
+
+
+class SimilarPropertiesRefreshTests(TestCase):
+    """
+    Writes queue their listings for the recommender instead of refreshing inline.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(email='similar@gmail.com', password=None, is_seller=True)
+        cls.properties = {'Damascus': [], 'Aleppo': []}
+        for city, listings in cls.properties.items():
+            # More listings than fit in a list, so dropping one leaves a gap to fill
+            for i in range(recommendations.TOP_K + 3):
+                listings.append(Property.objects.create(
+                    owner=cls.owner, ptype='flat', city=city, number_of_rooms=2 + i % 3, area=Decimal('90.00') + i,
+                    location_text='Test street', price=Decimal('1000.00') + i * 50, is_for_rent=False,
+                ))
+        recommendations.rebuild_all()
+
+    def setUp(self):
+        recommendations._pending.clear()
+
+    def test_writes_are_queued_once(self):
+        property_instance = self.properties['Damascus'][0]
+        with mock.patch.object(recommendations, '_start_worker') as start_worker:
+            with self.captureOnCommitCallbacks(execute=True):
+                property_instance.price += 1
+                property_instance.save()
+                property_instance.save()
+        start_worker.assert_called()
+        self.assertEqual(recommendations._pending, {property_instance.id})
+
+    @mock.patch.object(recommendations, 'REFRESH_SYNC', True)
+    def test_move_refills_old_city_lists(self):
+        moved = self.properties['Damascus'][0]
+        self.assertTrue(SimilarProperty.objects.filter(similar=moved).exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            moved.city = 'Aleppo'
+            moved.save()
+
+        remaining = self.properties['Damascus'][1:]
+        for listing in remaining:
+            neighbors = SimilarProperty.objects.filter(property=listing)
+            self.assertEqual(set(neighbors.values_list('similar__city', flat=True)), {'Damascus'})
+            self.assertEqual(neighbors.count(), recommendations.TOP_K)
+        self.assertEqual(set(SimilarProperty.objects.filter(property=moved).values_list('similar__city', flat=True)), {'Aleppo'})
+
+
+class SavedSearchNotificationTests(TestCase):
+    """
+    Each buyer's alert is sent and marked on its own.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user(email='agent@gmail.com', password=None, is_seller=True)
+        cls.buyers = [User.objects.create_user(email=f'buyer{i}@gmail.com', password=None) for i in range(3)]
+        for buyer in cls.buyers:
+            SavedSearch.objects.create(user=buyer, city='Homs')
+            SavedSearch.objects.create(user=buyer, ptype='flat')
+        for i in range(2):
+            property_instance = Property.objects.create(
+                owner=owner, ptype='flat', city='Homs', number_of_rooms=3, area=Decimal('120.00'),
+                location_text='Test street', price=Decimal('1000.00') + i, is_for_rent=False,
+            )
+            saved_searches.match_saved_searches(property_instance)
+
+    def test_one_email_per_buyer(self):
+        self.assertEqual(saved_searches.drain_notifications(batch_size=2), 12)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [buyer.email for buyer in self.buyers])
+        # Both searches of a buyer matched, each listing is listed once
+        self.assertEqual(mail.outbox[0].body.count('Homs'), 2)
+        self.assertFalse(SavedSearchMatch.objects.filter(notified_at__isnull=True).exists())
+
+    def test_failed_email_keeps_only_its_matches(self):
+        failing = self.buyers[1]
+        send_mail = saved_searches.send_mail
+
+        def flaky_send_mail(subject, message, from_email, recipient_list, **kwargs):
+            if recipient_list == [failing.email]:
+                raise ConnectionError("SMTP server went away")
+            return send_mail(subject, message, from_email, recipient_list, **kwargs)
+
+        with mock.patch('properties.saved_searches.send_mail', flaky_send_mail), self.assertLogs('properties.saved_searches', 'ERROR'):
+            self.assertEqual(saved_searches.drain_notifications(), 8)
+        self.assertEqual(len(mail.outbox), 2)
+        pending = SavedSearchMatch.objects.filter(notified_at__isnull=True)
+        self.assertEqual(set(pending.values_list('saved_search__user_id', flat=True)), {failing.id})
+
+        self.assertEqual(saved_searches.drain_notifications(), 4)
+        self.assertEqual(mail.outbox[-1].to, [failing.email])
+
+    def test_email_is_sent_outside_the_claim_transaction(self):
+        # TestCase runs each test in transactions of its own, the drain must not add one
+        depth = len(connection.atomic_blocks)
+        depths = []
+        with mock.patch('properties.saved_searches.send_mail', lambda *args, **kwargs: depths.append(len(connection.atomic_blocks))):
+            self.assertEqual(saved_searches.drain_notifications(), 12)
+        self.assertEqual(depths, [depth] * 3)
+
+class SetFacilitiesTests(TestCase):
+    """
+    Replacing the facilities of a listing refreshes what depends on them once.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(email='facilities@gmail.com', password=None, is_seller=True)
+        cls.facilities = [Facility.objects.create(name=f"Facility {i}") for i in range(6)]
+        cls.property = Property.objects.create(
+            owner=cls.owner, ptype='flat', city='Damascus', number_of_rooms=3, area=Decimal('120.00'),
+            location_text='Test street', price=Decimal('1000.00'), is_for_rent=False,
+        )
+        for facility in cls.facilities:
+            PropertyFacility.objects.create(property=cls.property, facility=facility)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        facility_catalog.invalidate()
+
+    def put(self, facility_ids):
+        return self.client.put(reverse('set-facilities', args=[self.property.id]), {'facility_ids': facility_ids}, format='json')
+
+    def test_single_refresh(self):
+        # Four rows removed and one added
+        facility_ids = [self.facilities[0].id, self.facilities[1].id, Facility.objects.create(name="Lift").id]
+        entries = ChangeLogEntry.objects.count()
+        with mock.patch.object(recommendations, 'schedule_refresh') as schedule_refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.put(facility_ids)
+        self.assertEqual(response.status_code, 200)
+        schedule_refresh.assert_called_once_with([self.property.id])
+        self.assertEqual(sorted(self.property.facilities.values_list('id', flat=True)), facility_ids)
+        self.assertEqual(ChangeLogEntry.objects.count(), entries + 1)
+        self.assertEqual(PropertyCard.objects.get(pk=self.property.pk).facility_mask, facility_bits.mask_for(facility_ids))
+
+    def test_facility_created_in_another_process(self):
+        facility_catalog.get_facilities()
+        # bulk_create sends no signal, the catalog of this process is now stale
+        created, = Facility.objects.bulk_create([Facility(name="Rooftop")])
+        response = self.put([created.id])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [{'id': created.id, 'name': "Rooftop"}])
+
+        response = self.client.post(reverse('add-facility', args=[self.property.id]), {'facility_id': self.facilities[1].id}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_unknown_facility(self):
+        response = self.put([self.facilities[0].id, 999])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.property.facilities.count(), len(self.facilities))
+
+
+class BulkImageUploadTests(MediaTestCase):
+    """
+    Several images are written concurrently and inserted in one request.
+    """
+    def post(self, images, **data):
+        return self.client.post(reverse('bulk-add-property-images', args=[self.property.id]), {'images': images, **data}, format='multipart')
+
+    def test_upload(self):
+        response = self.post([image_file('a.png', 'red'), image_file('b.png', 'blue')], captions=['Kitchen', 'Garden'])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([image['caption'] for image in response.json()], ['Kitchen', 'Garden'])
+        images = list(self.property.images.order_by('id'))
+        self.assertEqual(len(images), 2)
+        for image in images:
+            self.assertTrue(self.stored(image.image.name))
+
+    def test_caption_count_must_match(self):
+        response = self.post([image_file('a.png'), image_file('b.png', 'blue')], captions=['Kitchen'])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.property.images.exists())
+
+    def test_image_cap(self):
+        PropertyImage.objects.bulk_create([PropertyImage(property=self.property, image=f'propertiesphotos/old{i}.jpg') for i in range(9)])
+        response = self.post([image_file('a.png'), image_file('b.png', 'blue')])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.property.images.count(), 9)
+
+
+class ChunkedUploadTests(MediaTestCase):
+    """
+    Resumable uploads: chunks at the received offset only, then finalization.
+    """
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(chunked_uploads, 'CHUNKED_UPLOAD_DIR', Path(self.media_root) / 'uploads')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.content = image_bytes('green', size=(64, 64), format='BMP')
+        response = self.client.post(
+            reverse('start-image-upload', args=[self.property.id]),
+            {'filename': 'photo.bmp', 'size': len(self.content), 'caption': 'Balcony'}, format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.upload_id = response.json()['upload_id']
+        self.url = reverse('image-upload-chunk', args=[self.property.id, self.upload_id])
+
+    def put_chunk(self, offset, data):
+        return self.client.generic('PUT', self.url, data, content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_upload_in_chunks(self):
+        half = len(self.content) // 2
+        self.assertEqual(self.put_chunk(0, self.content[:half]).json()['offset'], half)
+        # A retried chunk is refused and tells the client where to resume
+        response = self.put_chunk(0, self.content[:half])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], half)
+        self.assertEqual(self.client.get(self.url).json()['offset'], half)
+        self.assertEqual(self.put_chunk(half, self.content[half:]).json()['offset'], len(self.content))
+
+        response = self.client.post(reverse('finalize-image-upload', args=[self.property.id, self.upload_id]))
+        self.assertEqual(response.status_code, 201)
+        image = self.property.images.get()
+        self.assertEqual(image.caption, 'Balcony')
+        with image.image.open('rb') as stored:
+            self.assertEqual(stored.read(), self.content)
+        self.assertEqual(list(chunked_uploads.CHUNKED_UPLOAD_DIR.iterdir()), [])
+
+    def test_chunk_past_declared_size(self):
+        response = self.put_chunk(0, self.content + b'extra')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(self.url).json()['offset'], 0)
+        self.assertEqual([path.suffix for path in chunked_uploads.CHUNKED_UPLOAD_DIR.iterdir()], ['.part'])
+
+    def test_finalize_incomplete_upload(self):
+        self.put_chunk(0, self.content[:10])
+        response = self.client.post(reverse('finalize-image-upload', args=[self.property.id, self.upload_id]))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.property.images.exists())
+
+
+class BlobStorageTests(MediaTestCase):
+    """
+    Identical uploads share one file, which lives as long as it is referenced.
+    """
+    def test_identical_uploads_share_a_blob(self):
+        first, second = self.upload_image(), self.upload_image()
+        self.assertEqual(first.blob_id, second.blob_id)
+        self.assertEqual(ImageBlob.objects.get().ref_count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(self.stored(second.image.name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(self.stored(second.image.name))
+        self.assertFalse(ImageBlob.objects.exists())
+
+    def test_reupload_before_collection(self):
+        image = self.upload_image()
+        with self.captureOnCommitCallbacks() as callbacks:
+            image.delete()
+        reuploaded = self.upload_image()
+        for callback in callbacks:
+            callback()
+        self.assertTrue(self.stored(reuploaded.image.name))
+        self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+
+    def test_reupload_racing_collection(self):
+        image = self.upload_image()
+        with self.captureOnCommitCallbacks() as callbacks:
+            image.delete()
+        # The upload finds the file still stored and skips writing it...
+        content = image_file()
+        digest, name, size = blobs.write_blob_file(content)
+        # ...then the blob is collected before the upload takes its reference
+        for callback in callbacks:
+            callback()
+        self.assertFalse(self.stored(name))
+
+        blob = blobs.acquire_blob(digest, name, size, content)
+        self.assertTrue(self.stored(name))
+        self.assertEqual(blob.ref_count, 1)
+
+
+class OrphanedMediaTests(MediaTestCase):
+    """
+    The collector deletes old files nothing references and keeps the rest.
+    """
+    def age(self, name, hours=48):
+        path = blobs.get_storage().path(name)
+        past = os.path.getmtime(path) - hours * 3600
+        os.utime(path, (past, past))
+        return name
+
+    def save_file(self, name):
+        return blobs.get_storage().save(name, ContentFile(b'data'))
+
+    def collect(self, *args):
+        call_command('collect_orphaned_media', *args, stdout=io.StringIO())
+
+    def test_collects_old_orphans_only(self):
+        referenced = self.age(self.upload_image().image.name)
+        legacy = self.age(self.save_file('propertiesphotos/legacy.jpg'))
+        PropertyImage.objects.bulk_create([PropertyImage(property=self.property, image=legacy)])
+        orphan = self.age(self.save_file('propertiesphotos/orphan.jpg'))
+        recent = self.save_file('propertiesphotos/recent.jpg')
+
+        self.collect('--dry-run')
+        self.assertTrue(self.stored(orphan))
+        self.collect()
+        self.assertFalse(self.stored(orphan))
+        for name in [referenced, legacy, recent]:
+            self.assertTrue(self.stored(name), name)
+
+    def test_collects_unreferenced_blobs(self):
+        image = self.upload_image()
+        # The process stopped before the background collection ran
+        with self.captureOnCommitCallbacks(execute=False):
+            image.delete()
+        self.collect()
+        self.assertFalse(ImageBlob.objects.exists())
+        self.assertFalse(self.stored(image.image.name))
+
+
+class DeferredStorageTests(MediaTestCase):
+    """
+    File deletes wait for the commit and are retried when the storage fails.
+    """
+    def test_delete_waits_for_commit(self):
+        name = blobs.get_storage().save('propertiesphotos/legacy.jpg', ContentFile(b'data'))
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                deferred_storage.delete_on_commit(name, blobs.get_storage())
+                transaction.set_rollback(True)
+        self.assertTrue(self.stored(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            deferred_storage.delete_on_commit(name, blobs.get_storage())
+            self.assertTrue(self.stored(name))
+        self.assertFalse(self.stored(name))
+
+    def test_legacy_image_file_deleted_with_its_row(self):
+        name = blobs.get_storage().save('propertiesphotos/legacy.jpg', ContentFile(b'data'))
+        image, = PropertyImage.objects.bulk_create([PropertyImage(property=self.property, image=name)])
+        with self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+        self.assertFalse(self.stored(name))
+
+    @mock.patch.object(deferred_storage, 'RETRY_DELAY', 0)
+    def test_retries(self):
+        storage = mock.Mock()
+        storage.delete.side_effect = [OSError("timeout"), None]
+        with self.assertLogs('realestate.deferred_storage', 'WARNING'):
+            self.assertTrue(deferred_storage._delete_with_retries(storage, 'a.jpg'))
+        self.assertEqual(storage.delete.call_count, 2)
+
+        storage.delete.side_effect = OSError("timeout")
+        with self.assertLogs('realestate.deferred_storage', 'ERROR'):
+            self.assertFalse(deferred_storage._delete_with_retries(storage, 'a.jpg'))
+
+
+class ResizedImageTests(MediaTestCase):
+    """
+    Resized variants are produced on demand and served from the disk cache.
+    """
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(image_resize, 'CACHE_DIR', Path(self.media_root) / 'resized')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.name = blobs.get_storage().save('propertiesphotos/photo.png', ContentFile(image_bytes(size=(400, 300))))
+
+    def get(self, width=100, height=100, name=None):
+        return self.client.get(reverse('resized-image', args=[width, height, name or self.name]))
+
+    def read_image(self, response):
+        return Image.open(io.BytesIO(b''.join(response.streaming_content)))
+
+    def test_resize_and_cache(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(self.read_image(response).size, (100, 75))
+
+        with mock.patch.object(image_resize, '_resize') as resize:
+            response = self.get()
+        resize.assert_not_called()
+        self.assertEqual(self.read_image(response).size, (100, 75))
+
+    def test_evicted_hit_is_resized_again(self):
+        evicted = (image_resize.CACHE_DIR / 'gone.jpg', 'image/jpeg')
+        with mock.patch.object(image_resize, '_find_cached', side_effect=[evicted, None]):
+            response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.read_image(response).size, (100, 75))
+
+    def test_decompression_bomb(self):
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 1000):
+            response = self.get()
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejected_requests(self):
+        self.assertEqual(self.get(width=5000).status_code, 400)
+        self.assertEqual(self.get(name='userphotoes/missing.png').status_code, 404)
+        self.assertEqual(self.get(name='resized/photo.png').status_code, 404)
+
+
+class FastListPathTests(TestCase):
+    """
+    The fast list path renders exactly what the PropertySerializer path renders.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user(email='lister@gmail.com', password=None)
+        for i in range(5):
+            property_instance = Property.objects.create(
+                owner=owner, ptype=['flat', 'villa'][i % 2], city='Latakia', number_of_rooms=i + 1, area=Decimal('80.50') + i,
+                location_text='Corniche \u2028 street', price=Decimal('999.99') + i, is_for_rent=bool(i % 2),
+                latitude=Decimal('35.523100'), longitude=Decimal('35.791000'),
+            )
+            for j in range(i % 3):
+                PropertyImage.objects.create(property=property_instance, image=f'propertiesphotos/list{i}-{j}.jpg')
+
+    def list(self, **params):
+        response = self.client.get(reverse('property-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def test_same_output_as_serializer_path(self):
+        for params in [{}, {'ordering': '-price'}, {'is_for_rent': 'true'}, {'search': 'corniche'}]:
+            with self.subTest(params=params):
+                fast = self.list(**params)
+                with mock.patch('properties.views.PROPERTY_LIST_FAST_PATH', False):
+                    self.assertEqual(fast, self.list(**params))
+
+    def test_renderer_matches_drf(self):
+        data = {
+            'price': Decimal('10.50'), 'when': datetime(2024, 5, 1, 12, 30, tzinfo=dt_timezone.utc), 'day': date(2024, 5, 1),
+            'text': 'a\u2028b', 'list': [1, None, True],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class AsyncReadViewTests(TestCase):
+    """
+    The async read views render what their sync counterparts render.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(email='async@gmail.com', password=None, is_seller=True)
+        for i in range(8):
+            cls.create_property(i)
+        cls.property = Property.objects.order_by('id').first()
+        PropertyImage.objects.create(property=cls.property, image='propertiesphotos/async.jpg', caption='Front')
+        PropertyFacility.objects.create(property=cls.property, facility=Facility.objects.create(name='Async pool'))
+
+    @classmethod
+    def create_property(cls, i):
+        return Property.objects.create(
+            owner=cls.owner, ptype=['flat', 'villa'][i % 2], city='Homs', number_of_rooms=i + 1, area=Decimal('70.00') + i,
+            location_text='Main street', price=Decimal('500.00') + i, is_for_rent=bool(i % 2),
+            latitude=Decimal('34.730000'), longitude=Decimal('36.710000'),
+        )
+
+    def assertSameOutput(self, sync_view, async_view, path, params=None, **kwargs):
+        cache.clear()
+        expected = sync_view.as_view()(RequestFactory().get(path, params), **kwargs)
+        expected.render()
+        cache.clear()
+        response = async_to_sync(async_view.as_view())(RequestFactory().get(path, params), **kwargs)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+    def test_list(self):
+        path = reverse('property-list')
+        for fast_path in [True, False]:
+            for params in [{}, {'page': '2'}, {'page': 'last'}, {'page': '3'}, {'ordering': '-price'}, {'is_for_rent': 'true'}, {'search': 'main'}]:
+                with self.subTest(fast_path=fast_path, params=params), mock.patch('properties.views.PROPERTY_LIST_FAST_PATH', fast_path):
+                    self.assertSameOutput(PropertyListView, AsyncPropertyListView, path, params)
+
+    def test_list_count_follows_new_listings(self):
+        cache.clear()
+        view = async_to_sync(AsyncPropertyListView.as_view())
+        path = reverse('property-list')
+        self.assertEqual(json.loads(view(RequestFactory().get(path)).content)['count'], 8)
+        for i in range(8, 13):
+            self.create_property(i)
+        data = json.loads(view(RequestFactory().get(path, {'page': '3'})).content)
+        self.assertEqual(data['count'], 13)
+        self.assertEqual(len(data['results']), 1)
+
+    def test_detail(self):
+        for property_id in [self.property.id, 0]:
+            with self.subTest(property_id=property_id):
+                path = reverse('property-detail', args=[property_id])
+                self.assertSameOutput(PropertyDetailView, AsyncPropertyDetailView, path, property_id=property_id)
+
+
+class PropertyDetailCacheTests(TestCase):
+    """
+    Cached details are dropped by any change to the property, its images or its facilities.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(email='details@gmail.com', password=None, is_seller=True)
+        cls.properties = [
+            Property.objects.create(
+                owner=cls.owner, ptype='flat', city='Tartus', number_of_rooms=2, area=Decimal('90.00'),
+                location_text='Port street', price=Decimal('700.00') + i, is_for_rent=False,
+            )
+            for i in range(3)
+        ]
+        cls.facility = Facility.objects.create(name='Sea view')
+
+    def setUp(self):
+        cache.clear()
+        facility_catalog.invalidate()
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.property = self.properties[0]
+
+    def detail(self):
+        return self.client.get(reverse('property-detail', args=[self.property.id])).json()
+
+    def batch(self, ids):
+        return self.client.get(reverse('property-batch'), {'ids': ids})
+
+    def test_per_process_cache_expires_quickly(self):
+        self.assertFalse(settings.SHARED_CACHE)
+        self.assertLessEqual(detail_cache.CACHE_TIMEOUT, 60)
+
+    def test_batch_keeps_order_and_leaves_out_missing(self):
+        first, second, third = (instance.id for instance in self.properties)
+        response = self.batch(f'{third},0,{first},{third}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([data['id'] for data in response.json()], [third, first])
+
+        # Cached now, only the missing id is looked up again
+        with self.assertNumQueries(1):
+            self.assertEqual(self.batch(f'{third},0,{first}').json(), response.json())
+
+    def test_batch_rejects_bad_ids(self):
+        with mock.patch.object(PropertyBatchView, 'MAX_IDS', 2):
+            for ids in ['', '1,x', '1,2,3']:
+                with self.subTest(ids=ids):
+                    response = self.batch(ids)
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('detail', response.json())
+
+    def test_miss_does_not_replace_a_stored_entry(self):
+        key = detail_cache.cache_key(self.property.id)
+        load = detail_cache._load
+
+        def load_while_another_request_stores(queryset):
+            loaded = load(queryset)
+            cache.set(key, {'stored': 'meanwhile'})
+            return loaded
+
+        with mock.patch.object(detail_cache, '_load', load_while_another_request_stores):
+            detail_cache.get_details([self.property.id])
+        self.assertEqual(cache.get(key), {'stored': 'meanwhile'})
+
+    def test_image_changes_invalidate(self):
+        self.assertEqual(self.detail()['images'], [])
+        with self.captureOnCommitCallbacks(execute=True):
+            image = PropertyImage.objects.create(property=self.property, image='propertiesphotos/port.jpg', caption='Port')
+        self.assertEqual([data['caption'] for data in self.detail()['images']], ['Port'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            image.caption = 'Harbour'
+            image.save()
+        self.assertEqual([data['caption'] for data in self.detail()['images']], ['Harbour'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PropertyImage.objects.filter(id=image.id).delete()
+        self.assertEqual(self.detail()['images'], [])
+
+    def test_facility_changes_invalidate(self):
+        self.assertEqual(self.detail()['facilities'], [])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(reverse('set-facilities', args=[self.property.id]), {'facility_ids': [self.facility.id]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([data['name'] for data in self.detail()['facilities']], ['Sea view'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.facility.name = 'Sea front'
+            self.facility.save()
+        self.assertEqual([data['name'] for data in self.detail()['facilities']], ['Sea front'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(reverse('set-facilities', args=[self.property.id]), {'facility_ids': []}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.detail()['facilities'], [])
+
+
+class PropertyCardTests(TestCase):
+    """
+    The PropertyCard read model follows its property and renders the same list.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(email='cards@gmail.com', password=None, is_seller=True)
+        cls.buyer = User.objects.create_user(email='card-buyer@gmail.com', password=None)
+        cls.facility = Facility.objects.create(name='Garden')
+
+    def create_property(self, i=0):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Property.objects.create(
+                owner=self.owner, ptype=['flat', 'villa'][i % 2], city='Hama', number_of_rooms=i + 1, area=Decimal('65.25') + i,
+                location_text='River street', price=Decimal('450.10') + i, is_for_rent=bool(i % 2),
+                latitude=Decimal('35.130000') if i % 2 else None, longitude=Decimal('36.750000') if i % 2 else None,
+            )
+
+    def test_card_follows_changes(self):
+        property_instance = self.create_property()
+        card = PropertyCard.objects.get(pk=property_instance.pk)
+        self.assertEqual((card.price_text, card.main_photo, card.favorites_count), ('450.10', None, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            property_instance.price = Decimal('475.00')
+            property_instance.save()
+            PropertyImage.objects.create(property=property_instance, image='propertiesphotos/first.jpg')
+            PropertyImage.objects.create(property=property_instance, image='propertiesphotos/second.jpg')
+            PropertyFacility.objects.create(property=property_instance, facility=self.facility)
+            FavoriteProperty.objects.create(user=self.buyer, property=property_instance)
+        card.refresh_from_db()
+        self.assertEqual(card.price_text, '475.00')
+        self.assertEqual(card.main_photo, '/media/propertiesphotos/first.jpg')
+        self.assertEqual(card.facility_mask, facility_bits.mask_for([self.facility.id]))
+        self.assertEqual(card.favorites_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            FavoriteProperty.objects.filter(property=property_instance).delete()
+        card.refresh_from_db()
+        self.assertEqual(card.favorites_count, 0)
+
+        property_instance.delete()
+        self.assertFalse(PropertyCard.objects.filter(pk=property_instance.pk).exists())
+
+    def test_rebuild_restores_missing_and_stale_cards(self):
+        first, second = self.create_property(0), self.create_property(1)
+        PropertyCard.objects.filter(pk=first.pk).delete()
+        PropertyCard.objects.filter(pk=second.pk).update(city='Stale', favorites_count=9)
+        with mock.patch.object(cards, 'BATCH_SIZE', 1):
+            call_command('rebuild_property_cards', stdout=io.StringIO())
+        self.assertEqual(
+            sorted(PropertyCard.objects.values_list('property_id', 'city', 'favorites_count')),
+            [(first.pk, 'Hama', 0), (second.pk, 'Hama', 0)],
+        )
+
+    def test_list_from_cards_matches_fast_path(self):
+        for i in range(8):
+            property_instance = self.create_property(i)
+            if i % 3 == 0:
+                with self.captureOnCommitCallbacks(execute=True):
+                    PropertyImage.objects.create(property=property_instance, image=f'propertiesphotos/card{i}.jpg')
+        for params in [{}, {'page': '2'}, {'ordering': '-price'}, {'is_for_rent': 'true'}, {'search': 'river'}]:
+            with self.subTest(params=params):
+                expected = self.client.get(reverse('property-list'), params).content
+                with mock.patch('properties.views.PROPERTY_LIST_FROM_CARDS', True):
+                    self.assertEqual(self.client.get(reverse('property-list'), params).content, expected)
+
+
+class CompressionTests(TestCase):
+    """
+    Large compressible responses are gzip/brotli encoded as the client accepts.
+    """
+    body = b'{"results": [' + b','.join(b'{"id": %d, "city": "Damascus"}' % i for i in range(100)) + b']}'
+
+    def respond(self, accept_encoding='', body=None, content_type='application/json', **headers):
+        response = HttpResponse(body if body is not None else self.body, content_type=content_type, headers=headers)
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_gzip(self):
+        response = self.respond('gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_brotli_preferred(self):
+        response = self.respond('gzip, br')
+        if response['Content-Encoding'] == 'gzip':
+            self.skipTest("brotli is not installed")
+        import brotli
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), self.body)
+
+    def test_not_compressed(self):
+        cases = {
+            'not accepted': self.respond('identity'),
+            'refused': self.respond('gzip;q=0, br;q=0'),
+            'too small': self.respond('gzip', body=b'{"id": 1}'),
+            'not compressible': self.respond('gzip', content_type='image/jpeg'),
+        }
+        for case, response in cases.items():
+            with self.subTest(case):
+                self.assertFalse(response.has_header('Content-Encoding'))
+                self.assertIn(response.content, (self.body, b'{"id": 1}'))
+
+    def test_etag_becomes_weak(self):
+        response = self.respond('gzip', ETag='"abc"', **{'Cache-Control': 'max-age=60'})
+        self.assertEqual(response['ETag'], 'W/"abc"')
+        # Cached bodies are reused for the next identical response
+        self.assertEqual(gzip.decompress(self.respond('gzip', ETag='"abc"').content), self.body)
+
+    def test_list_endpoint(self):
+        owner = User.objects.create_user(email='gzip@gmail.com', password=None)
+        Property.objects.bulk_create([
+            Property(
+                owner=owner, ptype='flat', city='Damascus', number_of_rooms=3, area=Decimal('120.00'),
+                location_text='Test street', price=Decimal('1000.00') + i, is_for_rent=False,
+            )
+            for i in range(10)
+        ])
+        plain = self.client.get(reverse('property-list'))
+        compressed = self.client.get(reverse('property-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+
+
+class SchemaTests(TestCase):
+    """
+    The precomputed OpenAPI schema is revalidated with its ETag, compressed or not.
+    """
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = Path(directory) / 'openapi.json'
+        path.write_bytes(b'{"swagger": "2.0", "paths": {%s}}' % b','.join(b'"/p%d/": {}' % i for i in range(100)))
+        schema_settings = override_settings(OPENAPI_SCHEMA_PATH=str(path), OPENAPI_SCHEMA_LIVE=False)
+        schema_settings.enable()
+        self.addCleanup(schema_settings.disable)
+        schema._schema = None
+        self.addCleanup(setattr, schema, '_schema', None)
+
+    def get(self, **headers):
+        return self.client.get(reverse('schema-swagger-ui'), {'format': 'openapi'}, **headers)
+
+    def test_revalidation(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=f'"other", {etag}').status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='*').status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_revalidation_of_compressed_schema(self):
+        response = self.get(HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        response = self.get(HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+class LazyDocsTests(TestCase):
+    """
+    Documentation metadata is only built, and drf_yasg only imported, when the docs are used.
+    """
+    def test_docs_disabled_never_import_drf_yasg(self):
+        script = (
+            "import sys, django; django.setup(); "
+            "from django.urls import get_resolver; get_resolver().url_patterns; "
+            "print(sorted(name for name in sys.modules if name.startswith('drf_yasg')))"
+        )
+        completed = subprocess.run(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR, capture_output=True, text=True,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'realestate.settings', 'API_DOCS_ENABLED': 'False'},
+        )
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        self.assertEqual(completed.stdout.strip(), '[]')
+
+    def test_generated_schema_has_the_declared_operations(self):
+        generated = json.loads(schema.generate_schema())
+        operations = {
+            operation['operationId']
+            for path in generated['paths'].values()
+            for operation in path.values()
+            if isinstance(operation, dict) and 'operationId' in operation
+        }
+        self.assertLessEqual({'list_properties', 'set_property_facilities', 'put_image_upload_chunk'}, operations)
+
+
+class MetricsTests(TestCase):
+    """
+    /metrics/ exposes request, DB and cache metrics to staff and to the scraper token.
+    """
+    def scrape(self, **headers):
+        return self.client.get(reverse('metrics'), **headers)
+
+    def sample(self, text, line_start):
+        values = [float(line.rsplit(' ', 1)[1]) for line in text.splitlines() if line.startswith(line_start)]
+        return sum(values)
+
+    def test_access(self):
+        self.assertIn(self.scrape().status_code, (401, 403))
+        with mock.patch.object(metrics, 'METRICS_TOKEN', 'scraper-secret'):
+            self.assertIn(self.scrape(HTTP_AUTHORIZATION='Bearer wrong').status_code, (401, 403))
+            response = self.scrape(HTTP_AUTHORIZATION='Bearer scraper-secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+
+        staff = User.objects.create_user(email='staff@gmail.com', password=None, is_staff=True)
+        client = APIClient()
+        client.force_authenticate(staff)
+        self.assertEqual(client.get(reverse('metrics')).status_code, 200)
+
+    def test_requests_are_counted(self):
+        requests = 'http_requests_total{url_name="facility-list",method="GET",status="200"}'
+        before = self.sample(metrics.REGISTRY.render(), requests)
+        self.client.get(reverse('facility-list'))
+        self.client.get(reverse('facility-list'))
+        text = metrics.REGISTRY.render()
+        self.assertEqual(self.sample(text, requests), before + 2)
+        self.assertIn('db_queries_per_request_bucket{url_name="facility-list",le="+Inf"}', text)
+        self.assertIn('email_queue_depth 0', text)
+
+    def test_snapshots_of_other_workers_are_summed(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        # Written by another worker process
+        Path(directory, '1.json').write_text(json.dumps({'cache_requests_total': {'merge_test\x1fhit': 5}}))
+        with mock.patch.object(metrics, 'METRICS_DIR', directory):
+            metrics.cache_lookup('merge_test', hit=True)
+            text = metrics.REGISTRY.render()
+        self.assertEqual(self.sample(text, 'cache_requests_total{cache="merge_test",result="hit"}'), 6)
+
+
+class BenchmarkSuiteTests(TestCase):
+    """
+    The seeded benchmark data is reproducible and the API benchmark runs against it.
+    """
+    def seed(self, *args):
+        call_command('seed_benchmark_data', '--properties', '60', *args, stdout=io.StringIO())
+        return list(Property.objects.order_by('id').values_list('city', 'ptype', 'price', 'area', 'number_of_rooms', 'facility_mask'))
+
+    def test_same_seed_same_data(self):
+        first = self.seed('--seed', '3')
+        self.assertEqual(len(first), 60)
+        self.assertEqual(self.seed('--seed', '3', '--clear'), first)
+        self.assertNotEqual(self.seed('--seed', '4', '--clear'), first)
+
+    def test_benchmark_writes_and_compares_results(self):
+        self.seed()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        output = Path(directory) / 'results.json'
+        arguments = ['--requests', '3', '--warmup', '1', '--scenarios', 'list', 'detail', 'favorite']
+        call_command('benchmark_api', *arguments, '--output', str(output), stdout=io.StringIO())
+        results = json.loads(output.read_text())
+        self.assertEqual(results['dataset']['properties'], 60)
+        self.assertEqual(set(results['scenarios']), {'list', 'detail', 'favorite'})
+
+        stdout = io.StringIO()
+        call_command('benchmark_api', *arguments, '--output', str(output.with_name('after.json')), '--compare', str(output), stdout=stdout)
+        self.assertIn('list', stdout.getvalue())
+
+
+class DatabaseSettingsTests(TestCase):
+    """
+    Connections are persistent and health checked, SQLite ones tuned when they open.
+    """
+    def test_connections_are_persistent(self):
+        self.assertEqual(connection.settings_dict['CONN_MAX_AGE'], settings.DB_CONN_MAX_AGE)
+        self.assertTrue(connection.settings_dict['CONN_HEALTH_CHECKS'])
+
+    def test_sqlite_pragmas_run_on_connect(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("SQLite only")
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+    def test_benchmark_runs_each_setting_in_a_fresh_process(self):
+        environments = []
+
+        def run(command, env, **kwargs):
+            environments.append(env)
+            output = Path(command[command.index('--output') + 1])
+            output.write_text(json.dumps({'scenarios': {'list': {'throughput_rps': 100.0}}}))
+            return subprocess.CompletedProcess(command, 0, '', '')
+
+        stdout = io.StringIO()
+        with mock.patch.object(subprocess, 'run', side_effect=run):
+            call_command('benchmark_db_settings', '--scenarios', 'list', stdout=stdout)
+        self.assertEqual([env['DB_CONN_MAX_AGE'] for env in environments[:2]], ['0', '60'])
+        self.assertEqual(environments[-1]['SQLITE_TUNING'], 'True')
+        self.assertIn('new connection per request', stdout.getvalue())
+
+    def test_benchmark_reports_a_failed_run(self):
+        failed = subprocess.CompletedProcess([], 1, '', 'boom')
+        with mock.patch.object(subprocess, 'run', return_value=failed):
+            with self.assertRaisesMessage(CommandError, 'boom'):
+                call_command('benchmark_db_settings', '--scenarios', 'list', stdout=io.StringIO())
+
+
+class ReplicaRoutingTests(TestCase):
+    """
+    Safe requests may read from a replica, unless their client wrote recently.
+    """
+    def setUp(self):
+        cache.clear()
+        self.routings = []
+
+    def middleware(self, write=False):
+        def get_response(request):
+            if write:
+                db_router.ReplicaRouter().db_for_write(Property)
+            self.routings.append(db_router._routing.get())
+            return HttpResponse(b'ok')
+        return db_router.ReplicaRoutingMiddleware(get_response)
+
+    def test_safe_request_may_use_a_replica(self):
+        self.middleware()(RequestFactory().get('/properties/'))
+        self.assertTrue(self.routings[-1].use_replica)
+        self.middleware()(RequestFactory().post('/properties/'))
+        self.assertFalse(self.routings[-1].use_replica)
+
+    def test_writer_sticks_to_the_primary_without_the_cookie(self):
+        headers = {'HTTP_AUTHORIZATION': 'Bearer token'}
+        response = self.middleware(write=True)(RequestFactory().post('/properties/', **headers))
+        self.assertIn(db_router.STICKY_COOKIE, response.cookies)
+
+        # A client that drops the cookie is recognised by its token
+        self.middleware()(RequestFactory().get('/properties/', **headers))
+        self.assertFalse(self.routings[-1].use_replica)
+        self.middleware()(RequestFactory().get('/properties/', HTTP_AUTHORIZATION='Bearer other'))
+        self.assertTrue(self.routings[-1].use_replica)
+
+    def test_replicas_without_redis_share_a_file_cache(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        environment = {**os.environ, 'DB_REPLICAS': 'replica.sqlite3', 'REDIS_URL': '', 'CACHE_DIR': directory}
+        completed = subprocess.run(
+            [sys.executable, 'manage.py', 'shell', '--no-imports', '-c', "from django.conf import settings; print(settings.CACHES['default']['BACKEND'])"],
+            cwd=settings.BASE_DIR, env=environment, capture_output=True, text=True,
+        )
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        self.assertEqual(completed.stdout.strip(), 'django.core.cache.backends.filebased.FileBasedCache')
+        self.assertIn('REDIS_URL', completed.stderr)
+
+
+class ProfilingTests(TestCase):
+    """
+    Requests with a signed X-Profile header are profiled, one at a time per process.
+    """
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        for name, value in [('ENABLED', True), ('PROFILING_DIR', Path(directory))]:
+            patcher = mock.patch.object(profiling, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.middleware = profiling.ProfilingMiddleware(lambda request: HttpResponse(b'ok'))
+
+    def request(self, token=None):
+        headers = {'HTTP_X_PROFILE': token} if token else {}
+        return self.middleware(RequestFactory().get('/properties/', **headers))
+
+    def test_signed_request_is_profiled(self):
+        response = self.request(profiling.make_token())
+        name = response['X-Profile-Id']
+        self.assertEqual(profiling.list_profiles(), [name])
+        self.assertTrue((profiling.PROFILING_DIR / f"{name}.collapsed").exists())
+
+    def test_unsigned_request_is_not_profiled(self):
+        self.assertFalse(self.request('forged').has_header('X-Profile-Id'))
+        self.assertEqual(profiling.list_profiles(), [])
+
+    def test_concurrent_request_is_served_unprofiled(self):
+        # Another request of this process is being profiled
+        with profiling._profile_lock:
+            response = self.request(profiling.make_token())
+        self.assertEqual(response.content, b'ok')
+        self.assertFalse(response.has_header('X-Profile-Id'))
+        self.assertTrue(self.request(profiling.make_token()).has_header('X-Profile-Id'))
+
+
+class ChangeFeedTests(TestCase):
+    """
+    The change feed returns each changed property once, as its current state.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(email='feed@gmail.com', password=None, is_seller=True)
+        cls.buyer = User.objects.create_user(email='feed-buyer@gmail.com', password=None)
+        cls.other = User.objects.create_user(email='feed-other@gmail.com', password=None)
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(changes, 'SETTLE_SECONDS', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+
+    def create_property(self, city='Aleppo'):
+        return Property.objects.create(
+            owner=self.owner, ptype='house', city=city, number_of_rooms=4, area=Decimal('150.00'),
+            location_text='Citadel street', price=Decimal('2000.00'), is_for_rent=False,
+        )
+
+    def feed(self, since, user=None):
+        self.client.force_authenticate(user)
+        params = {} if since is None else {'since': since}
+        return self.client.get(reverse('property-changes'), params)
+
+    def test_entries_are_part_of_the_transaction(self):
+        with transaction.atomic():
+            property_instance = self.create_property()
+            # Written with the change, not by a commit hook
+            self.assertTrue(ChangeLogEntry.objects.filter(object_id=property_instance.id).exists())
+            transaction.set_rollback(True)
+        self.assertFalse(ChangeLogEntry.objects.exists())
+
+    def test_cursor(self):
+        cursor = self.feed(None).json()['next']
+        first, second = self.create_property(), self.create_property('Idlib')
+        data = self.feed(cursor).json()
+        self.assertEqual([upsert['id'] for upsert in data['upserts']], [first.id, second.id])
+        self.assertEqual(data['upserts'][1]['city'], 'Idlib')
+        self.assertFalse(data['has_more'])
+
+        again = self.feed(data['next']).json()
+        self.assertEqual((again['upserts'], again['deletes'], again['next']), ([], [], data['next']))
+
+    def test_collapses_changes_per_property(self):
+        cursor = self.feed(None).json()['next']
+        first, second = self.create_property(), self.create_property()
+        PropertyImage.objects.create(property=first, image='propertiesphotos/feed.jpg')
+        first.city = 'Raqqa'
+        first.save()
+        data = self.feed(cursor).json()
+        # Ordered by the last change of each property
+        self.assertEqual([upsert['id'] for upsert in data['upserts']], [second.id, first.id])
+        self.assertEqual(data['upserts'][1]['city'], 'Raqqa')
+        self.assertEqual(len(data['upserts'][1]['images']), 1)
+
+    def test_pages(self):
+        cursor = self.feed(None).json()['next']
+        created = [self.create_property().id for _ in range(3)]
+        seen = []
+        with mock.patch.object(changes, 'BATCH_SIZE', 2):
+            data = self.feed(cursor).json()
+            self.assertTrue(data['has_more'])
+            seen += [upsert['id'] for upsert in data['upserts']]
+            data = self.feed(data['next']).json()
+            self.assertFalse(data['has_more'])
+            seen += [upsert['id'] for upsert in data['upserts']]
+        self.assertEqual(seen, created)
+
+    def test_deletes(self):
+        property_instance = self.create_property()
+        cursor = self.feed(None).json()['next']
+        property_id = property_instance.id
+        property_instance.delete()
+        data = self.feed(cursor).json()
+        self.assertEqual((data['upserts'], data['deletes']), ([], [property_id]))
+
+    def test_expired_cursor(self):
+        self.create_property()
+        cursor = self.feed(None).json()['next']
+        self.create_property()
+        self.create_property()
+        ChangeLogEntry.objects.filter(id__lte=cursor + 1).delete()
+        self.assertEqual(self.feed(cursor).status_code, 410)
+        self.assertEqual(self.feed(cursor + 1).status_code, 200)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.feed('latest').status_code, 400)
+
+    def test_recent_entries_settle_first(self):
+        cursor = self.feed(None).json()['next']
+        self.create_property()
+        with mock.patch.object(changes, 'SETTLE_SECONDS', 60):
+            data = self.feed(cursor).json()
+        self.assertEqual((data['upserts'], data['next']), ([], cursor))
+
+    def test_favorites_are_only_shown_to_their_user(self):
+        kept, removed = self.create_property(), self.create_property()
+        cursor = self.feed(None).json()['next']
+        FavoriteProperty.objects.create(user=self.buyer, property=kept)
+        FavoriteProperty.objects.create(user=self.buyer, property=removed).delete()
+
+        data = self.feed(cursor, self.buyer).json()
+        self.assertEqual(data['favorites'], {'added': [kept.id], 'removed': [removed.id]})
+        self.assertEqual(data['upserts'], [])
+        self.assertEqual(self.feed(cursor, self.other).json()['favorites'], {'added': [], 'removed': []})
+        self.assertNotIn('favorites', self.feed(cursor).json())
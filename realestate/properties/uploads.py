@@ -0,0 +1,34 @@
+"""
+Storage helpers for property images.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .models import PropertyImage
+from .blobs import write_blob_file, acquire_blob
+from . import derived
+
+IMAGE_UPLOAD_WORKERS = getattr(settings, 'IMAGE_UPLOAD_WORKERS', 4)
+
+
+def save_property_images(property_instance, files, captions=None):
+    """
+    Write the files to content-addressed storage concurrently and insert all
+    the PropertyImage rows with a single bulk_create.
+    """
+    captions = captions or [None] * len(files)
+
+    # The threads only touch the storage; blob references are taken below on
+    # the request's own connection so they are part of its transaction
+    with ThreadPoolExecutor(max_workers=max(1, min(len(files), IMAGE_UPLOAD_WORKERS))) as pool:
+        stored = list(pool.map(write_blob_file, files))
+
+    instances = []
+    for file, (digest, name, size), caption in zip(files, stored, captions):
+        blob = acquire_blob(digest, name, size, file)
+        instances.append(PropertyImage(property=property_instance, image=blob.name, blob=blob, caption=caption or None))
+    created = PropertyImage.objects.bulk_create(instances)
+    # bulk_create sends no signals
+    derived.images_changed([property_instance.id])
+    return created
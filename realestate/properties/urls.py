@@ -2,15 +2,34 @@ from django.urls import path
 from .views import PropertyListView,PropertyDetailView,AddPropertyView,EditPropertyView, EditImageCaptionView,DeleteImageCaptionView
 from .views import AddFacilityView,RemoveFacilityView,AddPropertyImageView,DeletePropertyImageView
 from .views import AddToFavoritesView,RemoveFromFavoritesView,ListFavoritePropertiesView
+from .views import FacilityListView,SetFacilitiesView,BulkAddPropertyImagesView
+from .views import StartImageUploadView,ImageUploadChunkView,FinalizeImageUploadView
+from .views import SimilarPropertiesView,SavedSearchListCreateView,DeleteSavedSearchView
+from .views import AsyncPropertyListView,AsyncPropertyDetailView,PropertyBatchView,PropertyChangesView
+from django.conf import settings
+
+# ASGI deployments serve the hot read endpoints with the async views
+if settings.ASYNC_READ_VIEWS:
+    PropertyListView, PropertyDetailView = AsyncPropertyListView, AsyncPropertyDetailView
+
 urlpatterns = [
     path('', PropertyListView.as_view(), name='property-list'),
     path('<int:property_id>/',PropertyDetailView.as_view(),name='property-detail'),
+    path('batch/', PropertyBatchView.as_view(), name='property-batch'),
+    path('changes/', PropertyChangesView.as_view(), name='property-changes'),
+    path('<int:property_id>/similar/', SimilarPropertiesView.as_view(), name='similar-properties'),
     path('add/', AddPropertyView.as_view(), name='add-property'),
     path('<int:property_id>/edit/', EditPropertyView.as_view(), name='edit-property'),
+    path('facilities/', FacilityListView.as_view(), name='facility-list'),
+    path('<int:property_id>/facilities/', SetFacilitiesView.as_view(), name='set-facilities'),
     path('<int:property_id>/facilities/add/', AddFacilityView.as_view(), name='add-facility'),
     path('<int:property_id>/facilities/<int:facility_id>/remove/', RemoveFacilityView.as_view(), name='remove-facility'),
     path('<int:property_id>/images/<int:image_id>/delete/', DeletePropertyImageView.as_view(), name='delete-property-image'),
     path('<int:property_id>/images/add/', AddPropertyImageView.as_view(), name='add-property-image'),
+    path('<int:property_id>/images/bulk-add/', BulkAddPropertyImagesView.as_view(), name='bulk-add-property-images'),
+    path('<int:property_id>/images/uploads/', StartImageUploadView.as_view(), name='start-image-upload'),
+    path('<int:property_id>/images/uploads/<uuid:upload_id>/', ImageUploadChunkView.as_view(), name='image-upload-chunk'),
+    path('<int:property_id>/images/uploads/<uuid:upload_id>/finalize/', FinalizeImageUploadView.as_view(), name='finalize-image-upload'),
     path(
         '<int:property_id>/images/<int:image_id>/edit-caption/',
         EditImageCaptionView.as_view(),
@@ -24,6 +43,8 @@ urlpatterns = [
     path('<int:property_id>/favorite/', AddToFavoritesView.as_view(), name='add-to-favorites'),
     path('<int:property_id>/unfavorite/', RemoveFromFavoritesView.as_view(), name='remove-from-favorites'),
     path('favorites/', ListFavoritePropertiesView.as_view(), name='list-favorites'),
+    path('saved-searches/', SavedSearchListCreateView.as_view(), name='saved-searches'),
+    path('saved-searches/<int:search_id>/delete/', DeleteSavedSearchView.as_view(), name='delete-saved-search'),
     
     
     
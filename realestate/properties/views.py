@@ -3,28 +3,71 @@ from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
-from .models import Property,PropertyImage,Facility,PropertyFacility, FavoriteProperty
+from .models import Property,PropertyImage,Facility,PropertyFacility, FavoriteProperty, SimilarProperty, PropertyCard
 from .serializers import PropertySerializer,PropertyDetailSerializer,PropertyImageSerializer,FacilitySerializer,AddFacilitySerializer
-from drf_yasg import openapi
-from drf_yasg.utils import swagger_auto_schema
-from rest_framework.pagination import PageNumberPagination
+from .serializers import SimilarPropertySerializer,SavedSearchSerializer
+from .models import SavedSearch
+from .saved_searches import match_saved_searches
+from rest_framework.generics import ListCreateAPIView
+from .serializers import SetFacilitiesSerializer,BulkPropertyImageSerializer
+from .models import MAX_IMAGES_PER_PROPERTY
+from .uploads import save_property_images
+from .serializers import StartImageUploadSerializer,ImageUploadSessionSerializer
+from .models import ImageUploadSession
+from . import chunked_uploads
+from . import image_resize
+from django.http import FileResponse
+from .serializers import PropertyCardSerializer,StoredPropertyCardSerializer
+from django.utils.cache import patch_cache_control
+import re
+from .facility_catalog import get_facility, get_facilities
+from . import facility_catalog
+from . import detail_cache
+from . import derived
+from . import changes
+from realestate.batch import parse_ids
+from django.db import IntegrityError, transaction
+from django.db.models import OuterRef, Prefetch, Subquery
+from realestate.api_docs import openapi
+from realestate.api_docs import swagger_auto_schema
+from .pagination import PropertyPagination
+from rest_framework.request import Request
+from rest_framework.exceptions import NotFound, ValidationError
+from django.views import View
+from realestate.renderers import json_response
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from .permissions import IsSeller
 from rest_framework.parsers import MultiPartParser
-from .filters import CaseInsensitiveSearchFilter
+from .filters import CaseInsensitiveSearchFilter, FacilityFilter
 import os
 from django.conf import settings
+
+PROPERTY_LIST_FAST_PATH = getattr(settings, 'PROPERTY_LIST_FAST_PATH', True)
+PROPERTY_LIST_FROM_CARDS = getattr(settings, 'PROPERTY_LIST_FROM_CARDS', False)
+
+
+def list_card_rows():
+    """
+    Return the queryset of list card rows and the serializer that renders
+    them: the PropertyCard read model with PROPERTY_LIST_FROM_CARDS (one
+    table, no joins), otherwise the properties with their main photo.
+    """
+    if PROPERTY_LIST_FROM_CARDS:
+        return StoredPropertyCardSerializer.values_queryset(PropertyCard.objects.order_by('property_id')), StoredPropertyCardSerializer
+    return PropertyCardSerializer.values_queryset(Property.objects.order_by('id')), PropertyCardSerializer
+
 class PropertyListView(ListAPIView):
     queryset = Property.objects.all()
     serializer_class = PropertySerializer
     permission_classes = [AllowAny]
-    filter_backends = [DjangoFilterBackend, CaseInsensitiveSearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FacilityFilter, CaseInsensitiveSearchFilter, OrderingFilter]
     filterset_fields = ['city', 'ptype', 'is_for_rent']  # Fields to filter by
     search_fields = ['city', 'location_text']  # Fields to search by
     ordering_fields = ['price', 'area']  # Fields to order by
-    pagination_class = PageNumberPagination  # Default pagination
+    pagination_class = PropertyPagination  # PageNumberPagination, with async paging for AsyncPropertyListView
+    query_budget = 3  # Count, page of rows with their main photo, one spare
 
     @swagger_auto_schema(
         operation_id="list_properties",
@@ -33,6 +76,7 @@ class PropertyListView(ListAPIView):
             openapi.Parameter('city', openapi.IN_QUERY, description="Filter properties by city.", type=openapi.TYPE_STRING),
             openapi.Parameter('ptype', openapi.IN_QUERY, description="Filter properties by type.", type=openapi.TYPE_STRING),
             openapi.Parameter('is_for_rent', openapi.IN_QUERY, description="Filter properties by rental status.", type=openapi.TYPE_BOOLEAN),
+            openapi.Parameter('facilities', openapi.IN_QUERY, description="Comma-separated facility IDs; only properties with all of them are listed.", type=openapi.TYPE_STRING),
             openapi.Parameter('search', openapi.IN_QUERY, description="Search properties by city or location text.", type=openapi.TYPE_STRING),
             openapi.Parameter('ordering', openapi.IN_QUERY, description="Order results by price or area.", type=openapi.TYPE_STRING),
         ],
@@ -42,9 +86,22 @@ class PropertyListView(ListAPIView):
     )
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        if PROPERTY_LIST_FROM_CARDS or PROPERTY_LIST_FAST_PATH:
+            # Plain rows rendered by a card serializer, see list_card_rows
+            return list_card_rows()[0]
+        # Ordered, so PropertySerializer.get_main_photo's images.first() reads the prefetched rows
+        return super().get_queryset().prefetch_related(Prefetch('images', queryset=PropertyImage.objects.order_by('id')))
+
+    def get_serializer_class(self):
+        if PROPERTY_LIST_FROM_CARDS or PROPERTY_LIST_FAST_PATH:
+            return list_card_rows()[1]
+        return PropertySerializer
     
 class PropertyDetailView(APIView):
     permission_classes = [AllowAny]
+    query_budget = 3
 
     @swagger_auto_schema(
         operation_id="get_property_details",
@@ -55,14 +112,168 @@ class PropertyDetailView(APIView):
         }
     )
     def get(self, request, property_id):
+        data = detail_cache.get_detail(property_id)
+        if data is None:
+            return Response({"detail": "Property not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(detail_cache.for_request(data, request), status=status.HTTP_200_OK)
+
+
+class PropertyBatchView(APIView):
+    permission_classes = [AllowAny]
+    query_budget = 3  # Properties, their facilities and their images, for cache misses only
+    MAX_IDS = getattr(settings, 'PROPERTY_BATCH_LIMIT', 50)
+
+    @swagger_auto_schema(
+        operation_id="get_property_details_batch",
+        operation_description=f"Retrieve the full details of several properties at once, e.g. for a favorites list or a comparison (at most {MAX_IDS} ids). Results keep the order of the ids; missing properties are left out.",
+        manual_parameters=[
+            openapi.Parameter('ids', openapi.IN_QUERY, description="Comma-separated property IDs, e.g. 4,8,15.", type=openapi.TYPE_STRING, required=True),
+        ],
+        responses={
+            200: openapi.Response(description="Property details retrieved successfully.", schema=PropertyDetailSerializer(many=True)),
+            400: "Bad request. Missing or invalid ids."
+        }
+    )
+    def get(self, request):
         try:
-            property_instance = Property.objects.get(id=property_id)
-        except Property.DoesNotExist:
+            property_ids = parse_ids(request.query_params.get('ids'), self.MAX_IDS)
+        except ValueError as error:
+            return Response({"detail": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        details = detail_cache.get_details(property_ids)
+        data = [detail_cache.for_request(details[property_id], request) for property_id in property_ids if property_id in details]
+        return Response(data, status=status.HTTP_200_OK)
+    
+class PropertyChangesView(APIView):
+    permission_classes = [AllowAny]
+    query_budget = 6  # Entries, oldest cursor, favorites, and the details of uncached properties
+
+    @swagger_auto_schema(
+        operation_id="list_property_changes",
+        operation_description=(
+            "Incremental sync. Returns the properties changed or deleted after the cursor `since`, as full details "
+            "(`upserts`) and ids (`deletes`), and for an authenticated user the favorites added or removed. Call again "
+            "with `next` while `has_more` is true. Without `since` only the current cursor is returned: take it before "
+            "downloading the catalog. A 410 response means the cursor is too old and the client must download everything again."
+        ),
+        manual_parameters=[
+            openapi.Parameter('since', openapi.IN_QUERY, description="Cursor returned as `next` by the previous call.", type=openapi.TYPE_INTEGER),
+        ],
+        responses={
+            200: openapi.Response(
+                description="Changes after the cursor.",
+                examples={
+                    "application/json": {
+                        "upserts": [{"id": 12, "ptype": "flat", "city": "Damascus", "facilities": [], "images": []}],
+                        "deletes": [7],
+                        "favorites": {"added": [12], "removed": [3]},
+                        "next": 1542,
+                        "has_more": False
+                    }
+                }
+            ),
+            400: "Bad request. Invalid cursor.",
+            410: "Gone. The cursor is older than the retained change log."
+        }
+    )
+    def get(self, request):
+        since = request.query_params.get('since')
+        if since is None:
+            return Response({"next": changes.head()}, status=status.HTTP_200_OK)
+        try:
+            since = int(since)
+        except ValueError:
+            return Response({"detail": "'since' must be an integer cursor."}, status=status.HTTP_400_BAD_REQUEST)
+
+        user_id = request.user.id if request.user.is_authenticated else None
+        try:
+            changed, favorites, next_cursor, has_more = changes.read(since, user_id)
+        except changes.CursorExpired:
+            return Response({"detail": "The cursor has expired, download the catalog again."}, status=status.HTTP_410_GONE)
+
+        details = detail_cache.get_details(changed)
+        data = {
+            "upserts": [detail_cache.for_request(details[property_id], request) for property_id in changed if property_id in details],
+            "deletes": [property_id for property_id in changed if property_id not in details],
+            "next": next_cursor,
+            "has_more": has_more,
+        }
+        if user_id is not None:
+            data["favorites"] = {
+                "added": [property_id for property_id, favorited in favorites.items() if favorited],
+                "removed": [property_id for property_id, favorited in favorites.items() if not favorited],
+            }
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class AsyncPropertyListView(View):
+    """
+    ASGI-native PropertyListView, used when ASYNC_READ_VIEWS is set. Same
+    queryset, filters, search, ordering, pagination and serializer; the
+    queries run through the async ORM.
+    """
+    query_budget = PropertyListView.query_budget
+
+    async def get(self, request, *args, **kwargs):
+        view = PropertyListView(request=Request(request), args=args, kwargs=kwargs, format_kwarg=None)
+        try:
+            # The filter backends only build the query, nothing is run yet
+            queryset = view.filter_queryset(view.get_queryset())
+            page = await view.paginator.apaginate_queryset(queryset, view.request, view=view)
+        except ValidationError as exc:
+            return json_response(exc.detail, status=exc.status_code)
+        except NotFound as exc:
+            return json_response({"detail": exc.detail}, status=exc.status_code)
+        serializer = view.get_serializer(page, many=True)
+        return json_response(view.paginator.get_paginated_response(serializer.data).data)
+
+
+class AsyncPropertyDetailView(View):
+    """
+    ASGI-native PropertyDetailView, used when ASYNC_READ_VIEWS is set.
+    """
+    query_budget = PropertyDetailView.query_budget
+
+    async def get(self, request, property_id):
+        data = await detail_cache.aget_detail(property_id)
+        if data is None:
+            return json_response({"detail": "Property not found."}, status=status.HTTP_404_NOT_FOUND)
+        return json_response(detail_cache.for_request(data, request))
+
+class SimilarPropertiesView(APIView):
+    permission_classes = [AllowAny]
+    query_budget = 2
+
+    @swagger_auto_schema(
+        operation_id="list_similar_properties",
+        operation_description="List the listings most similar to a property (same city, close in price, area, rooms and facilities). Served from precomputed neighbor lists.",
+        responses={
+            200: openapi.Response(description="Similar properties retrieved successfully.", schema=SimilarPropertySerializer(many=True)),
+            404: "Not found. The property does not exist."
+        }
+    )
+    def get(self, request, property_id):
+        # One query: neighbor rows, the similar listings and their first photo
+        first_photo = PropertyImage.objects.filter(property=OuterRef('similar_id')).order_by('id').values('image')[:1]
+        links = (
+            SimilarProperty.objects.filter(property_id=property_id)
+            .select_related('similar')
+            .annotate(main_photo_path=Subquery(first_photo))
+            .order_by('rank')
+        )
+
+        similar = []
+        for link in links:
+            link.similar.score = link.score
+            link.similar.main_photo_path = link.main_photo_path
+            similar.append(link.similar)
+
+        if not similar and not Property.objects.filter(id=property_id).exists():
             return Response({"detail": "Property not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = PropertyDetailSerializer(property_instance, context={'request': request})
+        serializer = SimilarPropertySerializer(similar, many=True, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
-    
+
 class AddPropertyView(APIView):
     permission_classes = [IsAuthenticated, IsSeller]
 
@@ -79,7 +290,8 @@ class AddPropertyView(APIView):
     def post(self, request):
         serializer = PropertySerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            serializer.save(owner=request.user)
+            property_instance = serializer.save(owner=request.user)
+            match_saved_searches(property_instance)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -98,16 +310,20 @@ class EditPropertyView(APIView):
         }
     )
     def patch(self, request, property_id):
-        try:
-            property_instance = Property.objects.get(id=property_id, owner=request.user)
-        except Property.DoesNotExist:
-            return Response({"detail": "Property not found."}, status=status.HTTP_404_NOT_FOUND)
+        # The row is locked like facility_bits.update_masks locks it, so the
+        # full save writes back the current facility_mask, not a stale one
+        with transaction.atomic():
+            try:
+                property_instance = Property.objects.select_for_update().get(id=property_id, owner=request.user)
+            except Property.DoesNotExist:
+                return Response({"detail": "Property not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = PropertySerializer(property_instance, data=request.data, partial=True)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            serializer = PropertySerializer(property_instance, data=request.data, partial=True)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            property_instance = serializer.save()
+        match_saved_searches(property_instance)
+        return Response(serializer.data, status=status.HTTP_200_OK)
     
 #############FACILITY###########
 
@@ -140,19 +356,19 @@ class AddFacilityView(APIView):
         # Validate the input using a serializer
         serializer = AddFacilitySerializer(data=request.data, context={'property': property_instance})
         if serializer.is_valid():
-            facility_id = serializer.validated_data['facility_id']
-            try:
-                facility_instance = Facility.objects.get(id=facility_id)
-            except Facility.DoesNotExist:
-                return Response({"detail": "Facility not found."}, status=status.HTTP_404_NOT_FOUND)
+            # Already validated against the cached catalog
+            facility_instance = get_facility(serializer.validated_data['facility_id'])
 
-            # Check for duplicates
-            if PropertyFacility.objects.filter(property=property_instance, facility=facility_instance).exists():
+            # Create the intermediate model instance, rejecting duplicates
+            try:
+                _, created = PropertyFacility.objects.get_or_create(property=property_instance, facility=facility_instance)
+            except IntegrityError:
+                # Deleted in another process since this one loaded the catalog
+                facility_catalog.invalidate()
+                return Response({"facility_id": ["Facility with this ID does not exist."]}, status=status.HTTP_400_BAD_REQUEST)
+            if not created:
                 return Response({"detail": "Facility is already associated with the property."}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Create the intermediate model instance explicitly
-            PropertyFacility.objects.create(property=property_instance, facility=facility_instance)
-
             # Return the serialized facility data
             return Response(FacilitySerializer(facility_instance).data, status=status.HTTP_201_CREATED)
 
@@ -181,6 +397,59 @@ class RemoveFacilityView(APIView):
 
         property_instance.facilities.remove(facility_instance)
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+class FacilityListView(APIView):
+    permission_classes = [AllowAny]
+    query_budget = 1
+
+    @swagger_auto_schema(
+        operation_id="list_facilities",
+        operation_description="List every facility that can be assigned to a property.",
+        responses={
+            200: openapi.Response(description="Facilities retrieved successfully.", schema=FacilitySerializer(many=True)),
+        }
+    )
+    def get(self, request):
+        serializer = FacilitySerializer(get_facilities().values(), many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+class SetFacilitiesView(APIView):
+    permission_classes = [IsAuthenticated, IsSeller]
+
+    @swagger_auto_schema(
+        operation_id="set_property_facilities",
+        operation_description="Replace the facilities of a property with the given list in a single request.",
+        request_body=SetFacilitiesSerializer,
+        responses={
+            200: openapi.Response(description="Facilities updated successfully.", schema=FacilitySerializer(many=True)),
+            400: "Bad request. Invalid data provided.",
+            403: "Forbidden. You must be the owner of the property and in seller mode to edit its facilities.",
+            404: "Not found. The property does not exist."
+        }
+    )
+    def put(self, request, property_id):
+        try:
+            property_instance = Property.objects.get(id=property_id, owner=request.user)
+        except Property.DoesNotExist:
+            return Response({"detail": "Property not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = SetFacilitiesSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        facility_ids = serializer.validated_data['facility_ids']
+
+        # set() applies only the difference; the signals of the removed and
+        # added rows refresh what depends on the facilities once, at the end
+        try:
+            with transaction.atomic(), derived.batched():
+                property_instance.facilities.set(facility_ids)
+        except IntegrityError:
+            # A facility was deleted in another process since this one loaded the catalog
+            facility_catalog.invalidate()
+            return Response({"facility_ids": ["Some of these facilities do not exist."]}, status=status.HTTP_400_BAD_REQUEST)
+
+        catalog = facility_catalog.find_facilities(facility_ids)
+        return Response(FacilitySerializer([catalog[facility_id] for facility_id in facility_ids], many=True).data, status=status.HTTP_200_OK)
     
 
     
@@ -241,12 +510,18 @@ class AddPropertyImageView(APIView):
             if not image_file:
                 return Response({"detail": "Image file is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Save the PropertyImage instance
-            property_image_instance = PropertyImage.objects.create(
-                property=property_instance,
-                image=image_file,
-                caption=serializer.validated_data.get('caption', None)  # Optional field
-            )
+            # Re-check the image cap under a row lock so concurrent uploads cannot both pass it
+            with transaction.atomic():
+                Property.objects.select_for_update().filter(id=property_instance.id).first()
+                if property_instance.images.count() >= MAX_IMAGES_PER_PROPERTY:
+                    return Response({"detail": f"A property cannot have more than {MAX_IMAGES_PER_PROPERTY} images."}, status=status.HTTP_400_BAD_REQUEST)
+
+                # Save the PropertyImage instance
+                property_image_instance = PropertyImage.objects.create(
+                    property=property_instance,
+                    image=image_file,
+                    caption=serializer.validated_data.get('caption', None)  # Optional field
+                )
 
             # Serialize the saved instance to include the image_url field
             response_serializer = PropertyImageSerializer(
@@ -255,6 +530,235 @@ class AddPropertyImageView(APIView):
             )
             return Response(response_serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+class BulkAddPropertyImagesView(APIView):
+    permission_classes = [IsAuthenticated, IsSeller]
+    parser_classes = [MultiPartParser]
+
+    @swagger_auto_schema(
+        operation_id="bulk_add_property_images",
+        operation_description=f"Upload several images for a property in one request (at most {MAX_IMAGES_PER_PROPERTY} images per property).",
+        manual_parameters=[
+            openapi.Parameter(
+                'property_id',
+                openapi.IN_PATH,
+                description="The ID of the property to which the images will be added.",
+                type=openapi.TYPE_INTEGER,
+                required=True
+            ),
+            openapi.Parameter(
+                'images',
+                openapi.IN_FORM,
+                description="The image files to upload (repeat the field for each file).",
+                type=openapi.TYPE_FILE,
+                required=True
+            ),
+            openapi.Parameter(
+                'captions',
+                openapi.IN_FORM,
+                description="Optional captions, one per image and in the same order.",
+                type=openapi.TYPE_STRING,
+                required=False
+            ),
+        ],
+        responses={
+            201: openapi.Response(description="Images uploaded successfully.", schema=PropertyImageSerializer(many=True)),
+            400: "Bad request. Invalid data provided or too many images.",
+            403: "Forbidden. You must be the owner of the property and in seller mode to add images.",
+            404: "Not found. The property does not exist."
+        }
+    )
+    def post(self, request, property_id):
+        serializer = BulkPropertyImageSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        images = serializer.validated_data['images']
+
+        with transaction.atomic():
+            # The row lock serializes uploads to the same property, so the cap check cannot race
+            property_instance = Property.objects.select_for_update().filter(id=property_id, owner=request.user).first()
+            if property_instance is None:
+                return Response({"detail": "Property not found."}, status=status.HTTP_404_NOT_FOUND)
+
+            if property_instance.images.count() + len(images) > MAX_IMAGES_PER_PROPERTY:
+                return Response({"detail": f"A property cannot have more than {MAX_IMAGES_PER_PROPERTY} images."}, status=status.HTTP_400_BAD_REQUEST)
+
+            created = save_property_images(property_instance, images, serializer.validated_data.get('captions'))
+
+        response_serializer = PropertyImageSerializer(created, many=True, context={'request': request})
+        return Response(response_serializer.data, status=status.HTTP_201_CREATED)
+
+def _parse_chunk_offset(request):
+    """
+    Read the chunk offset from a `Content-Range: bytes <start>-<end>/<total>`
+    or an `Upload-Offset: <start>` header.
+    """
+    content_range = request.headers.get('Content-Range')
+    if content_range:
+        match = re.fullmatch(r'bytes (\d+)-(\d+)/(\d+|\*)', content_range.strip())
+        return int(match.group(1)) if match else None
+    offset = request.headers.get('Upload-Offset')
+    return int(offset) if offset and offset.isdigit() else None
+
+class StartImageUploadView(APIView):
+    permission_classes = [IsAuthenticated, IsSeller]
+
+    @swagger_auto_schema(
+        operation_id="start_image_upload",
+        operation_description="Start a resumable upload of a property image. Send the file with PUT requests to the returned upload, then finalize it.",
+        request_body=StartImageUploadSerializer,
+        responses={
+            201: openapi.Response(description="Upload started.", schema=ImageUploadSessionSerializer),
+            400: "Bad request. Invalid data provided, file too large or too many images.",
+            403: "Forbidden. You must be the owner of the property and in seller mode to add an image.",
+            404: "Not found. The property does not exist."
+        }
+    )
+    def post(self, request, property_id):
+        try:
+            property_instance = Property.objects.get(id=property_id, owner=request.user)
+        except Property.DoesNotExist:
+            return Response({"detail": "Property not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = StartImageUploadSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # Fail early instead of after the whole file was sent
+        if property_instance.images.count() >= MAX_IMAGES_PER_PROPERTY:
+            return Response({"detail": f"A property cannot have more than {MAX_IMAGES_PER_PROPERTY} images."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            session = chunked_uploads.start_upload(
+                property_instance,
+                request.user,
+                serializer.validated_data['filename'],
+                serializer.validated_data['size'],
+                serializer.validated_data.get('caption') or None,
+            )
+        except chunked_uploads.UploadError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = ImageUploadSessionSerializer(session).data
+        data['chunk_size'] = chunked_uploads.CHUNK_SIZE
+        return Response(data, status=status.HTTP_201_CREATED)
+
+class ImageUploadChunkView(APIView):
+    permission_classes = [IsAuthenticated, IsSeller]
+
+    def get_session(self, request, property_id, upload_id, lock=False):
+        sessions = ImageUploadSession.objects.filter(id=upload_id, property_id=property_id, user=request.user)
+        if lock:
+            sessions = sessions.select_for_update()
+        return sessions.first()
+
+    @swagger_auto_schema(
+        operation_id="get_image_upload",
+        operation_description="Get the state of a resumable upload. `offset` is the number of bytes received, resume sending from there.",
+        responses={
+            200: openapi.Response(description="Upload state retrieved successfully.", schema=ImageUploadSessionSerializer),
+            404: "Not found. The upload does not exist."
+        }
+    )
+    def get(self, request, property_id, upload_id):
+        session = self.get_session(request, property_id, upload_id)
+        if session is None:
+            return Response({"detail": "Upload not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(ImageUploadSessionSerializer(session).data, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_id="put_image_upload_chunk",
+        operation_description="Send the next chunk of a resumable upload as the raw request body. The offset is given with a `Content-Range: bytes <start>-<end>/<total>` or an `Upload-Offset: <start>` header and must equal the bytes already received.",
+        manual_parameters=[
+            openapi.Parameter('Content-Range', openapi.IN_HEADER, description="Byte range of the chunk.", type=openapi.TYPE_STRING, required=False),
+            openapi.Parameter('Upload-Offset', openapi.IN_HEADER, description="Byte offset of the chunk.", type=openapi.TYPE_INTEGER, required=False),
+        ],
+        responses={
+            200: openapi.Response(description="Chunk stored.", schema=ImageUploadSessionSerializer),
+            400: "Bad request. Missing offset or chunk past the end of the file.",
+            404: "Not found. The upload does not exist.",
+            409: "Conflict. The offset does not match the bytes already received."
+        }
+    )
+    def put(self, request, property_id, upload_id):
+        offset = _parse_chunk_offset(request)
+        if offset is None:
+            return Response({"detail": "A Content-Range or Upload-Offset header is required."}, status=status.HTTP_400_BAD_REQUEST)
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+
+        session = self.get_session(request, property_id, upload_id)
+        if session is None:
+            return Response({"detail": "Upload not found."}, status=status.HTTP_404_NOT_FOUND)
+        if offset != session.received_bytes:
+            return Response({"detail": f"Expected offset {session.received_bytes}.", "offset": session.received_bytes}, status=status.HTTP_409_CONFLICT)
+
+        staged = None
+        try:
+            # Read the body as a stream, never through the parsers, and before taking the lock
+            if length:
+                staged = chunked_uploads.receive_chunk(session, offset, request.stream, length)
+
+            with transaction.atomic():
+                # Locked so two retries of the same chunk cannot both be appended
+                session = self.get_session(request, property_id, upload_id, lock=True)
+                if session is None:
+                    return Response({"detail": "Upload not found."}, status=status.HTTP_404_NOT_FOUND)
+                if offset != session.received_bytes:
+                    return Response({"detail": f"Expected offset {session.received_bytes}.", "offset": session.received_bytes}, status=status.HTTP_409_CONFLICT)
+                if staged:
+                    chunked_uploads.append_chunk(session, staged)
+        except chunked_uploads.UploadError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        finally:
+            if staged:
+                chunked_uploads.discard_chunk(staged)
+
+        return Response(ImageUploadSessionSerializer(session).data, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_id="abort_image_upload",
+        operation_description="Abort a resumable upload and discard the received bytes.",
+        responses={
+            204: "No content. Upload aborted.",
+            404: "Not found. The upload does not exist."
+        }
+    )
+    def delete(self, request, property_id, upload_id):
+        session = self.get_session(request, property_id, upload_id)
+        if session is None:
+            return Response({"detail": "Upload not found."}, status=status.HTTP_404_NOT_FOUND)
+        chunked_uploads.discard_upload(session)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class FinalizeImageUploadView(APIView):
+    permission_classes = [IsAuthenticated, IsSeller]
+
+    @swagger_auto_schema(
+        operation_id="finalize_image_upload",
+        operation_description="Finish a resumable upload once every byte was received and add the image to the property.",
+        responses={
+            201: openapi.Response(description="Image uploaded successfully.", schema=PropertyImageSerializer),
+            400: "Bad request. The upload is incomplete, not an image, or the property has too many images.",
+            404: "Not found. The upload does not exist."
+        }
+    )
+    def post(self, request, property_id, upload_id):
+        with transaction.atomic():
+            property_instance = Property.objects.select_for_update().filter(id=property_id, owner=request.user).first()
+            session = ImageUploadSession.objects.filter(id=upload_id, property_id=property_id, user=request.user).first()
+            if property_instance is None or session is None:
+                return Response({"detail": "Upload not found."}, status=status.HTTP_404_NOT_FOUND)
+
+            if property_instance.images.count() >= MAX_IMAGES_PER_PROPERTY:
+                return Response({"detail": f"A property cannot have more than {MAX_IMAGES_PER_PROPERTY} images."}, status=status.HTTP_400_BAD_REQUEST)
+
+            try:
+                property_image_instance = chunked_uploads.finalize_upload(session)
+            except chunked_uploads.UploadError as e:
+                return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = PropertyImageSerializer(property_image_instance, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
 class DeletePropertyImageView(APIView):
     permission_classes = [IsAuthenticated, IsSeller]
 
@@ -315,18 +819,9 @@ class DeletePropertyImageView(APIView):
         except PropertyImage.DoesNotExist:
             return Response({"detail": "Image not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        # Delete the image
-        image_path = image_instance.image.path
-        
+        # Delete the image, the file is released by the post_delete signal
+        # (it may be shared with other images of the same content)
         image_instance.delete()
-        try:
-            if os.path.exists(image_path):
-                os.remove(image_path)
-                
-        except FileNotFoundError:
-            pass 
-        if os.path.exists(image_path):
-            os.remove(image_path)
         return Response(status=status.HTTP_204_NO_CONTENT)
     
 class EditImageCaptionView(APIView):
@@ -607,4 +1102,88 @@ class ListFavoritePropertiesView(ListAPIView):
     )
     def get_queryset(self):
         # Retrieve the authenticated user's favorite properties
-        return self.request.user.favorite_properties.all()
\ No newline at end of file
+        return self.request.user.favorite_properties.all()
+
+###########SAVED SEARCHES########
+class SavedSearchListCreateView(ListCreateAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = SavedSearchSerializer
+    pagination_class = None
+
+    def get_queryset(self):
+        return SavedSearch.objects.filter(user=self.request.user).order_by('-created_at')
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    @swagger_auto_schema(
+        operation_id="list_saved_searches",
+        operation_description="List the authenticated user's saved searches.",
+        responses={
+            200: openapi.Response(description="Saved searches retrieved successfully.", schema=SavedSearchSerializer(many=True)),
+        }
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_id="create_saved_search",
+        operation_description="Save a search (city, type, rent/sale and price range). Empty fields match any value. The user is emailed when a new listing matches.",
+        request_body=SavedSearchSerializer,
+        responses={
+            201: openapi.Response(description="Saved search created successfully.", schema=SavedSearchSerializer),
+            400: "Bad request. Invalid data provided.",
+        }
+    )
+    def post(self, request, *args, **kwargs):
+        return super().post(request, *args, **kwargs)
+
+class DeleteSavedSearchView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_id="delete_saved_search",
+        operation_description="Delete one of the authenticated user's saved searches.",
+        responses={
+            204: "No content. Saved search deleted successfully.",
+            404: "Not found. The saved search does not exist."
+        }
+    )
+    def delete(self, request, search_id):
+        deleted, _ = SavedSearch.objects.filter(id=search_id, user=request.user).delete()
+        if not deleted:
+            return Response({"detail": "Saved search not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+###########IMAGE RESIZING########
+class ResizedImageView(APIView):
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    @swagger_auto_schema(
+        operation_id="get_resized_image",
+        operation_description="Serve a media image scaled down to fit in a width x height box. Variants are resized on first request and cached.",
+        responses={
+            200: "The resized image.",
+            400: "Bad request. Invalid size or the file is not an image.",
+            404: "Not found. The image does not exist.",
+            503: "Service unavailable. Too many images are being resized, retry later."
+        }
+    )
+    def get(self, request, width, height, path):
+        try:
+            resized_path, content_type = image_resize.get_resized(path, width, height)
+            try:
+                resized_file = open(resized_path, 'rb')
+            except FileNotFoundError:
+                # Evicted between the lookup and the open, the second lookup resizes again
+                resized_path, content_type = image_resize.get_resized(path, width, height)
+                resized_file = open(resized_path, 'rb')
+        except image_resize.ResizeError as e:
+            return Response({"detail": str(e)}, status=e.status)
+
+        # FileResponse streams the file and lets the server use sendfile
+        response = FileResponse(resized_file, content_type=content_type)
+        patch_cache_control(response, public=True, max_age=image_resize.CACHE_MAX_AGE)
+        return response
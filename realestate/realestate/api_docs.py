@@ -0,0 +1,87 @@
+"""
+Lazily built API documentation metadata.
+
+Views declare their documentation with `swagger_auto_schema` and `openapi`
+from this module instead of drf_yasg. Nothing is imported or built when the
+views load: the decorator only records its arguments, and `openapi.X(...)`
+only records the call. The real drf_yasg objects are built and attached to
+the views by `resolve_schemas()`, called by the schema generator the first
+time documentation is requested. Workers running with API_DOCS_ENABLED off
+never import drf_yasg at all.
+"""
+import threading
+
+_pending = []  # (view method, decorator kwargs) not attached yet
+_lock = threading.Lock()
+
+
+class _Deferred:
+    """
+    A drf_yasg.openapi attribute, or a call of it, resolved on demand.
+    """
+    def __init__(self, name, args=None, kwargs=None):
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs
+
+    def __call__(self, *args, **kwargs):
+        return _Deferred(self.name, args, kwargs)
+
+    def resolve(self):
+        from drf_yasg import openapi as yasg_openapi
+
+        value = getattr(yasg_openapi, self.name)
+        if self.args is None and self.kwargs is None:
+            return value
+        return value(*_resolve(self.args), **_resolve(self.kwargs))
+
+    def __repr__(self):
+        return f"<deferred openapi.{self.name}>"
+
+
+def _resolve(value):
+    if isinstance(value, _Deferred):
+        return value.resolve()
+    if isinstance(value, dict):
+        return {key: _resolve(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_resolve(item) for item in value)
+    return value
+
+
+class _LazyOpenAPI:
+    """
+    Stand-in for the drf_yasg.openapi module.
+    """
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return _Deferred(name)
+
+
+openapi = _LazyOpenAPI()
+
+
+def swagger_auto_schema(**kwargs):
+    """
+    Same arguments as drf_yasg.utils.swagger_auto_schema, applied on first use of the docs.
+    """
+    def decorator(view_method):
+        with _lock:
+            _pending.append((view_method, kwargs))
+        return view_method
+    return decorator
+
+
+def resolve_schemas():
+    """
+    Build the recorded documentation metadata and attach it to the views.
+    """
+    if not _pending:
+        return
+    from drf_yasg.utils import swagger_auto_schema as attach_schema
+
+    with _lock:
+        while _pending:
+            view_method, kwargs = _pending.pop(0)
+            attach_schema(**_resolve(kwargs))(view_method)
@@ -0,0 +1,22 @@
+"""
+Helpers for the batch read endpoints (`?ids=1,2,3`).
+"""
+
+
+def parse_ids(value, limit):
+    """
+    Return the distinct ids of a comma-separated `ids` parameter, in the
+    order given. Raise ValueError with a client-facing message when the
+    parameter is missing, malformed or lists more than `limit` ids.
+    """
+    if not value:
+        raise ValueError("The 'ids' parameter is required.")
+    try:
+        ids = list(dict.fromkeys(int(part) for part in value.split(',') if part.strip()))
+    except ValueError:
+        raise ValueError("'ids' must be a comma-separated list of integers.")
+    if not ids:
+        raise ValueError("The 'ids' parameter is required.")
+    if len(ids) > limit:
+        raise ValueError(f"At most {limit} ids can be requested at once.")
+    return ids
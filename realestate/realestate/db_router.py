@@ -0,0 +1,187 @@
+"""
+Read replica routing.
+
+Writes always go to the primary ('default'). Reads go to a replica only
+inside GET/HEAD/OPTIONS requests (see ReplicaRoutingMiddleware); everything
+else, including management commands and signal handlers, reads from the
+primary. Replicas are used round-robin and a replica that fails its health
+check is left out for DB_REPLICA_EJECT_SECONDS.
+
+A client whose request wrote to the database keeps reading from the primary
+for DB_STICKY_SECONDS, so it sees its own changes despite replication lag.
+Clients are recognised by their Authorization header or session cookie,
+through the cache shared by the workers (Redis with REDIS_URL, otherwise a
+file cache the workers of one machine share), and also get a cookie for
+clients that keep them.
+"""
+import hashlib
+import itertools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = 'default'
+REPLICAS = [alias for alias in settings.DATABASES if alias != PRIMARY]
+STICKY_SECONDS = getattr(settings, 'DB_STICKY_SECONDS', 5)
+EJECT_SECONDS = getattr(settings, 'DB_REPLICA_EJECT_SECONDS', 30)
+HEALTH_CHECK_INTERVAL = getattr(settings, 'DB_REPLICA_HEALTH_CHECK_INTERVAL', 5)  # seconds
+STICKY_COOKIE = 'db_primary_until'
+
+# RequestRouting of the request being served, None outside requests
+_routing = ContextVar('db_routing', default=None)
+
+
+class RequestRouting:
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.wrote = False
+
+
+class ReplicaHealth:
+    """
+    Process-wide health of the replicas, checked at most every HEALTH_CHECK_INTERVAL.
+    """
+    def __init__(self, replicas):
+        self.replicas = list(replicas)
+        self._cycle = itertools.cycle(self.replicas) if self.replicas else None
+        self._lock = threading.Lock()
+        self._checked_at = {}
+        self._ejected_until = {}
+
+    def check(self, alias):
+        connection = connections[alias]
+        try:
+            connection.ensure_connection()
+            return connection.is_usable()
+        except DatabaseError:
+            return False
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        if self._ejected_until.get(alias, 0) > now:
+            return False
+        if now - self._checked_at.get(alias, 0) < HEALTH_CHECK_INTERVAL:
+            return True
+        self._checked_at[alias] = now
+        if self.check(alias):
+            return True
+        logger.warning("Replica %s failed its health check, ejected for %d seconds", alias, EJECT_SECONDS)
+        self.eject(alias)
+        return False
+
+    def eject(self, alias):
+        self._ejected_until[alias] = time.monotonic() + EJECT_SECONDS
+
+    def next_replica(self):
+        """
+        Return the next healthy replica, or None if there is none.
+        """
+        if self._cycle is None:
+            return None
+        for _ in range(len(self.replicas)):
+            with self._lock:
+                alias = next(self._cycle)
+            if self.is_healthy(alias):
+                return alias
+        return None
+
+
+health = ReplicaHealth(REPLICAS)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if routing is None or not routing.use_replica:
+            return PRIMARY
+        return health.next_replica() or PRIMARY
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            # Later reads of this request and client must see the write
+            routing.wrote = True
+            routing.use_replica = False
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # All aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+def _client_key(request):
+    identity = request.headers.get('Authorization') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not identity:
+        return None
+    return 'db-primary:' + hashlib.sha256(identity.encode()).hexdigest()
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Let the reads of safe requests go to the replicas, unless the client wrote recently.
+    """
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        key = _client_key(request)
+        routing = RequestRouting(use_replica=request.method in self.SAFE_METHODS and not self.is_sticky(request, key, cache.get(key) if key else None))
+        token = _routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+
+        if routing.wrote and response.status_code < 400:
+            until = self.stick(response)
+            if key:
+                cache.set(key, until, STICKY_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        key = _client_key(request)
+        routing = RequestRouting(use_replica=request.method in self.SAFE_METHODS and not self.is_sticky(request, key, await cache.aget(key) if key else None))
+        token = _routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+
+        if routing.wrote and response.status_code < 400:
+            until = self.stick(response)
+            if key:
+                await cache.aset(key, until, STICKY_SECONDS)
+        return response
+
+    def stick(self, response):
+        until = time.time() + STICKY_SECONDS
+        response.set_cookie(STICKY_COOKIE, str(int(until) + 1), max_age=STICKY_SECONDS, httponly=True, samesite='Lax')
+        return until
+
+    def is_sticky(self, request, key, cached):
+        try:
+            if float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time():
+                return True
+        except ValueError:
+            pass
+        return bool(key and cached)
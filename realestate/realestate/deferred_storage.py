@@ -0,0 +1,89 @@
+"""
+Deferred storage operations.
+
+Request handlers must not delete files inline: if the transaction rolls back
+the file is already gone, and on network storage each delete adds latency to
+the response. delete_on_commit() queues the delete until the transaction
+commits and runs it on a small, bounded thread pool with retries.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+WORKERS = getattr(settings, 'DEFERRED_STORAGE_WORKERS', 2)
+MAX_ATTEMPTS = getattr(settings, 'DEFERRED_STORAGE_MAX_ATTEMPTS', 3)
+RETRY_DELAY = getattr(settings, 'DEFERRED_STORAGE_RETRY_DELAY', 0.5)  # seconds, doubled on every retry
+# Run the operations inline, e.g. in tests or management commands
+SYNC = getattr(settings, 'DEFERRED_STORAGE_SYNC', False)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='deferred-storage')
+    return _executor
+
+
+def _delete_with_retries(storage, name):
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            storage.delete(name)
+            return True
+        except Exception:
+            if attempt == MAX_ATTEMPTS:
+                logger.exception("Giving up deleting %s after %d attempts", name, attempt)
+                return False
+            logger.warning("Deleting %s failed (attempt %d), retrying", name, attempt)
+            time.sleep(RETRY_DELAY * 2 ** (attempt - 1))
+
+
+def submit(function, *args):
+    """
+    Run a storage task that also uses the database in the background, now.
+    """
+    if SYNC:
+        function(*args)
+    else:
+        _get_executor().submit(_run_task, function, args)
+
+
+def _run_task(function, args):
+    try:
+        function(*args)
+    except Exception:
+        logger.exception("Deferred storage task %s failed", function.__name__)
+    finally:
+        # Connections are per thread, the pool's would otherwise stay open
+        connections.close_all()
+
+
+def submit_delete(name, storage=None):
+    """
+    Delete a file in the background, now.
+    """
+    storage = storage or default_storage
+    if SYNC:
+        _delete_with_retries(storage, name)
+    else:
+        _get_executor().submit(_delete_with_retries, storage, name)
+
+
+def delete_on_commit(name, storage=None):
+    """
+    Delete a file in the background once the current transaction commits.
+    Nothing is deleted if it rolls back.
+    """
+    if name:
+        transaction.on_commit(lambda: submit_delete(name, storage))
@@ -0,0 +1,306 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters and histograms are plain dicts updated under a per-metric lock, a
+few hundred nanoseconds per update. With several worker processes, set
+METRICS_DIR to a directory shared by the workers: every process writes a
+snapshot of its values there (at most every METRICS_FLUSH_INTERVAL seconds)
+and the process answering the scrape sums all the snapshots. Gauges are
+computed by the scraping process when the metrics are collected.
+"""
+import atexit
+import bisect
+import hmac
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.permissions import BasePermission
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+METRICS_DIR = getattr(settings, 'METRICS_DIR', None)
+FLUSH_INTERVAL = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)  # seconds
+# Scrapers authenticate with "Authorization: Bearer <METRICS_TOKEN>"; staff users always can
+METRICS_TOKEN = getattr(settings, 'METRICS_TOKEN', None)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self._last_flush = 0.0
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def snapshot(self):
+        return {metric.name: metric.snapshot() for metric in self.metrics if not isinstance(metric, Gauge)}
+
+    def snapshot_path(self):
+        return Path(METRICS_DIR) / f"{os.getpid()}.json"
+
+    def flush(self):
+        """
+        Write this process' values to the shared directory.
+        """
+        if not METRICS_DIR:
+            return
+        self._last_flush = time.monotonic()
+        path = self.snapshot_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_suffix(f".{threading.get_ident()}.tmp")
+        temporary.write_text(json.dumps(self.snapshot()))
+        os.replace(temporary, path)
+
+    def maybe_flush(self):
+        if METRICS_DIR and time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def collect(self):
+        """
+        Return {metric name: {label values: value}} summed over every process.
+        """
+        totals = self.snapshot()
+        if METRICS_DIR:
+            self.flush()
+            own = self.snapshot_path()
+            for path in Path(METRICS_DIR).glob('*.json'):
+                if path == own:
+                    continue
+                try:
+                    snapshot = json.loads(path.read_text())
+                except (OSError, ValueError):
+                    continue  # Being replaced, or written by an older release
+                for metric in self.metrics:
+                    if metric.name in snapshot:
+                        metric.merge(totals[metric.name], snapshot[metric.name])
+        for metric in self.metrics:
+            if isinstance(metric, Gauge):
+                totals[metric.name] = metric.snapshot()
+        return totals
+
+    def render(self):
+        totals = self.collect()
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render(totals[metric.name]))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def key(self, labels):
+        return '\x1f'.join(str(labels[name]) for name in self.labelnames)
+
+    def labels_of(self, key):
+        return key.split('\x1f') if self.labelnames else []
+
+    def snapshot(self):
+        with self._lock:
+            return {key: self.copy_value(value) for key, value in self._values.items()}
+
+    def copy_value(self, value):
+        return value
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def merge(self, totals, other):
+        for key, value in other.items():
+            totals[key] = totals.get(key, 0) + value
+
+    def render(self, values):
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, self.labels_of(key))} {value}"
+
+
+class Histogram(Metric):
+    """
+    Fixed buckets; a value is [count per bucket, +Inf bucket count, sum].
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=()):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, amount, **labels):
+        key = self.key(labels)
+        index = bisect.bisect_left(self.buckets, amount)
+        with self._lock:
+            value = self._values.get(key)
+            if value is None:
+                value = self._values[key] = [0] * (len(self.buckets) + 1) + [0]
+            value[index] += 1
+            value[-1] += amount
+
+    def copy_value(self, value):
+        return list(value)
+
+    def merge(self, totals, other):
+        for key, value in other.items():
+            if key not in totals:
+                totals[key] = list(value)
+            else:
+                totals[key] = [a + b for a, b in zip(totals[key], value)]
+
+    def render(self, values):
+        for key, value in sorted(values.items()):
+            labels = self.labels_of(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), value[:-1]):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, [('le', bound)])} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {value[-1]}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Gauge(Metric):
+    """
+    Value computed at collection time by `function`, returning a number or {label values tuple: number}.
+    """
+    type = 'gauge'
+
+    def __init__(self, name, documentation, function, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def snapshot(self):
+        try:
+            value = self.function()
+        except Exception:
+            return {}
+        if isinstance(value, dict):
+            return {'\x1f'.join(map(str, labels)): amount for labels, amount in value.items()}
+        return {'': value}
+
+    def render(self, values):
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, self.labels_of(key))} {value}"
+
+
+def _pending_alert_emails():
+    from properties.models import SavedSearchMatch
+
+    return SavedSearchMatch.objects.filter(notified_at__isnull=True).count()
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+REQUESTS = Counter('http_requests_total', "HTTP requests by URL name, method and status code.", ['url_name', 'method', 'status'])
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', "Request latency by URL name.", ['url_name'], LATENCY_BUCKETS)
+DB_QUERIES = Histogram('db_queries_per_request', "SQL queries per request by URL name.", ['url_name'], QUERY_BUCKETS)
+DB_TIME = Counter('db_query_seconds_total', "Time spent in SQL queries by URL name.", ['url_name'])
+CACHE_REQUESTS = Counter('cache_requests_total', "Cache lookups by cache and result (hit or miss).", ['cache', 'result'])
+EMAIL_QUEUE = Gauge('email_queue_depth', "Saved search alerts waiting to be emailed.", _pending_alert_emails)
+
+
+def cache_lookup(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+if METRICS_DIR:
+    atexit.register(REGISTRY.flush)
+
+
+class MetricsMiddleware:
+    """
+    Count requests and record their latency and SQL queries per URL name.
+    Must come before QueryInstrumentationMiddleware, whose stats it reads.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, duration):
+        match = getattr(request, 'resolver_match', None)
+        url_name = (match.url_name if match else None) or 'unmatched'
+        REQUESTS.inc(url_name=url_name, method=request.method, status=response.status_code)
+        REQUEST_LATENCY.observe(duration, url_name=url_name)
+        stats = getattr(request, 'query_stats', None)
+        if stats is not None:
+            DB_QUERIES.observe(stats.count, url_name=url_name)
+            DB_TIME.inc(stats.duration, url_name=url_name)
+        REGISTRY.maybe_flush()
+
+
+class MetricsTokenAuthentication(BaseAuthentication):
+    """
+    Accepts "Authorization: Bearer <METRICS_TOKEN>", before JWT authentication rejects it.
+    """
+    def authenticate(self, request):
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if METRICS_TOKEN and scheme == 'Bearer' and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+            return AnonymousUser(), self
+        return None
+
+
+class CanReadMetrics(BasePermission):
+    def has_permission(self, request, view):
+        return isinstance(request.auth, MetricsTokenAuthentication) or bool(request.user and request.user.is_staff)
+
+
+class MetricsView(APIView):
+    authentication_classes = [MetricsTokenAuthentication, JWTAuthentication]
+    permission_classes = [CanReadMetrics]
+    swagger_schema = None  # Not part of the public API
+
+    def get(self, request):
+        return HttpResponse(REGISTRY.render(), content_type=CONTENT_TYPE)
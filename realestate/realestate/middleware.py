@@ -0,0 +1,274 @@
+"""
+Project-wide middleware.
+"""
+import gzip
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+
+from .metrics import cache_lookup
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+query_logger = logging.getLogger('realestate.queries')
+
+
+class CompressionMiddleware:
+    """
+    Compress API responses with brotli (when installed and accepted) or gzip.
+
+    Only responses above a size threshold and with a compressible content type
+    are compressed. Compressed bodies of cacheable responses are kept in a
+    small in-process LRU keyed by the body hash, so hot responses are not
+    compressed again on every hit.
+    """
+    MIN_SIZE = getattr(settings, 'COMPRESSION_MIN_SIZE', 500)  # bytes
+    CONTENT_TYPES = getattr(settings, 'COMPRESSION_CONTENT_TYPES', (
+        'application/json',
+        'application/openapi+json',
+        'application/javascript',
+        'application/xml',
+        'text/',
+        'image/svg+xml',
+    ))
+    GZIP_LEVEL = getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6)
+    BROTLI_QUALITY = getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5)
+    CACHE_ENTRIES = getattr(settings, 'COMPRESSION_CACHE_ENTRIES', 256)
+    CACHE_MAX_BODY = getattr(settings, 'COMPRESSION_CACHE_MAX_BODY', 1024 * 1024)  # bytes
+
+    _accept_re = re.compile(r'\s*([^\s;,]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?')
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if not content_type.startswith(self.CONTENT_TYPES):
+            return response
+
+        # Vary even when not compressing this time, caches must not mix encodings
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < self.MIN_SIZE:
+            return response
+
+        encoding = self.negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        compressed = self.compress(response.content, encoding, self.is_cacheable(response))
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # The representation changed, a strong ETag would no longer be valid
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
+    def negotiate(self, accept_encoding):
+        """
+        Pick 'br' or 'gzip' from an Accept-Encoding header, None if neither is acceptable.
+        """
+        accepted = {}
+        for match in self._accept_re.finditer(accept_encoding):
+            coding, quality = match.group(1).lower(), match.group(2)
+            try:
+                accepted[coding] = float(quality) if quality is not None else 1.0
+            except ValueError:
+                continue
+
+        wildcard = accepted.get('*', 0)
+        if brotli is not None and accepted.get('br', wildcard) > 0:
+            return 'br'
+        if accepted.get('gzip', wildcard) > 0:
+            return 'gzip'
+        return None
+
+    def is_cacheable(self, response):
+        cache_control = response.get('Cache-Control', '').lower()
+        if any(directive in cache_control for directive in ('no-store', 'no-cache', 'private', 'max-age=0')):
+            return False
+        return response.has_header('ETag') or 'max-age' in cache_control
+
+    def compress(self, content, encoding, cacheable):
+        if not cacheable or len(content) > self.CACHE_MAX_BODY:
+            return self._compress(content, encoding)
+
+        # Hashing is much cheaper than compressing again
+        key = (encoding, hashlib.sha1(content).digest())
+        with self._cache_lock:
+            compressed = self._cache.get(key)
+            if compressed is not None:
+                self._cache.move_to_end(key)
+        cache_lookup('compressed_responses', hit=compressed is not None)
+        if compressed is not None:
+            return compressed
+
+        compressed = self._compress(content, encoding)
+        with self._cache_lock:
+            self._cache[key] = compressed
+            if len(self._cache) > self.CACHE_ENTRIES:
+                self._cache.popitem(last=False)
+        return compressed
+
+    def _compress(self, content, encoding):
+        if encoding == 'br':
+            return brotli.compress(content, quality=self.BROTLI_QUALITY)
+        return gzip.compress(content, compresslevel=self.GZIP_LEVEL, mtime=0)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryStats:
+    """
+    execute_wrapper recording the number, total time and slowest of the SQL statements run.
+    """
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest_duration = 0.0
+        self.slowest_sql = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            if duration >= self.slowest_duration:
+                self.slowest_duration = duration
+                self.slowest_sql = sql
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Record the SQL queries of every request and report them in a Server-Timing
+    header and in the `realestate.queries` log.
+
+    Views may declare a `query_budget` (maximum number of queries per request).
+    Going over it logs a warning, or raises QueryBudgetExceeded when
+    QUERY_BUDGET_RAISE is set (the test runner sets it for every test).
+    """
+    SERVER_TIMING = getattr(settings, 'QUERY_SERVER_TIMING', True)
+    MAX_LOGGED_SQL = 500  # characters
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = request.query_stats = QueryStats()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            self.install(stack, stats)
+            response = self.get_response(request)
+        return self.process_response(request, response, stats, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        stats = request.query_stats = QueryStats()
+        start = time.perf_counter()
+        # Connections belong to a thread: install the wrappers in the thread that
+        # runs this request's ORM calls (thread sensitive sync_to_async)
+        stack = ExitStack()
+        await sync_to_async(self.install)(stack, stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.process_response(request, response, stats, time.perf_counter() - start)
+
+    def install(self, stack, stats):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+
+    def process_response(self, request, response, stats, total):
+        view = self.view_name(request)
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'view': view,
+            'status': response.status_code,
+            'duration_ms': round(total * 1000, 2),
+            'db_queries': stats.count,
+            'db_time_ms': round(stats.duration * 1000, 2),
+            'db_slowest_ms': round(stats.slowest_duration * 1000, 2),
+            'db_slowest_sql': (stats.slowest_sql or '')[:self.MAX_LOGGED_SQL],
+        }
+        query_logger.info("%s %s: %d queries in %.1f ms", request.method, request.path, stats.count, stats.duration * 1000, extra=fields)
+
+        if self.SERVER_TIMING:
+            timings = [
+                f'db;desc="{stats.count} queries";dur={stats.duration * 1000:.1f}',
+                f'db-slowest;dur={stats.slowest_duration * 1000:.1f}',
+                f'app;dur={total * 1000:.1f}',
+            ]
+            if response.has_header('Server-Timing'):
+                timings.insert(0, response['Server-Timing'])
+            response['Server-Timing'] = ', '.join(timings)
+
+        budget = self.query_budget(request)
+        if budget is not None and stats.count > budget:
+            message = f"{view} made {stats.count} queries, its budget is {budget}."
+            if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+                raise QueryBudgetExceeded(message)
+            query_logger.warning(message, extra=fields)
+        return response
+
+    def view_class(self, request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return None
+        # Class based views and @api_view functions
+        return getattr(match.func, 'view_class', None) or getattr(match.func, 'cls', None)
+
+    def view_name(self, request):
+        view_class = self.view_class(request)
+        if view_class is not None:
+            return f"{view_class.__module__}.{view_class.__qualname__}"
+        match = getattr(request, 'resolver_match', None)
+        return match.view_name if match else None
+
+    def query_budget(self, request):
+        return getattr(self.view_class(request), 'query_budget', None)
@@ -0,0 +1,202 @@
+"""
+Opt-in profiling of individual requests.
+
+With PROFILING_ENABLED, a request is profiled when it carries a valid signed
+X-Profile header (see `manage.py profiling_token`) or is picked by
+PROFILING_SAMPLE_RATE. It then runs under cProfile while a sampler thread
+records its call stacks, and two files are written to PROFILING_DIR:
+`<name>.prof` (load with pstats or snakeviz) and `<name>.collapsed` (one
+"frame;frame;frame count" line per stack, the input of flamegraph.pl and
+speedscope). Only the newest PROFILING_MAX_FILES profiles are kept.
+
+With PROFILING_ENABLED off the middleware removes itself at startup, so it
+costs nothing.
+"""
+import cProfile
+import io
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, Http404
+from django.shortcuts import render
+
+ENABLED = getattr(settings, 'PROFILING_ENABLED', False)
+PROFILING_DIR = Path(getattr(settings, 'PROFILING_DIR', settings.BASE_DIR / 'profiles'))
+SAMPLE_RATE = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)  # Fraction of requests profiled without the header
+MAX_FILES = getattr(settings, 'PROFILING_MAX_FILES', 200)  # Profiles kept, the oldest are deleted
+SAMPLE_INTERVAL = getattr(settings, 'PROFILING_SAMPLE_INTERVAL', 0.001)  # seconds between stack samples
+TOKEN_MAX_AGE = getattr(settings, 'PROFILING_TOKEN_MAX_AGE', 24 * 3600)  # seconds
+
+HEADER = 'X-Profile'
+_SALT = 'realestate.profiling'
+
+_rotate_lock = threading.Lock()
+# Held by the request being profiled. Since Python 3.12 cProfile runs on
+# sys.monitoring, which takes a single profiler per process: a second one
+# fails to enable, so concurrent requests are served without profiling.
+_profile_lock = threading.Lock()
+
+
+def make_token():
+    """
+    Return a signed value for the X-Profile header, valid for TOKEN_MAX_AGE seconds.
+    """
+    return signing.TimestampSigner(salt=_SALT).sign('profile')
+
+
+def is_valid_token(token):
+    try:
+        return signing.TimestampSigner(salt=_SALT).unsign(token, max_age=TOKEN_MAX_AGE) == 'profile'
+    except signing.BadSignature:
+        return False
+
+
+class StackSampler(threading.Thread):
+    """
+    Sample the call stack of one thread at a fixed interval.
+    """
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True, name='profiling-sampler')
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request.headers.get(HEADER)
+        if not (token and is_valid_token(token)) and not (SAMPLE_RATE and random.random() < SAMPLE_RATE):
+            return self.get_response(request)
+
+        if not _profile_lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            profiler = cProfile.Profile()
+            sampler = StackSampler(threading.get_ident(), SAMPLE_INTERVAL)
+            sampler.start()
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+                duration = time.perf_counter() - start
+                sampler.stop()
+        finally:
+            _profile_lock.release()
+
+        match = getattr(request, 'resolver_match', None)
+        url_name = (match.url_name if match else None) or 'unmatched'
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{request.method}-{url_name}-{duration * 1000:.0f}ms"
+        self.save(name, profiler, sampler.stacks)
+        response['X-Profile-Id'] = name
+        return response
+
+    def save(self, name, profiler, stacks):
+        PROFILING_DIR.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(PROFILING_DIR / f"{name}.prof")
+        with open(PROFILING_DIR / f"{name}.collapsed", 'w') as collapsed:
+            for stack, count in stacks.most_common():
+                collapsed.write(f"{stack} {count}\n")
+        rotate()
+
+
+def list_profiles():
+    """
+    Return the profile names, newest first.
+    """
+    if not PROFILING_DIR.exists():
+        return []
+    profiles = sorted(PROFILING_DIR.glob('*.prof'), key=lambda path: path.stat().st_mtime, reverse=True)
+    return [path.stem for path in profiles]
+
+
+def rotate():
+    with _rotate_lock:
+        for name in list_profiles()[MAX_FILES:]:
+            for suffix in ('.prof', '.collapsed'):
+                try:
+                    os.remove(PROFILING_DIR / f"{name}{suffix}")
+                except FileNotFoundError:
+                    pass
+
+
+# Admin pages
+
+def _profile_or_404(name):
+    if name not in list_profiles():
+        raise Http404("Profile not found.")
+    return PROFILING_DIR / f"{name}.prof"
+
+
+@staff_member_required
+def profile_list_view(request):
+    context = {
+        **admin.site.each_context(request),
+        'title': "Request profiles",
+        'profiles': list_profiles(),
+        'enabled': ENABLED,
+        'sample_rate': SAMPLE_RATE,
+        'header': HEADER,
+    }
+    return render(request, 'admin/profiling/profile_list.html', context)
+
+
+@staff_member_required
+def profile_detail_view(request, name):
+    path = _profile_or_404(name)
+    sort = request.GET.get('sort', 'cumulative')
+    if sort not in ('cumulative', 'tottime', 'ncalls'):
+        sort = 'cumulative'
+    output = io.StringIO()
+    pstats.Stats(str(path), stream=output).strip_dirs().sort_stats(sort).print_stats(60)
+    context = {
+        **admin.site.each_context(request),
+        'title': name,
+        'name': name,
+        'sort': sort,
+        'stats': output.getvalue(),
+    }
+    return render(request, 'admin/profiling/profile_detail.html', context)
+
+
+@staff_member_required
+def profile_download_view(request, name, kind):
+    if kind not in ('prof', 'collapsed'):
+        raise Http404("Profile not found.")
+    path = _profile_or_404(name).with_suffix(f".{kind}")
+    if not path.exists():
+        raise Http404("Profile not found.")
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name)
@@ -0,0 +1,119 @@
+"""
+OpenAPI schema and documentation views.
+
+Introspecting every view takes hundreds of milliseconds, so outside of live
+mode (OPENAPI_SCHEMA_LIVE, on in DEBUG) the schema is generated once, at
+deploy time with `manage.py generate_openapi_schema` or on first use, and
+served from memory with an ETag.
+"""
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson
+from drf_yasg.generators import OpenAPISchemaGenerator
+from drf_yasg.views import get_schema_view
+from rest_framework import permissions
+
+from .api_docs import resolve_schemas
+
+logger = logging.getLogger(__name__)
+
+
+class LazyDocsSchemaGenerator(OpenAPISchemaGenerator):
+    """
+    Attaches the views' lazily declared documentation before introspecting them.
+    """
+    def get_schema(self, request=None, public=False):
+        resolve_schemas()
+        return super().get_schema(request, public)
+
+
+API_INFO = openapi.Info(
+    title="Django Auth API",
+    default_version='v1',
+    description="API for user realestate app",
+    terms_of_service="https://www.example.com/terms/",
+    contact=openapi.Contact(email="contact@example.com"),
+    license=openapi.License(name="MIT License"),
+)
+
+# Swagger schema view
+schema_view = get_schema_view(
+    API_INFO,
+    public=True,
+    permission_classes=(permissions.AllowAny,),
+)
+
+SCHEMA_CACHE_MAX_AGE = 300  # seconds
+
+_lock = threading.Lock()
+_schema = None  # (body, etag) once loaded
+
+
+def generate_schema():
+    """
+    Build the public schema without a request and encode it as JSON bytes.
+    """
+    generator = schema_view.generator_class(API_INFO)
+    schema = generator.get_schema(request=None, public=True)
+    return OpenAPICodecJson(validators=[]).encode(schema)
+
+
+def get_schema():
+    """
+    Return (body, etag) of the precomputed schema, loading it on first use.
+    """
+    global _schema
+    if _schema is None:
+        with _lock:
+            if _schema is None:
+                path = Path(settings.OPENAPI_SCHEMA_PATH)
+                if path.exists():
+                    body = path.read_bytes()
+                else:
+                    logger.warning("%s not found, generating the OpenAPI schema. Run generate_openapi_schema at deploy time.", path)
+                    body = generate_schema()
+                _schema = (body, '"%s"' % hashlib.sha256(body).hexdigest())
+    return _schema
+
+
+def etag_matches(etag, if_none_match):
+    """
+    Weak comparison of If-None-Match, as django.utils.cache does: compressed
+    responses carry the ETag as W/"...", and clients send it back that way.
+    """
+    tags = parse_etags(if_none_match)
+    return tags == ['*'] or etag.removeprefix('W/') in [tag.removeprefix('W/') for tag in tags]
+
+
+def serve_schema(request):
+    body, etag = get_schema()
+    if etag_matches(etag, request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/openapi+json; charset=utf-8')
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=SCHEMA_CACHE_MAX_AGE)
+    return response
+
+
+def docs_view(renderer):
+    """
+    Swagger/ReDoc UI view whose `?format=openapi` schema requests are served
+    from the precomputed schema unless live generation is enabled.
+    """
+    ui_view = schema_view.with_ui(renderer, cache_timeout=0)
+
+    def view(request, *args, **kwargs):
+        if not settings.OPENAPI_SCHEMA_LIVE and request.GET.get('format') == 'openapi':
+            return serve_schema(request)
+        return ui_view(request, *args, **kwargs)
+
+    return view
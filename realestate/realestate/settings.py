@@ -10,9 +10,10 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import warnings
 from pathlib import Path
 from datetime import timedelta
-from decouple import config
+from decouple import config, Csv
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -43,14 +44,24 @@ INSTALLED_APPS = [
     'djoser',
     'rest_framework_simplejwt',
     'rest_framework_simplejwt.token_blacklist',
-    'drf_yasg',
     'corsheaders',
     'django_filters',
     'users',
     'properties',
 ]
 
+# Swagger/ReDoc routes. When off, drf_yasg is never imported and the views'
+# documentation metadata is never built, which shortens worker startup.
+API_DOCS_ENABLED = config('API_DOCS_ENABLED', default=True, cast=bool)
+if API_DOCS_ENABLED:
+    INSTALLED_APPS.append('drf_yasg')
+
 MIDDLEWARE = [
+    'realestate.middleware.CompressionMiddleware',  # First, so it compresses the final response
+    'realestate.metrics.MetricsMiddleware',
+    'realestate.middleware.QueryInstrumentationMiddleware',
+    'realestate.profiling.ProfilingMiddleware',  # Removes itself unless PROFILING_ENABLED
+    'realestate.db_router.ReplicaRoutingMiddleware',  # Before the session middleware, whose writes count
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -87,12 +98,97 @@ WSGI_APPLICATION = 'realestate.wsgi.application'
 
 
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE is 'sqlite' (default) or 'postgresql'.
+# Connections are kept open for DB_CONN_MAX_AGE seconds and checked before reuse.
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=60, cast=int)
+DB_CONN_HEALTH_CHECKS = config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool)
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME'),
+            'USER': config('DB_USER', default=''),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': DB_CONN_HEALTH_CHECKS,
+            'OPTIONS': {},
+        }
+    }
+    # psycopg 3 connection pool, shared by the threads of a worker
+    if config('DB_POOL', default=False, cast=bool):
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+            'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+            'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),  # seconds to wait for a free connection
+        }
+        DATABASES['default']['CONN_MAX_AGE'] = 0  # The pool keeps the connections, Django must not
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': DB_CONN_HEALTH_CHECKS,
+            'OPTIONS': {},
+        }
+    }
+    # Run on every new connection: WAL lets readers run during a write,
+    # NORMAL sync is safe with WAL, and writers wait for the lock instead of failing
+    if config('SQLITE_TUNING', default=True, cast=bool):
+        DATABASES['default']['OPTIONS']['init_command'] = ';'.join([
+            'PRAGMA journal_mode=WAL',
+            'PRAGMA synchronous=NORMAL',
+            f"PRAGMA busy_timeout={config('SQLITE_BUSY_TIMEOUT', default=5000, cast=int)}",  # milliseconds
+            f"PRAGMA mmap_size={config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int)}",  # bytes
+        ])
+        DATABASES['default']['OPTIONS']['transaction_mode'] = 'IMMEDIATE'  # Take the write lock up front, avoids deadlock errors
+
+# Read replicas: comma separated hosts (PostgreSQL) or database files (SQLite,
+# refreshed with `manage.py sync_sqlite_replicas`). Safe requests read from
+# them, see realestate/db_router.py.
+DB_REPLICAS = config('DB_REPLICAS', default='', cast=Csv())
+for index, replica in enumerate(DB_REPLICAS, start=1):
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST' if DB_ENGINE == 'postgresql' else 'NAME': replica,
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'TEST': {'MIRROR': 'default'},
+    }
+if DB_REPLICAS:
+    DATABASE_ROUTERS = ['realestate.db_router.ReplicaRouter']
+# Seconds a client keeps reading from the primary after writing
+DB_STICKY_SECONDS = config('DB_STICKY_SECONDS', default=5, cast=int)
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+# REDIS_URL (e.g. redis://localhost:6379/0) gives all the workers one cache.
+# Without it every process has its own memory cache, which other workers
+# cannot see or invalidate.
+REDIS_URL = config('REDIS_URL', default='')
+SHARED_CACHE = bool(REDIS_URL)
+if SHARED_CACHE:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+elif DB_REPLICAS:
+    # The replica routing remembers recent writers in the cache, so the
+    # workers of one machine share a file cache (fine for local testing)
+    warnings.warn("DB_REPLICAS without REDIS_URL, using a file cache only the workers of this machine share.")
+    SHARED_CACHE = True
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': config('CACHE_DIR', default=str(BASE_DIR / 'cache')),
+        }
     }
-}
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -121,12 +217,20 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,  # Number of items per page
+    'DEFAULT_RENDERER_CLASSES': (
+        'realestate.renderers.FastJSONRenderer',  # orjson, falls back to the stdlib json module
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.SearchFilter',  # For searching
         'rest_framework.filters.OrderingFilter',  # For sorting
     ],
 }
+# Serve the property list from .values() rows (PropertyCardSerializer) instead of PropertySerializer
+PROPERTY_LIST_FAST_PATH = config('PROPERTY_LIST_FAST_PATH', default=True, cast=bool)
+# Serve the property list from the PropertyCard read model, run rebuild_property_cards before turning it on
+PROPERTY_LIST_FROM_CARDS = config('PROPERTY_LIST_FROM_CARDS', default=False, cast=bool)
 AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
 ]
@@ -143,7 +247,7 @@ DJOSER = {
 }
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 SWAGGER_SETTINGS = {
-    'DEFAULT_GENERATOR_CLASS': 'drf_yasg.generators.OpenAPISchemaGenerator',
+    'DEFAULT_GENERATOR_CLASS': 'realestate.schema.LazyDocsSchemaGenerator',  # Builds the lazy view docs first
     'DEFAULT_AUTO_SCHEMA_CLASS': 'drf_yasg.inspectors.SwaggerAutoSchema',
     'SECURITY_DEFINITIONS': {
         'Bearer': {
@@ -161,6 +265,25 @@ SWAGGER_SETTINGS = {
     'OPERATIONS_SORTER': 'method',
     'DEFAULT_API_URL': 'http://localhost:8000/',
 }
+# Metrics served at /metrics/. METRICS_DIR is a directory shared by the worker
+# processes of one host, cleared when the service starts; unset with a single process.
+METRICS_DIR = config('METRICS_DIR', default=None)
+METRICS_TOKEN = config('METRICS_TOKEN', default=None)
+# Request profiling, see realestate/profiling.py; profiles are browsed at /admin/profiles/
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=False, cast=bool)
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+PROFILING_DIR = config('PROFILING_DIR', default=str(BASE_DIR / 'profiles'))
+# Exceeding a view's query_budget raises instead of logging a warning; the test
+# runner turns it on for every test
+QUERY_BUDGET_RAISE = config('QUERY_BUDGET_RAISE', default=False, cast=bool)
+TEST_RUNNER = 'realestate.test_runner.QueryBudgetTestRunner'
+# Serve the property list/detail and public profile with async views, for ASGI
+# deployments. Generate the OpenAPI schema with it off, the async views are not documented.
+ASYNC_READ_VIEWS = config('ASYNC_READ_VIEWS', default=False, cast=bool)
+# Precomputed OpenAPI schema, written by `manage.py generate_openapi_schema`.
+# In live mode (default in DEBUG) the schema is introspected on every request instead.
+OPENAPI_SCHEMA_PATH = config('OPENAPI_SCHEMA_PATH', default=str(BASE_DIR / 'openapi.json'))
+OPENAPI_SCHEMA_LIVE = config('OPENAPI_SCHEMA_LIVE', default=DEBUG, cast=bool)
 # Email configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = config('EMAIL_HOST')
@@ -190,6 +313,10 @@ LOGGING = {
             'handlers': ['console'],
             'level': 'DEBUG',
         },
+        'realestate.queries': {  # Per request query counts at INFO, exceeded budgets at WARNING
+            'handlers': ['console'],
+            'level': config('QUERY_LOG_LEVEL', default='WARNING'),
+        },
     },
 }
 SIMPLE_JWT = {
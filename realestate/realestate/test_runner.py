@@ -0,0 +1,20 @@
+"""
+Test runner of the project.
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class QueryBudgetTestRunner(DiscoverRunner):
+    """
+    Run every test with QUERY_BUDGET_RAISE on, so a view that goes over its
+    query_budget fails the test that requested it. Production only warns.
+    """
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._query_budget = override_settings(QUERY_BUDGET_RAISE=True)
+        self._query_budget.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._query_budget.disable()
+        super().teardown_test_environment(**kwargs)
@@ -19,33 +19,29 @@ from django.urls import path,include
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework_simplejwt.views import TokenRefreshView
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
+from properties.views import ResizedImageView
+from .metrics import MetricsView
+from . import profiling
 
-
-# Swagger schema view
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Django Auth API",
-        default_version='v1',
-        description="API for user realestate app",
-        terms_of_service="https://www.example.com/terms/",
-        contact=openapi.Contact(email="contact@example.com"),
-        license=openapi.License(name="MIT License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
 urlpatterns = [
+    path('admin/profiles/', profiling.profile_list_view, name='profile-list'),
+    path('admin/profiles/<str:name>/', profiling.profile_detail_view, name='profile-detail'),
+    path('admin/profiles/<str:name>/<str:kind>/', profiling.profile_download_view, name='profile-download'),
     path('admin/', admin.site.urls),
     path('auth/', include('djoser.urls')),  # registration, activation, reset, etc.
     path('auth/', include('djoser.urls.jwt')),  # JWT endpoints: login, refresh, verify
     path('auth/jwt/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
     path('users/',include('users.urls')),
     path('properties/',include('properties.urls')),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('media/resize/<int:width>x<int:height>/<path:path>', ResizedImageView.as_view(), name='resized-image'),
 ]
+if settings.API_DOCS_ENABLED:
+    from .schema import docs_view  # Imports drf_yasg
+
+    urlpatterns += [
+        path('swagger/', docs_view('swagger'), name='schema-swagger-ui'),
+        path('redoc/', docs_view('redoc'), name='schema-redoc'),
+    ]
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,86 @@
+"""
+Cache of the serialized public profiles.
+
+Public profiles are shown next to every listing and rarely change, so the
+PublicProfileSerializer output is cached per user id. Saving a profile
+writes the new payload through to the cache once the transaction commits
+(this covers photo changes and removals), and deleting it drops the entry.
+
+Misses are filled with cache.add, so a read from a lagging replica never
+overwrites a payload written through by a save.
+
+Other workers only see the write-through and the deletion when the cache is
+shared (REDIS_URL). With the per-process default cache, entries expire after
+a few seconds instead.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from realestate.metrics import cache_lookup
+
+from .models import Profile
+from .serializers import PublicProfileSerializer
+
+CACHE_TIMEOUT = getattr(settings, 'PUBLIC_PROFILE_CACHE_TIMEOUT', 24 * 3600 if getattr(settings, 'SHARED_CACHE', False) else 10)  # seconds
+
+
+def cache_key(user_id):
+    return f'public-profile:{user_id}'
+
+
+def serialize(profile):
+    return dict(PublicProfileSerializer(profile).data)
+
+
+def store(profile):
+    cache.set(cache_key(profile.user_id), serialize(profile), CACHE_TIMEOUT)
+
+
+def invalidate(user_id):
+    cache.delete(cache_key(user_id))
+
+
+def get_profile(user_id):
+    """
+    Return the public profile payload of this user, or None if they have no profile.
+    """
+    data = cache.get(cache_key(user_id))
+    cache_lookup('public_profiles', hit=data is not None)
+    if data is None:
+        profile = Profile.objects.filter(user_id=user_id).first()
+        if profile is None:
+            return None
+        data = serialize(profile)
+        cache.add(cache_key(user_id), data, CACHE_TIMEOUT)
+    return data
+
+
+async def aget_profile(user_id):
+    data = await cache.aget(cache_key(user_id))
+    cache_lookup('public_profiles', hit=data is not None)
+    if data is None:
+        profile = await Profile.objects.filter(user_id=user_id).afirst()
+        if profile is None:
+            return None
+        data = serialize(profile)
+        await cache.aadd(cache_key(user_id), data, CACHE_TIMEOUT)
+    return data
+
+
+def get_profiles(user_ids):
+    """
+    Return {user_id: payload} for the users of `user_ids` that have a profile,
+    with one cache round-trip and at most one query for the misses.
+    """
+    keys = {cache_key(user_id): user_id for user_id in user_ids}
+    cached = cache.get_many(keys)
+    found = {keys[key]: data for key, data in cached.items()}
+    for user_id in user_ids:
+        cache_lookup('public_profiles', hit=user_id in found)
+
+    missing = [user_id for user_id in user_ids if user_id not in found]
+    if missing:
+        loaded = {profile.user_id: serialize(profile) for profile in Profile.objects.filter(user_id__in=missing)}
+        for user_id, data in loaded.items():
+            cache.add(cache_key(user_id), data, CACHE_TIMEOUT)
+        found.update(loaded)
+    return found
@@ -1,7 +1,9 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import User
+from .models import User, Profile
 from .utils import send_verification_email  # Will create it
+from . import profile_cache
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -10,3 +12,16 @@ def send_activation_code(sender, instance, created, **kwargs):
     if created and not instance.is_active:
         
         send_verification_email(instance, purpose='activation')
+
+
+@receiver(post_save, sender=Profile)
+def cache_public_profile(sender, instance, raw=False, **kwargs):
+    if not raw:
+        # Only committed data may reach the cache
+        transaction.on_commit(lambda: profile_cache.store(instance))
+
+
+@receiver(post_delete, sender=Profile)
+def uncache_public_profile(sender, instance, **kwargs):
+    # Also runs for the cascade when the user is deleted
+    transaction.on_commit(lambda: profile_cache.invalidate(instance.user_id))
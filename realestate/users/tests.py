@@ -1,3 +1,95 @@
-from django.test import TestCase
+import json
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from . import profile_cache
+from .models import Profile, User
+from .views import AsyncPublicProfileView, PublicProfileBatchView, PublicProfileView
+
+
+class AsyncPublicProfileViewTests(TestCase):
+    """
+    The async public profile view renders what the sync view renders.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='profile@gmail.com', password=None)
+        Profile.objects.create(user=cls.user, first_name='Lama', last_name='Dayoub', country='syria', photo='userphotoes/lama.jpg')
+
+    def test_same_output(self):
+        for user_id in [self.user.id, 0]:
+            with self.subTest(user_id=user_id):
+                request = RequestFactory().get(reverse('see-others-profile', args=[user_id]))
+                cache.clear()
+                expected = PublicProfileView.as_view()(request, user_id=user_id)
+                expected.render()
+                cache.clear()
+                response = async_to_sync(AsyncPublicProfileView.as_view())(request, user_id=user_id)
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+
+class PublicProfileCacheTests(TestCase):
+    """
+    Saved profiles are written through to the cache, deleted ones dropped from it.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(email=f'cached{i}@gmail.com', password=None) for i in range(3)]
+        for user in cls.users[:2]:
+            Profile.objects.create(user=user, first_name=f'User {user.id}', photo='userphotoes/old.jpg')
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, user_id):
+        return self.client.get(reverse('see-others-profile', args=[user_id]))
+
+    def test_per_process_cache_expires_quickly(self):
+        self.assertFalse(settings.SHARED_CACHE)
+        self.assertLessEqual(profile_cache.CACHE_TIMEOUT, 60)
+
+    def test_save_writes_through(self):
+        user = self.users[0]
+        self.assertEqual(self.get(user.id).json()['photo'], '/media/userphotoes/old.jpg')
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = user.profile
+            profile.first_name = 'Renamed'
+            profile.photo = None
+            profile.save()
+        with self.assertNumQueries(0):
+            data = self.get(user.id).json()
+        self.assertEqual((data['first_name'], data['photo']), ('Renamed', None))
+
+    def test_delete_invalidates(self):
+        user = self.users[0]
+        self.assertEqual(self.get(user.id).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.profile.delete()
+        self.assertIsNone(cache.get(profile_cache.cache_key(user.id)))
+        self.assertEqual(self.get(user.id).status_code, 404)
+
+    def test_batch_keeps_order_and_leaves_out_missing(self):
+        first, second, without_profile = self.users
+        ids = f'{second.id},{without_profile.id},{first.id},0,{second.id}'
+        response = self.client.get(reverse('public-profiles'), {'ids': ids})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json()), [str(second.id), str(first.id)])
+        self.assertEqual(response.json()[str(first.id)]['first_name'], f'User {first.id}')
+
+        # The profiles are cached now, only the users without one are looked up again
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(reverse('public-profiles'), {'ids': ids}).json(), response.json())
+
+    def test_batch_rejects_bad_ids(self):
+        with mock.patch.object(PublicProfileBatchView, 'MAX_IDS', 2):
+            for ids in ['', 'a,b', '1,2,3']:
+                with self.subTest(ids=ids):
+                    response = self.client.get(reverse('public-profiles'), {'ids': ids})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('detail', response.json())
@@ -1,6 +1,13 @@
 from django.urls import path
 from .views import SignUpView,logout_view,ResetPasswordView,CustomLoginView,PublicProfileView,ProfileView,ChangePasswordView,ForgotPasswordView,VerifyCodeView
 from .views import ToggleSellerModeView,CheckActivationStatusView
+from .views import AsyncPublicProfileView,PublicProfileBatchView
+from django.conf import settings
+
+# ASGI deployments serve the public profiles with the async view
+if settings.ASYNC_READ_VIEWS:
+    PublicProfileView = AsyncPublicProfileView
+
 urlpatterns = [
     path('signup/',SignUpView.as_view(),name='signup'),
     path('login/',CustomLoginView.as_view(),name='login'),
@@ -11,6 +18,7 @@ urlpatterns = [
     path('change-password/',ChangePasswordView.as_view(),name='change-password'),
     path('set-new-password/',ResetPasswordView.as_view(),name='set-new-password'),
     path('see-profile/<int:user_id>/',PublicProfileView.as_view(),name='see-others-profile'),
+    path('profiles/',PublicProfileBatchView.as_view(),name='public-profiles'),
     #path('delete-photo/', ProfileView.as_view({'delete': 'delete_photo'}), name='delete_profile_photo'),
     path('profile/is-seller/', ToggleSellerModeView.as_view(), name='toggle_seller_mode'),
     path('check-activation-status/', CheckActivationStatusView.as_view(), name='check_activation_status'),
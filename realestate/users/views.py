@@ -2,13 +2,15 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from djoser.conf import settings
+from django.conf import settings as django_settings
 from django.contrib.auth import get_user_model
 from rest_framework.permissions import AllowAny
 from django.core.files.storage import default_storage
-from drf_yasg.utils import swagger_auto_schema
+from realestate import deferred_storage
+from realestate.api_docs import swagger_auto_schema
 from django.contrib.auth.hashers import check_password
 from .utils import send_verification_email,send_password_change_notification
-from drf_yasg import openapi
+from realestate.api_docs import openapi
 from rest_framework_simplejwt.views import TokenObtainPairView
 from .authentication.serializers import CustomTokenSerializer
 from rest_framework_simplejwt.authentication import JWTAuthentication
@@ -22,6 +24,10 @@ from rest_framework.parsers import MultiPartParser
 from .serializers import ProfileSerializer,PublicProfileSerializer
 from rest_framework.generics import GenericAPIView
 from rest_framework_simplejwt.tokens import OutstandingToken, BlacklistedToken
+from django.views import View
+from realestate.renderers import json_response
+from realestate.batch import parse_ids
+from . import profile_cache
 User = get_user_model()
 
 
@@ -271,6 +277,7 @@ def logout_view(request):
 
 class PublicProfileView(APIView):
     permission_classes = [AllowAny]
+    query_budget = 1
     parser_classes = [MultiPartParser]
     
     @swagger_auto_schema(
@@ -314,17 +321,80 @@ class PublicProfileView(APIView):
         """
         Retrieve a user's public profile by user ID.
         """
-        try:
-            user = User.objects.get(pk=user_id)
-            profile = user.profile
-        except (User.DoesNotExist, Profile.DoesNotExist):
+        # Served from the profile cache, a missing user has no profile either
+        data = profile_cache.get_profile(user_id)
+        if data is None:
             return Response(
                 {"detail": "User or profile not found."},
                 status=status.HTTP_404_NOT_FOUND
             )
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class PublicProfileBatchView(APIView):
+    permission_classes = [AllowAny]
+    query_budget = 1
+    MAX_IDS = getattr(django_settings, 'PUBLIC_PROFILE_BATCH_LIMIT', 100)
+
+    @swagger_auto_schema(
+        operation_id="get_public_profiles",
+        operation_description=f"Retrieve the public profiles of several users at once, e.g. the owners of a page of listings (at most {MAX_IDS} ids). Users without a profile are left out.",
+        manual_parameters=[
+            openapi.Parameter(
+                'ids',
+                openapi.IN_QUERY,
+                description="Comma-separated user IDs, e.g. 1,2,3.",
+                type=openapi.TYPE_STRING,
+                required=True
+            )
+        ],
+        responses={
+            200: openapi.Response(
+                description="Public profiles by user ID.",
+                examples={
+                    "application/json": {
+                        "1": {
+                            "id": 1,
+                            "first_name": "John",
+                            "last_name": "Doe",
+                            "photo": "http://example.com/media/userphotos/user_1/photo.jpg",
+                            "country": "syria",
+                            "birth_date": "2004-04-18"
+                        }
+                    }
+                }
+            ),
+            400: openapi.Response(
+                description="Missing or invalid ids.",
+                examples={
+                    "application/json": {
+                        "detail": "'ids' must be a comma-separated list of integers."
+                    }
+                }
+            )
+        }
+    )
+    def get(self, request):
+        try:
+            user_ids = parse_ids(request.query_params.get('ids'), self.MAX_IDS)
+        except ValueError as error:
+            return Response({"detail": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        profiles = profile_cache.get_profiles(user_ids)
+        return Response({str(user_id): profiles[user_id] for user_id in user_ids if user_id in profiles}, status=status.HTTP_200_OK)
+
+
+class AsyncPublicProfileView(View):
+    """
+    ASGI-native PublicProfileView, used when ASYNC_READ_VIEWS is set.
+    """
+    query_budget = PublicProfileView.query_budget
 
-        serializer = PublicProfileSerializer(profile)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+    async def get(self, request, user_id):
+        data = await profile_cache.aget_profile(user_id)
+        if data is None:
+            return json_response({"detail": "User or profile not found."}, status=status.HTTP_404_NOT_FOUND)
+        return json_response(data)
 
 
 class ProfileView(RetrieveUpdateAPIView):
@@ -514,20 +584,17 @@ class ProfileView(RetrieveUpdateAPIView):
 
         if serializer.is_valid():
             # Check if any fields were actually updated
-            new_photo = request.data.get('photo')
-            if new_photo and instance.photo:
-            # Construct the full path to the old photo
-                old_photo_path = instance.photo.name  # This already includes the custom directory path
-            # Delete the old photo file from storage
-                if default_storage.exists(old_photo_path):
-                    default_storage.delete(old_photo_path)
             if not serializer.has_changed():
                 return Response(
                     {"detail": "No changes were made."},
                     status=status.HTTP_200_OK
                 )
 
+            old_photo_path = instance.photo.name if instance.photo else None  # Includes the custom directory path
             serializer.save()
+            # Delete the replaced photo file once the new one is saved
+            if old_photo_path and instance.photo.name != old_photo_path:
+                deferred_storage.delete_on_commit(old_photo_path, default_storage)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -562,11 +629,12 @@ class ProfileView(RetrieveUpdateAPIView):
                 {"detail": "No profile photo to delete."},
                 status=status.HTTP_404_NOT_FOUND
             )
-        # Delete the photo file from storage
-        instance.photo.delete(save=False)
+        photo_path = instance.photo.name
         # Set the photo field to null
         instance.photo = None
         instance.save()
+        # Delete the photo file from storage in the background
+        deferred_storage.delete_on_commit(photo_path, default_storage)
         return Response(status=status.HTTP_204_NO_CONTENT)       
     def delete(self, request, *args, **kwargs):
         """